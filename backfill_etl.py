@@ -0,0 +1,126 @@
+# backfill_etl.py
+# Backfill histórico dos fatos em paralelo: divide o período em fatias de datas alinhadas com as partições
+# dos fatos (FACT_PARTITION_GRANULARITY no config.py) e roda extract/transform/load de cada fatia num processo
+# separado, com as próprias conexões. Cada fatia carrega só a partição das suas datas, mas os processos ainda se cruzam:
+# - uma carona remarcada sai da partição antiga (DELETE do bulk_upsert_dataframe), que pode ser a de outra fatia;
+# - toda fatia da fato_carona marca dias em etl_pending_date (serializado por um advisory lock em mark_pending_dates).
+# Se o OLTP mudar durante o backfill, duas fatias podem tocar a mesma carona e uma delas falhar por deadlock ou
+# serialização: é esperado, e basta rodar o backfill de novo só para o período da fatia (a carga é idempotente).
+# As dimensões precisam estar carregadas antes (uma execução normal do etl_main.py). Uso:
+#     python backfill_etl.py --de 2016-04-01 --ate 2025-01-01 --workers 8
+# Observação: caronas sem data (e pedidos sem created_at) não caem em nenhuma fatia; ficam com o ETL normal.
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from fact_scripts.fact_carona_etl import etl_fact_carona, FULL_LOAD_START_DATE
+from fact_scripts.fact_interacao_carona_etl import etl_fact_interacao_carona
+from fact_scripts.fact_carona_diaria_etl import etl_fact_carona_diaria
+from utils import ETLConnectionManager, connect_to_db, date_partition_bounds, ensure_date_partitions
+from config import DB_OLTP, DB_DW, FACT_PARTITION_GRANULARITY
+
+# Fatos que podem ser reconstruídos pelo backfill
+FACT_ETLS = {
+    'fato_carona': etl_fact_carona,
+    'fato_interacao_carona': etl_fact_interacao_carona
+}
+
+def _date_sk(data):
+    return data.year * 10000 + data.month * 100 + data.day
+
+def _data_do_sk(date_sk):
+    return datetime(date_sk // 10000, date_sk // 100 % 100, date_sk % 100)
+
+def gerar_fatias(data_inicio, data_fim, granularity=FACT_PARTITION_GRANULARITY):
+    """
+    Divide [data_inicio, data_fim) em fatias que coincidem com as partições dos fatos (cortadas nas pontas).
+    Retorna uma lista de (sufixo da partição, início, fim).
+    """
+    fatias = []
+    atual = data_inicio
+    while atual < data_fim:
+        sufixo, _, fim_sk = date_partition_bounds(_date_sk(atual), granularity)
+        fim = min(_data_do_sk(fim_sk), data_fim)
+        fatias.append((sufixo, atual, fim))
+        atual = fim
+    return fatias
+
+def preparar_particoes(fatias, fatos):
+    """
+    Cria antes, num único processo, todas as partições que o backfill vai usar:
+    os processos das fatias só carregam dados, sem DDL concorrente na tabela mãe.
+    """
+    conn_dw = connect_to_db(DB_DW)
+    if not conn_dw:
+        return False
+    try:
+        date_sks = [_date_sk(inicio) for _, inicio, _ in fatias]
+        for fato in fatos:
+            criadas = ensure_date_partitions(conn_dw, fato, date_sks)
+            if criadas:
+                print(f"Partições criadas em {fato}: {', '.join(criadas)}")
+        conn_dw.commit()
+        return True
+    except Exception as e:
+        conn_dw.rollback()
+        print(f"Erro ao preparar as partições do backfill: {e}")
+        return False
+    finally:
+        conn_dw.close()
+
+def rodar_fatia(fato, inicio, fim):
+    """Roda num processo separado: carga completa de um fato restrita a [inicio, fim). Retorna (sucesso, segundos)."""
+    conn_manager = ETLConnectionManager(DB_OLTP, DB_DW, max_connections=1)
+    try:
+        comeco = time.perf_counter()
+        sucesso = FACT_ETLS[fato](last_etl_run_date_str=FULL_LOAD_START_DATE.strftime("%Y-%m-%d %H:%M:%S.%f"),
+                                  conn_manager=conn_manager, date_range=(inicio, fim))
+        return sucesso, time.perf_counter() - comeco
+    finally:
+        conn_manager.close_all()
+
+def rodar_backfill(data_inicio, data_fim, workers, fatos=tuple(FACT_ETLS)):
+    """
+    Reconstrói os fatos informados para [data_inicio, data_fim), uma fatia por partição, até workers processos por vez.
+    Fatias que falham podem ser refeitas rodando o backfill só para o período delas (a carga é idempotente).
+    Retorna a lista de fatias que falharam, como (fato, sufixo).
+    """
+    fatias = gerar_fatias(data_inicio, data_fim)
+    print(f"Backfill de {data_inicio:%Y-%m-%d} a {data_fim:%Y-%m-%d}: {len(fatias)} fatias x {len(fatos)} fatos, {workers} processos.")
+    if not fatias or not preparar_particoes(fatias, fatos):
+        return [(fato, sufixo) for fato in fatos for sufixo, _, _ in fatias]
+
+    falhas = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futuros = {executor.submit(rodar_fatia, fato, inicio, fim): (fato, sufixo)
+                   for fato in fatos for sufixo, inicio, fim in fatias}
+        for futuro in as_completed(futuros):
+            fato, sufixo = futuros[futuro]
+            try:
+                sucesso, segundos = futuro.result()
+            except Exception as e:
+                print(f"❌ {fato} {sufixo}: erro inesperado: {e}")
+                sucesso = False
+            else:
+                print(f"{'✅' if sucesso else '❌'} {fato} {sufixo} ({segundos:.1f}s)")
+            if not sucesso:
+                falhas.append((fato, sufixo))
+
+    # Os dias carregados pelas fatias ficaram marcados em etl_pending_date: o agregado é recalculado uma vez no final
+    if 'fato_carona' in fatos and not etl_fact_carona_diaria():
+        falhas.append(('fato_carona_diaria', 'agregado'))
+    return falhas
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill histórico dos fatos do Caronaê DW, em paralelo por faixa de datas.")
+    parser.add_argument('--de', '--from', dest='data_inicio', required=True, type=datetime.fromisoformat, help="Data inicial (inclusiva), ex: 2016-04-01")
+    parser.add_argument('--ate', '--to', dest='data_fim', required=True, type=datetime.fromisoformat, help="Data final (exclusiva), ex: 2025-01-01")
+    parser.add_argument('--workers', type=int, default=4, help="Fatias carregadas em paralelo (processos)")
+    parser.add_argument('--fatos', nargs='+', choices=list(FACT_ETLS), default=list(FACT_ETLS), help="Fatos reconstruídos")
+    args = parser.parse_args()
+
+    falhas = rodar_backfill(args.data_inicio, args.data_fim, args.workers, args.fatos)
+    if falhas:
+        print(f"\nBackfill concluído com falhas em: {', '.join(f'{fato} {sufixo}' for fato, sufixo in falhas)}")
+    else:
+        print("\n✅ Backfill concluído com sucesso!")
@@ -0,0 +1,160 @@
+# benchmark_etl.py
+# Benchmark de ponta a ponta do ETL: gera o OLTP sintético em cada escala, roda a carga completa e a incremental
+# e grava um JSON com tempo, linhas/s, memória e idas e voltas ao banco por etapa e fase (extract/transform/load).
+# Depois da carga completa, cada etapa etl_* também é medida sozinha (carga completa só dela, sobre o DW já carregado).
+# Cada execução roda num processo novo, para o pico de RSS ser só dela (ru_maxrss nunca diminui dentro de um processo).
+# Os JSONs (um por execução, com o commit) podem ser comparados entre commits para achar regressões. Uso:
+#     python benchmark_etl.py --escalas 1 10 --seed 42
+import argparse
+import json
+import multiprocessing
+import os
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from etl_main import main_etl_process, build_etl_steps
+from etl_metrics import reset_metrics, get_metrics, peak_rss_kb
+from gerador_dados_oltp import gerar_oltp
+from fact_scripts.fact_carona_etl import FULL_LOAD_START_DATE
+from utils import connect_to_db
+from config import DB_OLTP
+
+# Pasta onde os resultados são gravados
+BENCHMARK_DIR = "benchmarks"
+
+# Fração das linhas do OLTP alteradas antes da carga incremental
+FRACAO_ALTERADA_INCREMENTAL = 0.01
+
+def _commit_atual():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+    except Exception:
+        return None
+
+def contar_linhas_oltp(tabelas=('users', 'rides', 'ride_user', 'messages')):
+    conn = connect_to_db(DB_OLTP)
+    try:
+        with conn.cursor() as cur:
+            contagens = {}
+            for tabela in tabelas:
+                cur.execute(f"SELECT COUNT(*) FROM {tabela};")
+                contagens[tabela] = cur.fetchone()[0]
+            return contagens
+    finally:
+        conn.close()
+
+def alterar_oltp_para_incremental(fracao=FRACAO_ALTERADA_INCREMENTAL):
+    """Simula um dia de uso: atualiza uma fração dos usuários, caronas e pedidos (updated_at = agora)."""
+    modulo = max(int(round(1 / fracao)), 1)
+    conn = connect_to_db(DB_OLTP)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("UPDATE users SET updated_at = NOW() WHERE id %% %s = 0;", (modulo,))
+            cur.execute("UPDATE rides SET updated_at = NOW(), done = NOT COALESCE(done, FALSE) WHERE id %% %s = 0;", (modulo,))
+            cur.execute("UPDATE ride_user SET updated_at = NOW(), status = 'accepted' WHERE id %% %s = 0 AND status = 'pending';", (modulo,))
+        conn.commit()
+    finally:
+        conn.close()
+
+def medir_execucao(escala, modo, **kwargs_etl):
+    """
+    Roda main_etl_process uma vez e devolve o registro do benchmark (tempo total + métricas por etapa/fase).
+    Chamada num processo próprio (medir_execucao_isolada): peak_rss_kb é o pico desta execução.
+    """
+    reset_metrics()
+    inicio = time.perf_counter()
+    resultado = main_etl_process(**kwargs_etl)
+    segundos = time.perf_counter() - inicio
+    return _registro(escala, modo, resultado, segundos)
+
+def medir_etapa(escala, nome_etapa):
+    """
+    Roda uma única etapa etl_* (ex: 'dim_user', 'fato_carona'), sem o agendador nem as demais etapas, e devolve
+    o registro do benchmark. Os fatos fazem carga completa; as conexões e o cache de SKs são só da etapa.
+    Chamada num processo próprio (medir_execucao_isolada), como medir_execucao.
+    """
+    etapas = build_etl_steps(None, FULL_LOAD_START_DATE.strftime("%Y-%m-%d %H:%M:%S.%f"), recria_dim_flags_carona=True)
+    etapa = next(etapa for etapa in etapas if etapa.name == nome_etapa)
+    reset_metrics()
+    inicio = time.perf_counter()
+    resultado = etapa.run()
+    segundos = time.perf_counter() - inicio
+    registro = _registro(escala, 'etapa', resultado, segundos)
+    registro['etapa'] = nome_etapa
+    return registro
+
+def _registro(escala, modo, resultado, segundos):
+    fases = get_metrics()
+    return {
+        'escala': escala,
+        'modo': modo,
+        'sucesso': resultado is True,
+        'wall_seconds': round(segundos, 3),
+        'peak_rss_kb': peak_rss_kb(),
+        'round_trips': sum(fase['round_trips'] for fase in fases if fase['phase'] == 'total'),
+        'linhas_oltp': contar_linhas_oltp(),
+        'fases': sorted(fases, key=lambda fase: (fase['step'], fase['phase']))
+    }
+
+def medir_execucao_isolada(funcao, *args, **kwargs):
+    """Roda funcao (medir_execucao ou medir_etapa) num processo novo (spawn) e devolve o registro."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        return executor.submit(funcao, *args, **kwargs).result()
+
+def nomes_das_etapas():
+    """Etapas etl_* de uma carga completa, na ordem declarada (dependências antes das dependentes)."""
+    return [etapa.name for etapa in build_etl_steps(None, None, recria_dim_flags_carona=True)]
+
+def rodar_benchmark(escalas, seed=42, modos=('full', 'etapas', 'incremental')):
+    execucoes = []
+    for escala in escalas:
+        print(f"\n===== Benchmark: escala {escala} =====")
+        if not gerar_oltp(escala=escala, seed=seed, recria=True):
+            print(f"Falha ao gerar o OLTP na escala {escala}. Escala ignorada.")
+            continue
+
+        # A carga completa sempre roda (as etapas isoladas e a incremental precisam de um DW já carregado)
+        registro_full = medir_execucao_isolada(medir_execucao, escala, 'full', apaga_ultimo_etl_run=True,
+                                               recria_dim_time=True, recria_dim_flags_carona=True)
+        if 'full' in modos:
+            execucoes.append(registro_full)
+
+        # Antes da incremental: as etapas isoladas medem o mesmo OLTP da carga completa
+        if 'etapas' in modos:
+            for nome_etapa in nomes_das_etapas():
+                print(f"--- Etapa isolada: {nome_etapa} ---")
+                execucoes.append(medir_execucao_isolada(medir_etapa, escala, nome_etapa))
+
+        if 'incremental' in modos:
+            alterar_oltp_para_incremental()
+            execucoes.append(medir_execucao_isolada(medir_execucao, escala, 'incremental', apaga_ultimo_etl_run=False,
+                                                    recria_dim_time=False, recria_dim_flags_carona=False))
+    return execucoes
+
+def salvar_resultado(execucoes, seed, pasta=BENCHMARK_DIR):
+    os.makedirs(pasta, exist_ok=True)
+    commit = _commit_atual()
+    agora = datetime.now()
+    resultado = {
+        'commit': commit,
+        'timestamp': agora.isoformat(timespec='seconds'),
+        'seed': seed,
+        'execucoes': execucoes
+    }
+    caminho = os.path.join(pasta, f"benchmark_{agora.strftime('%Y%m%d_%H%M%S')}_{commit or 'sem_commit'}.json")
+    with open(caminho, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+    return caminho
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de ponta a ponta do ETL do Caronaê DW.")
+    parser.add_argument('--escalas', type=float, nargs='+', default=[1], help="Fatores de escala do OLTP sintético")
+    parser.add_argument('--seed', type=int, default=42, help="Semente do gerador de dados")
+    parser.add_argument('--modos', nargs='+', choices=['full', 'etapas', 'incremental'], default=['full', 'etapas', 'incremental'],
+                        help="Caminhos medidos: carga completa, cada etapa etl_* sozinha e/ou carga incremental")
+    args = parser.parse_args()
+
+    execucoes = rodar_benchmark(args.escalas, seed=args.seed, modos=args.modos)
+    caminho = salvar_resultado(execucoes, args.seed)
+    print(f"\nResultados do benchmark gravados em: {caminho}")
@@ -19,4 +19,62 @@ DB_DW = {
 }
 
 # Arquivo para armazenar a última data de execução do ETL para cargas incrementais
-LAST_RUN_FILE = "last_etl_run.txt"
\ No newline at end of file
+LAST_RUN_FILE = "last_etl_run.txt"
+
+# Período coberto pela dim_time. Para estender o calendário basta aumentar DIM_TIME_END_DATE (ou recuar DIM_TIME_START_DATE):
+# o ETL da dim_time só acrescenta os dias que ainda não existem na tabela
+DIM_TIME_START_DATE = "2016-04-01"
+DIM_TIME_END_DATE = "2025-12-31"
+
+# Quantidade de dias gerados e enviados ao banco por vez na dim_time (1 dia = 1440 linhas)
+DIM_TIME_CHUNK_DAYS = 31
+
+# Modelo da dimensão de tempo dos fatos:
+# False -> dim_time no grão de minuto (date_sk, hour_sk), um registro por minuto de cada dia
+# True  -> dim_date (um registro por dia) + dim_time_of_day (1440 registros, um por minuto do dia)
+DIM_TIME_SPLIT = False
+
+# Granularidade das partições (por faixa de date_sk) das tabelas de fatos:
+# 'semestre' -> uma partição por semestre (como a coluna semester da dim_time), ex: fato_carona_2019_s1
+# 'mes'      -> uma partição por mês, ex: fato_carona_2019_03
+FACT_PARTITION_GRANULARITY = 'semestre'
+
+# Quantidade de linhas por bloco na extração com cursor do lado do servidor (named cursor).
+# Transformação e carga acontecem bloco a bloco, então a memória do processo não cresce com o tamanho das tabelas
+EXTRACT_CHUNK_SIZE = 50000
+
+# Blocos que podem ficar esperando entre dois estágios do pipeline extract -> transform -> load (etl_pipeline.py).
+# Limita a memória: no máximo ~2 * PIPELINE_QUEUE_SIZE + 3 blocos vivos por etapa
+PIPELINE_QUEUE_SIZE = 2
+
+# Pool de conexões compartilhado por todas as etapas de uma execução do ETL
+# (máximo de conexões abertas por banco, OLTP e DW separadamente)
+POOL_MAX_CONNECTIONS = 8
+
+# Ajustes de sessão aplicados às conexões do DW durante as cargas.
+# synchronous_commit=off não arrisca consistência (no pior caso perde os últimos commits num crash do servidor,
+# e o ETL é reexecutável); work_mem maior ajuda nos merges/ordenações das cargas em conjunto
+DW_SESSION_SETTINGS = {
+    'synchronous_commit': 'off',
+    'work_mem': '256MB',
+    'maintenance_work_mem': '512MB'
+}
+
+# Quantidade máxima de etapas do ETL (dimensões/fatos independentes) rodando ao mesmo tempo.
+# Cada etapa usa até uma conexão de cada pool, então mantenha abaixo de POOL_MAX_CONNECTIONS
+MAX_PARALLEL_STEPS = 4
+
+# Margem subtraída das marcas d'água por tabela (etl_watermark) na hora de extrair,
+# para pegar alterações commitadas com atraso perto da borda. Reprocessar essas linhas é inofensivo (UPSERT)
+WATERMARK_SAFETY_MARGIN_MINUTES = 5
+
+# Métricas de cada execução ficam sempre nas tabelas etl_run/etl_step_run do DW.
+# Se preenchido, também são acrescentadas neste arquivo como logs JSON (uma linha por etapa e uma por execução)
+ETL_JSON_LOG_FILE = None # ex: "etl_runs.jsonl"
+
+# Reconstrução completa em esquema sombra (python etl_main.py --rebuild): o DW novo é carregado em DW_SHADOW_SCHEMA
+# enquanto o atual continua no ar em DW_SCHEMA; no final os esquemas são trocados numa única transação e as tabelas
+# anteriores ficam em DW_PREVIOUS_SCHEMA até a próxima reconstrução (para conferência ou volta atrás)
+DW_SCHEMA = 'public'
+DW_SHADOW_SCHEMA = 'dw_sombra'
+DW_PREVIOUS_SCHEMA = 'dw_anterior'
@@ -1,6 +1,11 @@
-import pandas as pd
-from sqlalchemy import create_engine
+import argparse
+import csv
+import io
 import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+import psycopg2
 import chardet
 
 # Configurações de acesso ao seu banco PostgreSQL
@@ -13,8 +18,29 @@ banco = 'meu-caronae'
 # Caminho onde estão seus arquivos CSV
 pasta_csvs = 'D:/Daniel/UFRJ/TCC/Tabelas Banco/'
 
-# Conexão com o PostgreSQL
-engine = create_engine(f'postgresql://{usuario}:{senha}@{host}:{porta}/{banco}')
+# Arquivos importados ao mesmo tempo (um processo e uma conexão por arquivo)
+max_workers = 4
+# Linhas lidas de cada arquivo para inferir os tipos das colunas
+linhas_amostra = 10000
+# Linhas validadas e enviadas por COPY de cada vez
+linhas_por_bloco = 50000
+
+SEPARADOR = '|'
+VALORES_NULOS = {"", " ", "NULL", "null", "NaN", "nan"}
+COPY_NULL = '\\N'
+
+# Tipos inferidos da amostra -> tipo da coluna no PostgreSQL
+TIPOS_POSTGRES = {
+    'inteiro': 'BIGINT',
+    'decimal': 'DOUBLE PRECISION',
+    'booleano': 'BOOLEAN',
+    'timestamp': 'TIMESTAMP',
+    'texto': 'TEXT'
+}
+VALORES_BOOLEANOS = {'true': True, 't': True, 'false': False, 'f': False}
+
+def conectar():
+    return psycopg2.connect(dbname=banco, user=usuario, password=senha, host=host, port=porta)
 
 # Função para detectar encoding de um arquivo
 def detectar_encoding(caminho_arquivo, n_bytes=10000):
@@ -22,36 +48,211 @@ def detectar_encoding(caminho_arquivo, n_bytes=10000):
         resultado = chardet.detect(f.read(n_bytes))
         return resultado['encoding']
 
-# Loop pelos arquivos CSV
-for nome_arquivo in os.listdir(pasta_csvs):
-    if nome_arquivo.endswith('.csv'):
-        caminho_arquivo = os.path.join(pasta_csvs, nome_arquivo)
-        nome_tabela = os.path.splitext(nome_arquivo)[0].lower()
+def _valores_invalidos(valores, tipo):
+    """
+    Máscara (vetorizada) dos valores não nulos de uma coluna de texto que não podem ser convertidos para o tipo.
+    """
+    preenchidos = valores.notna()
+    if tipo == 'inteiro':
+        validos = valores.str.fullmatch(r'\s*[+-]?\d+\s*').fillna(False).astype(bool)
+    elif tipo == 'decimal':
+        validos = pd.to_numeric(valores, errors='coerce').notna()
+    elif tipo == 'booleano':
+        validos = valores.str.lower().isin(VALORES_BOOLEANOS.keys())
+    elif tipo == 'timestamp':
+        validos = pd.to_datetime(valores, errors='coerce', format='mixed').notna()
+    else:
+        return pd.Series(False, index=valores.index)
+    return preenchidos & ~validos
+
+def inferir_tipos(caminho_arquivo, encoding):
+    """Infere o tipo de cada coluna uma única vez, a partir das primeiras linhas_amostra linhas do arquivo."""
+    amostra = pd.read_csv(caminho_arquivo, sep=SEPARADOR, encoding=encoding, nrows=linhas_amostra,
+                          dtype=str, keep_default_na=False, on_bad_lines='skip')
+    amostra = amostra.where(~amostra.isin(VALORES_NULOS))
+
+    tipos = {}
+    for coluna in amostra.columns:
+        valores = amostra[coluna].dropna()
+        tipos[coluna] = 'texto'
+        if valores.empty:
+            continue
+        # Do tipo mais restrito para o mais geral
+        for tipo in ('inteiro', 'decimal', 'booleano', 'timestamp'):
+            if not _valores_invalidos(valores, tipo).any():
+                tipos[coluna] = tipo
+                break
+    return tipos
+
+def tipos_da_tabela_existente(conn, nome_tabela):
+    """Se a tabela já existe, os tipos dela valem mais do que os inferidos da amostra."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT column_name, data_type FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = %s;
+        """, (nome_tabela,))
+        colunas = cur.fetchall()
+
+    tipos = {}
+    for coluna, data_type in colunas:
+        if data_type in ('smallint', 'integer', 'bigint'):
+            tipos[coluna] = 'inteiro'
+        elif data_type in ('real', 'double precision', 'numeric'):
+            tipos[coluna] = 'decimal'
+        elif data_type == 'boolean':
+            tipos[coluna] = 'booleano'
+        elif data_type.startswith('timestamp') or data_type == 'date':
+            tipos[coluna] = 'timestamp'
+        else:
+            tipos[coluna] = 'texto'
+    return tipos
+
+def _nome_sql(nome):
+    return '"' + nome.replace('"', '""') + '"'
+
+def _copiar_bloco(cur, nome_tabela, cabecalho, tipos, linhas, rejeitados):
+    """Valida um bloco de linhas já separadas em campos e envia as válidas por COPY. Retorna quantas foram carregadas."""
+    bloco = pd.DataFrame([linha for _, linha in linhas], columns=cabecalho, dtype=object)
+    bloco = bloco.where(~bloco.isin(VALORES_NULOS))
 
-        print(f'\n📄 Importando {nome_arquivo} → tabela {nome_tabela}')
+    invalidas = pd.Series(False, index=bloco.index)
+    motivos = pd.Series('', index=bloco.index)
+    for coluna in cabecalho:
+        invalidas_coluna = _valores_invalidos(bloco[coluna], tipos.get(coluna, 'texto'))
+        motivos = motivos.where(~invalidas_coluna | invalidas, f"valor inválido para {coluna} ({tipos.get(coluna)})")
+        invalidas |= invalidas_coluna
 
-        # Detecta a codificação do arquivo
-        encoding = detectar_encoding(caminho_arquivo)
-        print(f'📌 Codificação detectada: {encoding}')
+    for posicao in invalidas[invalidas].index:
+        numero_linha, campos = linhas[posicao]
+        rejeitados.writerow([numero_linha, motivos[posicao]] + campos)
 
-        # Lê o arquivo CSV com tratamento de valores nulos
-        df = pd.read_csv(
-            caminho_arquivo,
-            sep='|',
-            encoding=encoding,
-            na_values=["", " ", "NULL", "null", "NaN", "nan"],
-            keep_default_na=True
-        )
+    validas = bloco[~invalidas].copy()
+    for coluna in cabecalho:
+        if tipos.get(coluna) == 'booleano':
+            validas[coluna] = validas[coluna].str.lower().map(VALORES_BOOLEANOS)
 
-        # Substitui NaNs por None (compatível com SQL)
-        df = df.where(pd.notnull(df), None)
+    return _copiar_com_bisseccao(cur, nome_tabela, cabecalho, validas, linhas, rejeitados)
 
-        for i, row in df.iterrows():
+def _copiar_com_bisseccao(cur, nome_tabela, cabecalho, validas, linhas, rejeitados):
+    """
+    Envia as linhas por COPY dentro de um savepoint. A validação acima é uma aproximação: se o PostgreSQL recusar
+    o bloco (e.g. um formato de data que o pandas aceita e ele não), o bloco é dividido ao meio e cada metade
+    é reenviada, até isolar as linhas recusadas, que vão para os rejeitados com a mensagem do banco.
+    Retorna quantas linhas foram carregadas.
+    """
+    if validas.empty:
+        return 0
+    buffer = io.StringIO()
+    validas.to_csv(buffer, index=False, header=False, na_rep=COPY_NULL)
+    buffer.seek(0)
+    colunas_sql = ', '.join(_nome_sql(coluna) for coluna in cabecalho)
+
+    cur.execute("SAVEPOINT bloco_copy;")
+    try:
+        cur.copy_expert(f"COPY {_nome_sql(nome_tabela)} ({colunas_sql}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')", buffer)
+    except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+        cur.execute("ROLLBACK TO SAVEPOINT bloco_copy;")
+        cur.execute("RELEASE SAVEPOINT bloco_copy;")
+        if len(validas) == 1:
+            numero_linha, campos = linhas[validas.index[0]]
+            rejeitados.writerow([numero_linha, f"recusada pelo PostgreSQL: {str(e).splitlines()[0]}"] + campos)
+            return 0
+        meio = len(validas) // 2
+        return (_copiar_com_bisseccao(cur, nome_tabela, cabecalho, validas.iloc[:meio], linhas, rejeitados)
+                + _copiar_com_bisseccao(cur, nome_tabela, cabecalho, validas.iloc[meio:], linhas, rejeitados))
+    cur.execute("RELEASE SAVEPOINT bloco_copy;")
+    return len(validas)
+
+def importar_arquivo(caminho_arquivo):
+    """
+    Importa um arquivo CSV (separado por '|') na tabela de mesmo nome, via COPY, em blocos.
+    Linhas com número de campos errado ou valores incompatíveis com o tipo da coluna vão para
+    <tabela>.rejeitados.csv (ao lado do CSV) em vez de interromper a importação.
+    Roda num processo separado: abre a própria conexão. Retorna (tabela, carregadas, rejeitadas).
+    """
+    nome_arquivo = os.path.basename(caminho_arquivo)
+    nome_tabela = os.path.splitext(nome_arquivo)[0].lower()
+    caminho_rejeitados = os.path.join(os.path.dirname(caminho_arquivo), f"{nome_tabela}.rejeitados.csv")
+
+    # Detecta a codificação do arquivo
+    encoding = detectar_encoding(caminho_arquivo)
+    print(f'📄 Importando {nome_arquivo} → tabela {nome_tabela} (codificação detectada: {encoding})')
+
+    conn = conectar()
+    carregadas = 0
+    rejeitadas = 0
+    try:
+        tipos = tipos_da_tabela_existente(conn, nome_tabela)
+        if not tipos:
+            tipos = inferir_tipos(caminho_arquivo, encoding)
+            colunas_ddl = ',\n    '.join(f"{_nome_sql(coluna)} {TIPOS_POSTGRES[tipo]}" for coluna, tipo in tipos.items())
+            with conn.cursor() as cur:
+                cur.execute(f"CREATE TABLE IF NOT EXISTS {_nome_sql(nome_tabela)} (\n    {colunas_ddl}\n);")
+
+        with open(caminho_arquivo, newline='', encoding=encoding, errors='replace') as arquivo, \
+             open(caminho_rejeitados, 'w', newline='', encoding='utf-8') as arquivo_rejeitados, \
+             conn.cursor() as cur:
+            leitor = csv.reader(arquivo, delimiter=SEPARADOR)
+            rejeitados = csv.writer(arquivo_rejeitados, delimiter=SEPARADOR)
+            cabecalho = next(leitor)
+            rejeitados.writerow(['linha', 'motivo'] + cabecalho)
+
+            linhas = []
+            for numero_linha, campos in enumerate(leitor, start=2):
+                if len(campos) != len(cabecalho):
+                    rejeitados.writerow([numero_linha, f"{len(campos)} campos, esperados {len(cabecalho)}"] + campos)
+                    rejeitadas += 1
+                    continue
+                linhas.append((numero_linha, campos))
+                if len(linhas) >= linhas_por_bloco:
+                    enviadas = _copiar_bloco(cur, nome_tabela, cabecalho, tipos, linhas, rejeitados)
+                    carregadas += enviadas
+                    rejeitadas += len(linhas) - enviadas
+                    linhas = []
+            if linhas:
+                enviadas = _copiar_bloco(cur, nome_tabela, cabecalho, tipos, linhas, rejeitados)
+                carregadas += enviadas
+                rejeitadas += len(linhas) - enviadas
+
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    if rejeitadas == 0:
+        os.remove(caminho_rejeitados)
+    return nome_tabela, carregadas, rejeitadas
+
+def importar_pasta(pasta, workers=max_workers):
+    """Importa todos os .csv da pasta, vários arquivos ao mesmo tempo num pool de processos."""
+    arquivos = sorted(os.path.join(pasta, nome) for nome in os.listdir(pasta) if nome.endswith('.csv'))
+    # Arquivos de rejeitados de execuções anteriores não são importados
+    arquivos = [arquivo for arquivo in arquivos if not re.search(r'\.rejeitados\.csv$', arquivo)]
+
+    falhas = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futuros = {executor.submit(importar_arquivo, arquivo): arquivo for arquivo in arquivos}
+        for futuro in as_completed(futuros):
+            nome_arquivo = os.path.basename(futuros[futuro])
             try:
-                row.to_frame().T.to_sql(nome_tabela, engine, index=False, if_exists='append')
+                nome_tabela, carregadas, rejeitadas = futuro.result()
+                aviso = f" ⚠️ {rejeitadas} linhas rejeitadas (ver {nome_tabela}.rejeitados.csv)" if rejeitadas else ""
+                print(f'✅ {nome_arquivo}: {carregadas} linhas carregadas em {nome_tabela}.{aviso}')
             except Exception as e:
-                print(f'Erro ao inserir linha {i}:', e)
-                print('Dados da linha:', row)
-                break
+                print(f'❌ Erro ao importar {nome_arquivo}: {e}')
+                falhas.append(nome_arquivo)
+    return falhas
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importa os CSVs do dump do Caronaê (separados por '|') no PostgreSQL via COPY.")
+    parser.add_argument('--pasta', default=pasta_csvs, help="Pasta com os arquivos .csv (um por tabela)")
+    parser.add_argument('--workers', type=int, default=max_workers, help="Arquivos importados em paralelo")
+    args = parser.parse_args()
 
-print('\n✅ Todas as tabelas foram importadas com sucesso!')
+    falhas = importar_pasta(args.pasta, args.workers)
+    if falhas:
+        print(f"\nImportação concluída com falhas em: {', '.join(falhas)}")
+    else:
+        print('\n✅ Todas as tabelas foram importadas com sucesso!')
@@ -1,11 +1,11 @@
 # dim_scripts/dim_flags_carona_etl.py
 import itertools
-from config import DB_DW
-from utils import connect_to_db
-from psycopg2.extras import execute_batch
+import numpy as np
+import pandas as pd
+from utils import get_etl_connections, release_etl_connections, bulk_upsert_dataframe
 
 # Mapeamento para os dias da semana (1=Segunda, ..., 7=Domingo) JÁ CHEQUEI E É ISSO MESMO
-# Isso deve ser consistente com o que foi usado na pré-população da dim_carona_flags
+# Isso deve ser consistente com o que foi usado na pré-população da dim_flags_carona
 DAY_NUM_TO_FLAG_COL = {
     1: 'is_routine_monday',
     2: 'is_routine_tuesday',
@@ -16,11 +16,12 @@ DAY_NUM_TO_FLAG_COL = {
     7: 'is_routine_sunday'
 }
 
-# Ordem das flags para lookup na dim_carona_flags (DEVE SER A MESMA DA CRIAÇÃO DA DIMENSÃO SUCATA)
+# Ordem das flags na dim_flags_carona (DEVE SER A MESMA DA CRIAÇÃO DA DIMENSÃO SUCATA)
+# A flag na posição i corresponde ao bit i do código inteiro da combinação (0 a 1023)
 FLAG_NAMES_ORDER = [
     'is_routine_ride',
     'is_going_to_campus',
-    'has_description', # Nova flag derivada da descrição
+    'done',
     'is_routine_monday',
     'is_routine_tuesday',
     'is_routine_wednesday',
@@ -29,89 +30,66 @@ FLAG_NAMES_ORDER = [
     'is_routine_saturday',
     'is_routine_sunday'
 ]
+FLAG_BITS = {name: 1 << position for position, name in enumerate(FLAG_NAMES_ORDER)}
 
-# Variável global para armazenar o lookup da dim_carona_flags
+# Variável global para armazenar o lookup da dim_flags_carona
+# Array indexado pelo código da combinação de flags -> flags_carona_sk (-1 se a combinação não existir)
 # Será populada uma vez por execução do ETL
-_CARONA_FLAGS_LOOKUP_DICT = {}
+_CARONA_FLAGS_LOOKUP = None
 
-def load_carona_flags_lookup(conn_dw):
-    """Carrega a dim_carona_flags para um dicionário de lookup em memória."""
-    global _CARONA_FLAGS_LOOKUP_DICT
+def encode_flags(flags_data, flag_names=FLAG_NAMES_ORDER):
+    """Empacota as colunas booleanas flag_names (de FLAG_NAMES_ORDER) num único código inteiro por linha."""
+    codes = np.zeros(len(flags_data), dtype=np.int64)
+    for name in flag_names:
+        codes |= flags_data[name].fillna(False).to_numpy(dtype=bool).astype(np.int64) * FLAG_BITS[name]
+    return codes
 
-    if _CARONA_FLAGS_LOOKUP_DICT: # Já carregado
-        return
-
-    print("Carregando dim_carona_flags para lookup em memória...")
-    try:
-        query = f"SELECT {', '.join(FLAG_NAMES_ORDER)}, carona_flags_sk FROM dim_carona_flags;"
-        flags_df = pd.read_sql(query, conn_dw)
-
-        # Cria o dicionário de lookup: (True, False, ..., True) -> carona_flags_sk
-        _CARONA_FLAGS_LOOKUP_DICT = {
-            tuple(row[col] for col in FLAG_NAMES_ORDER): row['carona_flags_sk']
-            for index, row in flags_df.iterrows()
-        }
-        print(f"dim_carona_flags carregada: {len(_CARONA_FLAGS_LOOKUP_DICT)} combinações.")
-    except Exception as e:
-        print(f"Erro ao carregar dim_carona_flags para lookup: {e}")
-        _CARONA_FLAGS_LOOKUP_DICT = {} # Limpa em caso de erro para tentar novamente se necessário
-
-
-def derive_and_lookup_flags(row_oltp):
+def week_days_to_mask(week_days):
+    """
+    Converte a coluna week_days do OLTP (e.g. '1,3,5') na máscara de bits dos dias da semana.
+    Valores nulos ou sem dias válidos (1 a 7) resultam em máscara 0.
     """
-    Deriva as flags booleanas para uma carona do OLTP e busca o carona_flags_sk correspondente.
+    week_days = week_days.fillna('').astype(str)
+    mask = np.zeros(len(week_days), dtype=np.int64)
+    for day_num, col_name in DAY_NUM_TO_FLAG_COL.items():
+        # O dígito não pode fazer parte de um número maior (e.g. '1' em '12')
+        has_day = week_days.str.contains(rf'(?<!\d){day_num}(?!\d)', regex=True).to_numpy(dtype=bool)
+        mask |= has_day.astype(np.int64) * FLAG_BITS[col_name]
+    return mask
+
+def load_carona_flags_lookup(conn_dw, force=False):
+    """Carrega a dim_flags_carona para um array de lookup em memória (código das flags -> flags_carona_sk)."""
+    global _CARONA_FLAGS_LOOKUP
+
+    if _CARONA_FLAGS_LOOKUP is not None and not force: # Já carregado
+        return _CARONA_FLAGS_LOOKUP
+
+    print("Carregando dim_flags_carona para lookup em memória...")
+    flags_df = pd.read_sql(f"SELECT {', '.join(FLAG_NAMES_ORDER)}, flags_carona_sk FROM dim_flags_carona WHERE flags_carona_sk <> -1;", conn_dw)
+
+    lookup = np.full(2 ** len(FLAG_NAMES_ORDER), -1, dtype=np.int64)
+    lookup[encode_flags(flags_df)] = flags_df['flags_carona_sk'].to_numpy(dtype=np.int64)
+    _CARONA_FLAGS_LOOKUP = lookup
+    print(f"dim_flags_carona carregada: {len(flags_df)} combinações.")
+    return _CARONA_FLAGS_LOOKUP
+
+def resolve_flags_carona_sks(rides_data, flags_lookup):
     """
-    # 1. Inicializar todas as flags como FALSE (estado padrão/desconhecido)
-    flags = {name: False for name in FLAG_NAMES_ORDER}
-
-    # 2. Derivar is_routine_ride e is_going_to_campus diretamente do OLTP
-    # Usar .get para segurança e pd.notna para tratar NaN/None de forma robusta
-    if pd.notna(row_oltp.get('is_routine_ride')) and row_oltp['is_routine_ride'] is True:
-        flags['is_routine_ride'] = True
-    
-    if pd.notna(row_oltp.get('is_going_to_campus')) and row_oltp['is_going_to_campus'] is True:
-        flags['is_going_to_campus'] = True
-    
-    # 3. Derivar has_description
-    if pd.notna(row_oltp.get('description')) and str(row_oltp['description']).strip() != '':
-        flags['has_description'] = True
-    
-    # 4. Derivar flags dos dias da semana (is_routine_monday, etc.)
-    # Apenas se a carona for de rotina E tiver dados válidos em week_days
-    if flags['is_routine_ride'] and pd.notna(row_oltp.get('week_days')):
-        week_days_str = str(row_oltp['week_days'])
-        try:
-            day_numbers = [int(d.strip()) for d in week_days_str.split(',') if d.strip()]
-            for day_num in day_numbers:
-                col_name = DAY_NUM_TO_FLAG_COL.get(day_num)
-                if col_name: # Se o número do dia for válido (1-7)
-                    flags[col_name] = True
-                # else: Ignorar números de dia inválidos (fora do range 1-7)
-        except ValueError:
-            # week_days_str estava malformada (ex: "abc"). Flags de dia permanecem FALSE.
-            print(f"Aviso: 'week_days' mal formatado para ride_id {row_oltp.get('id')}: '{week_days_str}'. Flags de dia definidas como FALSE.")
-    
-    # 5. Converter o dicionário de flags para uma tupla na ordem correta para o lookup
-    flags_tuple = tuple(flags[name] for name in FLAG_NAMES_ORDER)
-
-    # 6. Lookup no dicionário em memória
-    carona_flags_sk = _CARONA_FLAGS_LOOKUP_DICT.get(flags_tuple)
-    
-    if carona_flags_sk is None:
-        # Isso NÃO DEVE ACONTECER se a dimensão sucata foi pré-populada corretamente
-        # e se a lógica de derivação é consistente com a lógica de pré-população.
-        # Se acontecer, indica um erro grave ou nova combinação não esperada.
-        # Para robustez, você pode querer um SK para 'combinação desconhecida' aqui.
-        print(f"ERRO CRÍTICO: Combinação de flags não encontrada para ride_id {row_oltp.get('id')}: {flags_tuple}")
-        # Retornar um SK padrão para "combinação não mapeada" se você tiver um na dimensão
-        # Por exemplo, o SK para a combinação 'all false' ou um SK específico para erros.
-        # Para este exemplo, assumiremos que todas as combinações existem.
-        raise ValueError(f"Combinação de flags não encontrada: {flags_tuple}")
-
-    return carona_flags_sk
-
-def etl_dim_flags_carona():
-    conn_dw = connect_to_db(DB_DW)
+    Deriva as flags de cada carona e busca o flags_carona_sk correspondente, sem loop em Python:
+    as flags viram um código inteiro e o código indexa o array de lookup da dimensão.
+    rides_data precisa das colunas is_routine_ride, is_going_to_campus, done e week_days;
+    flags_lookup é o array devolvido por load_carona_flags_lookup.
+    Combinações não encontradas recebem o membro desconhecido (-1).
+    """
+    codes = encode_flags(rides_data, ['is_routine_ride', 'is_going_to_campus', 'done'])
+    # Os dias da semana só contam para caronas de rotina
+    is_routine = rides_data['is_routine_ride'].fillna(False).to_numpy(dtype=bool)
+    codes |= np.where(is_routine, week_days_to_mask(rides_data['week_days']), 0)
+
+    return pd.Series(flags_lookup[codes], index=rides_data.index)
+
+def etl_dim_flags_carona(conn_manager=None):
+    _, conn_dw = get_etl_connections(conn_manager, need_oltp=False)
     if not conn_dw:
         print("Erro de conexão. ETL DimFlagsCarona abortado.")
         return False
@@ -120,18 +98,7 @@ def etl_dim_flags_carona():
         # Definir as flags na ordem que queremos que apareçam
         # Lembre-se: 'is_routine_ride', 'is_going_to_campus' e 'done' já vêm do OLTP como booleanos
         # Os dias da semana são derivados da coluna week_days
-        flag_names = [
-            'is_routine_ride',
-            'is_going_to_campus',
-            'done',
-            'is_routine_monday',
-            'is_routine_tuesday',
-            'is_routine_wednesday',
-            'is_routine_thursday',
-            'is_routine_friday',
-            'is_routine_saturday',
-            'is_routine_sunday'
-        ]
+        flag_names = FLAG_NAMES_ORDER
 
         data_to_load = []
 
@@ -139,6 +106,11 @@ def etl_dim_flags_carona():
         for combination in itertools.product([False, True], repeat=len(flag_names)):
             flags_dict = dict(zip(flag_names, combination))
 
+            # Dias da semana só existem em caronas de rotina (é o que resolve_flags_carona_sks gera);
+            # as demais combinações teriam a mesma descrição e seriam descartadas pelo UNIQUE de forma arbitrária
+            if not flags_dict['is_routine_ride'] and any(flags_dict[col] for col in DAY_NUM_TO_FLAG_COL.values()):
+                continue
+
             # Criar uma descrição textual para a combinação
             description_parts = []
             if flags_dict['is_routine_ride']:
@@ -186,20 +158,13 @@ def etl_dim_flags_carona():
                 flags_description
             ))
         
-        print(f"Gerados {len(data_to_load)} registros para dim_flags_carona ({2**len(flag_names)} combinações).")
-
-        # Inserir usando execute_batch para melhor performance
-        insert_query = """
-        INSERT INTO dim_flags_carona (
-            is_routine_ride, is_going_to_campus, done,
-            is_routine_monday, is_routine_tuesday, is_routine_wednesday,
-            is_routine_thursday, is_routine_friday, is_routine_saturday, is_routine_sunday,
-            flags_description
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s);
-        """
-        with conn_dw.cursor() as cur:
-            execute_batch(cur, insert_query, data_to_load)
+        print(f"Gerados {len(data_to_load)} registros para dim_flags_carona (de {2**len(flag_names)} combinações possíveis).")
+
+        # Inserir via COPY + merge (combinações já existentes são ignoradas pela descrição única)
+        flags_data = pd.DataFrame(data_to_load, columns=flag_names + ['flags_description'])
+        bulk_upsert_dataframe(conn_dw, flags_data, 'dim_flags_carona', ['flags_description'], update_columns=[])
         conn_dw.commit()
+        load_carona_flags_lookup(conn_dw, force=True) # Mantém o lookup dos fatos alinhado com a dimensão recém-carregada
         print("Carga da dim_flags_carona concluída com sucesso.")
         return True
 
@@ -208,7 +173,7 @@ def etl_dim_flags_carona():
         print(f"Erro durante o ETL da DimFlagsCarona: {e}")
         return False
     finally:
-        if conn_dw: conn_dw.close()
+        release_etl_connections(conn_manager, None, conn_dw)
 
 # Exemplo de como chamar (para teste individual)
 if __name__ == "__main__":
@@ -1,18 +1,26 @@
 # dim_scripts/dim_hub_etl.py
 import pandas as pd
-from config import DB_OLTP, DB_DW
-from utils import connect_to_db
+from utils import get_etl_connections, release_etl_connections, bulk_upsert_dataframe, new_upsert_stats, format_upsert_stats, get_watermark, set_watermark, max_timestamp
+from etl_metrics import track_phase, set_step_info
 
-def etl_dim_hub():
-    conn_oltp = connect_to_db(DB_OLTP)
-    conn_dw = connect_to_db(DB_DW)
+def etl_dim_hub(conn_manager=None, sk_cache=None):
+    conn_oltp, conn_dw = get_etl_connections(conn_manager)
 
     if not conn_oltp or not conn_dw:
         print("Erro de conexão. ETL DimHub abortado.")
         return False
 
     try:
-        print("Extraindo dados de hubs, campi e institutions...")
+        # Carga incremental: campi e institutions têm created_at/updated_at, então usamos uma marca d'água para cada.
+        # A tabela hubs não tem timestamps: pólos ainda ausentes da dim_hub são sempre extraídos
+        campi_watermark = get_watermark(conn_dw, 'dim_hub', 'campi')
+        institutions_watermark = get_watermark(conn_dw, 'dim_hub', 'institutions')
+        with conn_dw.cursor() as cur:
+            cur.execute("SELECT hub_id FROM dim_hub WHERE hub_id <> -1;")
+            known_hub_ids = [row[0] for row in cur.fetchall()]
+
+        print(f"Extraindo dados de hubs, campi e institutions. A partir de: campi {campi_watermark}, institutions {institutions_watermark}")
+        set_step_info('dim_hub', watermark=f"campi={campi_watermark}; institutions={institutions_watermark}")
         # Inclui o nome e a cor do campus para desnormalizar
         query_extract_hubs = """
         SELECT
@@ -30,51 +38,41 @@ def etl_dim_hub():
             i.updated_at AS institution_updated_at
         FROM hubs h
         LEFT JOIN campi c ON h.campus_id = c.id
-        LEFT JOIN institutions i ON c.institution_id = i.id;
+        LEFT JOIN institutions i ON c.institution_id = i.id
+        WHERE c.created_at >= %(campi_watermark)s
+           OR c.updated_at >= %(campi_watermark)s
+           OR i.created_at >= %(institutions_watermark)s
+           OR i.updated_at >= %(institutions_watermark)s
+           OR NOT (h.id = ANY(%(known_hub_ids)s::int[])); -- Pólo novo
         """
-        hubs_data = pd.read_sql(query_extract_hubs, conn_oltp)
+        with track_phase('dim_hub', 'extract') as extract_phase:
+            hubs_data = pd.read_sql(query_extract_hubs, conn_oltp, params={
+                'campi_watermark': campi_watermark,
+                'institutions_watermark': institutions_watermark,
+                'known_hub_ids': known_hub_ids
+            })
+            extract_phase.rows = len(hubs_data)
         print(f"Extraídos {len(hubs_data)} pólos.")
 
-        hubs_data.rename(columns={'id': 'hub_id', 'name': 'hub_name'}, inplace=True)
-        hubs_data = hubs_data.replace({pd.NA: None, '': None})
+        with track_phase('dim_hub', 'transform', rows=len(hubs_data)):
+            hubs_data.rename(columns={'id': 'hub_id', 'name': 'hub_name'}, inplace=True)
+            hubs_data = hubs_data.replace({pd.NA: None, '': None})
 
         print("Carregando dados na dim_hub...")
-        from psycopg2.extras import execute_batch
-        insert_or_update_query = """
-        INSERT INTO dim_hub (
-            hub_id, hub_name, center,
-            campus_id, campus_name, campus_color, campus_created_at, campus_updated_at,
-            institution_id, institution_name, institution_created_at, institution_updated_at
-        ) VALUES (
-            %(hub_id)s, %(hub_name)s, %(center)s
-            %(campus_id)s, %(campus_name)s, %(campus_color)s, %(campus_created_at)s, %(campus_updated_at)s,
-             %(institution_id)s, %(institution_name)s, %(institution_created_at)s, %(institution_updated_at)s
-        )
-        ON CONFLICT (hub_id) DO UPDATE SET
-            hub_id = EXCLUDED.hub_id,
-            hub_name = EXCLUDED.hub_name,
-            center = EXCLUDED.center,
-            campus_id = EXCLUDED.campus_id,
-            campus_name = EXCLUDED.campus_name,
-            campus_color = EXCLUDED.campus_color,
-            campus_created_at = EXCLUDED.campus_created_at,
-            campus_updated_at = EXCLUDED.campus_updated_at,
-            institution_id = EXCLUDED.institution_id,
-            institution_name = EXCLUDED.institution_name,
-            institution_created_at = EXCLUDED.institution_created_at,
-            institution_updated_at = EXCLUDED.institution_updated_at;
-        """
-        data_to_load = hubs_data.to_dict(orient='records')
-
-        with conn_dw.cursor() as cur:
-            execute_batch(cur, insert_or_update_query, data_to_load)
-        conn_dw.commit()
-        print("Carga da dim_hub concluída.")
+        upsert_stats = new_upsert_stats()
+        with track_phase('dim_hub', 'load', rows=len(hubs_data)):
+            returned_sks = bulk_upsert_dataframe(conn_dw, hubs_data, 'dim_hub', ['hub_id'], returning=['hub_name', 'hub_sk'],
+                                                 row_hash_column='row_hash', stats=upsert_stats)
+            set_watermark(conn_dw, 'dim_hub', 'campi', max_timestamp(hubs_data, ['campus_created_at', 'campus_updated_at']))
+            set_watermark(conn_dw, 'dim_hub', 'institutions', max_timestamp(hubs_data, ['institution_created_at', 'institution_updated_at']))
+            conn_dw.commit()
+        if sk_cache is not None:
+            sk_cache.update('dim_hub', returned_sks)
+        print(f"Carga da dim_hub concluída ({format_upsert_stats(upsert_stats)}).")
         return True
 
     except Exception as e:
         print(f"Erro no ETL da DimHub: {e}")
         return False
     finally:
-        if conn_oltp: conn_oltp.close()
-        if conn_dw: conn_dw.close()
\ No newline at end of file
+        release_etl_connections(conn_manager, conn_oltp, conn_dw)
\ No newline at end of file
@@ -1,11 +1,10 @@
 # dim_scripts/dim_neighborhood_etl.py
 import pandas as pd
-from config import DB_OLTP, DB_DW
-from utils import connect_to_db
+from utils import get_etl_connections, release_etl_connections, bulk_upsert_dataframe, new_upsert_stats, format_upsert_stats
+from etl_metrics import track_phase
 
-def etl_dim_neighborhood():
-    conn_oltp = connect_to_db(DB_OLTP)
-    conn_dw = connect_to_db(DB_DW)
+def etl_dim_neighborhood(conn_manager=None, sk_cache=None):
+    conn_oltp, conn_dw = get_etl_connections(conn_manager)
 
     if not conn_oltp or not conn_dw:
         print("Erro de conexão. ETL DimNeighborhood abortado.")
@@ -25,38 +24,32 @@ def etl_dim_neighborhood():
         FROM neighborhoods n
         LEFT JOIN zones z ON n.zone_id = z.id;
         """
-        neighborhoods_data = pd.read_sql(query_extract_neighborhoods, conn_oltp)
+        with track_phase('dim_neighborhood', 'extract') as extract_phase:
+            neighborhoods_data = pd.read_sql(query_extract_neighborhoods, conn_oltp)
+            extract_phase.rows = len(neighborhoods_data)
         print(f"Extraídos {len(neighborhoods_data)} bairros.")
 
-        neighborhoods_data.rename(columns={
-            'id': 'neighborhood_id',
-            'name': 'neighborhood_name'
-        }, inplace=True)
-        neighborhoods_data = neighborhoods_data.replace({pd.NA: None, '': None})
+        with track_phase('dim_neighborhood', 'transform', rows=len(neighborhoods_data)):
+            neighborhoods_data.rename(columns={
+                'id': 'neighborhood_id',
+                'name': 'neighborhood_name'
+            }, inplace=True)
+            neighborhoods_data = neighborhoods_data.replace({pd.NA: None, '': None})
 
         print("Carregando dados na dim_neighborhood...")
-        from psycopg2.extras import execute_batch
-        insert_or_update_query = """
-        INSERT INTO dim_neighborhood (neighborhood_id, neighborhood_name, distance_to_fundao, zone_id, zone_name, zone_color)
-        VALUES (%(neighborhood_id)s, %(neighborhood_name)s, %(distance)s, %(zone_id)s %(zone_name)s, %(zone_color)s)
-        ON CONFLICT (neighborhood_id) DO UPDATE SET
-            neighborhood_name = EXCLUDED.neighborhood_name,
-            distance_to_fundao = EXCLUDED.distance_to_fundao,
-            zone_id = EXCLUDED.zone_id,
-            zone_name = EXCLUDED.zone_name,
-            zone_color = EXCLUDED.zone_color;
-        """
-        data_to_load = neighborhoods_data.to_dict(orient='records')
-
-        with conn_dw.cursor() as cur:
-            execute_batch(cur, insert_or_update_query, data_to_load)
-        conn_dw.commit()
-        print("Carga da dim_neighborhood concluída.")
+        upsert_stats = new_upsert_stats()
+        with track_phase('dim_neighborhood', 'load', rows=len(neighborhoods_data)):
+            returned_sks = bulk_upsert_dataframe(conn_dw, neighborhoods_data, 'dim_neighborhood', ['neighborhood_id'],
+                                                 returning=['neighborhood_name', 'neighborhood_sk'],
+                                                 row_hash_column='row_hash', stats=upsert_stats)
+            conn_dw.commit()
+        if sk_cache is not None:
+            sk_cache.update('dim_neighborhood', returned_sks)
+        print(f"Carga da dim_neighborhood concluída ({format_upsert_stats(upsert_stats)}).")
         return True
 
     except Exception as e:
         print(f"Erro no ETL da DimNeighborhood: {e}")
         return False
     finally:
-        if conn_oltp: conn_oltp.close()
-        if conn_dw: conn_dw.close()
\ No newline at end of file
+        release_etl_connections(conn_manager, conn_oltp, conn_dw)
\ No newline at end of file
@@ -1,10 +1,9 @@
 # dim_scripts/dim_status_pedido_etl.py
-from config import DB_DW
-from utils import connect_to_db
-from psycopg2.extras import execute_batch
+import pandas as pd
+from utils import get_etl_connections, release_etl_connections, bulk_upsert_dataframe
 
-def etl_dim_status_pedido():
-    conn_dw = connect_to_db(DB_DW)
+def etl_dim_status_pedido(conn_manager=None, sk_cache=None):
+    _, conn_dw = get_etl_connections(conn_manager, need_oltp=False)
     if not conn_dw:
         print("Erro de conexão. ETL DimStatusPedido abortado.")
         return False
@@ -20,17 +19,14 @@ def etl_dim_status_pedido():
         print("Carregando dados na dim_status_pedido...")
         
         # Usar UPSERT para garantir que os status existam, mas não duplicar
-        insert_or_update_query = """
-        INSERT INTO dim_status_pedido (status_name)
-        VALUES (%s)
-        ON CONFLICT (status_name) DO NOTHING; -- Não atualiza se já existir
-        """
-        # Formatar para execute_batch espera uma lista de tuplas
-        data_to_load = [(s,) for s in status_names]
-
-        with conn_dw.cursor() as cur:
-            execute_batch(cur, insert_or_update_query, data_to_load)
+        # (lista vazia de colunas de update = ON CONFLICT DO NOTHING, não atualiza se já existir)
+        status_data = pd.DataFrame({'status_name': status_names})
+        # Com DO NOTHING o RETURNING só traz os status novos (os já existentes já estão no cache)
+        returned_sks = bulk_upsert_dataframe(conn_dw, status_data, 'dim_status_pedido', ['status_name'], update_columns=[],
+                                             returning=['status_name', 'status_sk'])
         conn_dw.commit()
+        if sk_cache is not None:
+            sk_cache.update('dim_status_pedido', returned_sks)
         print("Carga da dim_status_pedido concluída.")
         return True
 
@@ -38,4 +34,4 @@ def etl_dim_status_pedido():
         print(f"Erro no ETL da DimStatusPedido: {e}")
         return False
     finally:
-        if conn_dw: conn_dw.close()
\ No newline at end of file
+        release_etl_connections(conn_manager, None, conn_dw)
\ No newline at end of file
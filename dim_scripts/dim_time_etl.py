@@ -1,78 +1,188 @@
 # dim_scripts/dim_time_etl.py
+import numpy as np
 import pandas as pd
-from datetime import datetime
-from config import DB_DW
-from utils import connect_to_db
+from datetime import timedelta
+from config import DIM_TIME_START_DATE, DIM_TIME_END_DATE, DIM_TIME_CHUNK_DAYS
+from utils import get_etl_connections, release_etl_connections, bulk_upsert_dataframe
+from etl_metrics import track_phase, timed_chunks
 
-def etl_dim_time():
-    conn_dw = connect_to_db(DB_DW)
+MINUTES_PER_DAY = 24 * 60
+
+# Faixas do dia indexadas por hour // 6 (0-5 Madrugada, 6-11 Manhã, 12-17 Tarde, 18-23 Noite)
+TIME_OF_DAY_BUCKETS = np.array(['Madrugada', 'Manhã', 'Tarde', 'Noite'], dtype=object)
+
+DIM_DATE_COLUMNS = [
+    'date_sk', 'full_date', 'day_of_week', 'day_name', 'day_of_month',
+    'month', 'month_name', 'semester', 'year'
+]
+DIM_TIME_OF_DAY_COLUMNS = ['hour_sk', 'hour_of_day', 'minute_of_hour', 'time_of_day_bucket']
+DIM_TIME_COLUMNS = DIM_DATE_COLUMNS + DIM_TIME_OF_DAY_COLUMNS
+
+def build_date_attributes(dates):
+    """Calcula os atributos de data (um registro por dia) de um DatetimeIndex, sem laço em Python."""
+    return pd.DataFrame({
+        'date_sk': np.asarray(dates.year * 10000 + dates.month * 100 + dates.day),
+        'full_date': np.asarray(dates.date),
+        'day_of_week': np.asarray(dates.dayofweek + 1), # 1=Monday, 7=Sunday
+        'day_name': np.asarray(dates.day_name()),
+        'day_of_month': np.asarray(dates.day),
+        'month': np.asarray(dates.month),
+        'month_name': np.asarray(dates.month_name()),
+        'semester': np.asarray((dates.month - 1) // 6 + 1),
+        'year': np.asarray(dates.year),
+    }, columns=DIM_DATE_COLUMNS)
+
+def build_time_of_day_attributes():
+    """Calcula os atributos de hora para os 1440 minutos de um dia."""
+    minute_of_day = np.arange(MINUTES_PER_DAY)
+    hour_of_day = minute_of_day // 60
+    minute_of_hour = minute_of_day % 60
+    return pd.DataFrame({
+        'hour_sk': hour_of_day * 100 + minute_of_hour, # ex: 1435 para 14:35
+        'hour_of_day': hour_of_day,
+        'minute_of_hour': minute_of_hour,
+        'time_of_day_bucket': TIME_OF_DAY_BUCKETS[hour_of_day // 6],
+    }, columns=DIM_TIME_OF_DAY_COLUMNS)
+
+def generate_dim_time_chunks(start_date, end_date, chunk_days=DIM_TIME_CHUNK_DAYS):
+    """
+    Gera a dim_time (grão de minuto) de forma vetorizada, em blocos de chunk_days dias.
+    Os atributos de data são calculados uma vez por dia e repetidos para os 1440 minutos;
+    os atributos de hora são calculados uma vez e repetidos para cada dia do bloco.
+    """
+    dates = pd.date_range(start=start_date, end=end_date, freq='D')
+    time_of_day = build_time_of_day_attributes()
+
+    for start in range(0, len(dates), chunk_days):
+        date_attributes = build_date_attributes(dates[start:start + chunk_days])
+        n_days = len(date_attributes)
+
+        chunk = {col: np.repeat(date_attributes[col].to_numpy(), MINUTES_PER_DAY) for col in DIM_DATE_COLUMNS}
+        chunk.update({col: np.tile(time_of_day[col].to_numpy(), n_days) for col in DIM_TIME_OF_DAY_COLUMNS})
+        yield pd.DataFrame(chunk, columns=DIM_TIME_COLUMNS)
+
+def get_loaded_date_bounds(conn_dw, table_name='dim_time'):
+    """Retorna (primeiro, último) dia já carregado na dim_time/dim_date (ignorando o membro desconhecido), ou (None, None)."""
+    with conn_dw.cursor() as cur:
+        cur.execute(f"SELECT MIN(full_date), MAX(full_date) FROM {table_name} WHERE date_sk <> -1;")
+        return cur.fetchone()
+
+def missing_date_ranges(start_date, end_date, first_loaded_date, last_loaded_date):
+    """
+    Faixas de [start_date, end_date] ainda fora da tabela, dado o primeiro e o último dia já carregados:
+    o trecho antes do primeiro (DIM_TIME_START_DATE recuado no config) e o trecho depois do último.
+    """
+    start_date, end_date = pd.Timestamp(start_date), pd.Timestamp(end_date)
+    if first_loaded_date is None:
+        return [(start_date, end_date)] if start_date <= end_date else []
+    first_loaded_date, last_loaded_date = pd.Timestamp(first_loaded_date), pd.Timestamp(last_loaded_date)
+    ranges = []
+    if start_date < first_loaded_date:
+        ranges.append((start_date, min(end_date, first_loaded_date - timedelta(days=1))))
+    if end_date > last_loaded_date:
+        ranges.append((max(start_date, last_loaded_date + timedelta(days=1)), end_date))
+    return ranges
+
+def _resolve_date_ranges(conn_dw, table_name, start_date, end_date):
+    """
+    Com start_date explícito, carrega [start_date, end_date]. Sem ele, só os dias entre DIM_TIME_START_DATE e
+    end_date que ainda faltam na tabela: antes do primeiro dia carregado e depois do último.
+    """
+    end_date = pd.Timestamp(end_date or DIM_TIME_END_DATE)
+    if start_date is not None:
+        start_date = pd.Timestamp(start_date)
+        return [(start_date, end_date)] if start_date <= end_date else []
+    first_loaded_date, last_loaded_date = get_loaded_date_bounds(conn_dw, table_name)
+    return missing_date_ranges(DIM_TIME_START_DATE, end_date, first_loaded_date, last_loaded_date)
+
+def etl_dim_time(start_date=None, end_date=None, conn_manager=None):
+    """
+    Carrega a dim_time entre start_date e end_date (padrão: DIM_TIME_START_DATE/DIM_TIME_END_DATE do config).
+    Sem start_date explícito, só acrescenta os dias que faltam antes do primeiro e depois do último já existentes.
+    """
+    _, conn_dw = get_etl_connections(conn_manager, need_oltp=False)
     if not conn_dw:
         print("Erro de conexão. ETL DimTime abortado.")
         return False
 
     try:
-        # Gerar datas para um período razoável (ex: 2016 a 2026)
-        start_date = datetime(2016, 4, 1)
-        end_date = datetime(2025, 12, 31)
-        
-        dates = pd.date_range(start=start_date, end=end_date, freq='D')
-        
-        data_to_load = []
-        for dt in dates:
-            # Gerar dados para a parte de data
-            date_sk = int(dt.strftime('%Y%m%d'))
-            full_date = dt.date()
-            day_of_week = dt.isoweekday() # 1=Monday, 7=Sunday
-            day_name = dt.strftime('%A')
-            day_of_month = dt.day
-            month = dt.month
-            month_name = dt.strftime('%B')
-            semester = (dt.month - 1) // 6 + 1
-            year = dt.year
-
-            # Para cada dia, gerar dados para todas as horas/minutos
-            for hour in range(24):
-                for minute in range(60):
-                    time_dt = dt.replace(hour=hour, minute=minute)
-                    hour_sk = int(time_dt.strftime('%H%M')) # ex: 1435 para 14:35
-                    hour_of_day = time_dt.hour
-                    minute_of_hour = time_dt.minute
-                    
-                    if 0 <= hour_of_day < 6:
-                        time_bucket = 'Madrugada'
-                    elif 6 <= hour_of_day < 12:
-                        time_bucket = 'Manhã'
-                    elif 12 <= hour_of_day < 18:
-                        time_bucket = 'Tarde'
-                    else:
-                        time_bucket = 'Noite'
-
-                    data_to_load.append((date_sk, full_date, day_of_week, day_name, day_of_month,
-                                         month, month_name, semester, year,
-                                         hour_sk, hour_of_day, minute_of_hour, time_bucket))
-        
-        print(f"Gerados {len(data_to_load)} registros para dim_time.")
-        print(f"Exemplo: {data_to_load[0]}")
-        print(f"Exemplo: {data_to_load[1]}")
-
-        # Inserir usando execute_batch para melhor performance
-        from psycopg2.extras import execute_batch
-        insert_query = """
-        INSERT INTO dim_time (
-            date_sk, full_date, day_of_week, day_name, day_of_month,
-            month, month_name, semester, year,
-            hour_sk, hour_of_day, minute_of_hour, time_of_day_bucket
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        ON CONFLICT (date_sk, hour_sk) DO NOTHING;
-        """
-        with conn_dw.cursor() as cur:
-            execute_batch(cur, insert_query, data_to_load)
-        conn_dw.commit()
+        date_ranges = _resolve_date_ranges(conn_dw, 'dim_time', start_date, end_date)
+
+        if not date_ranges:
+            print("dim_time já cobre o período configurado. Nada a carregar.")
+            return True
+
+        total_rows = 0
+        for range_start, range_end in date_ranges:
+            print(f"Gerando dim_time de {range_start.date()} até {range_end.date()}...")
+            for time_data in timed_chunks('dim_time', generate_dim_time_chunks(range_start, range_end), phase='transform'):
+                # Inserir via COPY + merge (DO NOTHING para não sobrescrever instantes já existentes)
+                with track_phase('dim_time', 'load', rows=len(time_data)):
+                    bulk_upsert_dataframe(conn_dw, time_data, 'dim_time', ['date_sk', 'hour_sk'], update_columns=[])
+                    conn_dw.commit()
+                total_rows += len(time_data)
+
+        print(f"Gerados {total_rows} registros para dim_time.")
         print("Carga da dim_time concluída.")
         return True
 
     except Exception as e:
+        conn_dw.rollback()
         print(f"Erro no ETL da DimTime: {e}")
         return False
     finally:
-        if conn_dw: conn_dw.close()
\ No newline at end of file
+        release_etl_connections(conn_manager, None, conn_dw)
+
+def etl_dim_date(start_date=None, end_date=None, conn_manager=None):
+    """
+    Carrega a dim_date (um registro por dia) para o modelo de tempo dividido.
+    Assim como a dim_time, sem start_date explícito só acrescenta os dias que faltam.
+    """
+    _, conn_dw = get_etl_connections(conn_manager, need_oltp=False)
+    if not conn_dw:
+        print("Erro de conexão. ETL DimDate abortado.")
+        return False
+
+    try:
+        date_ranges = _resolve_date_ranges(conn_dw, 'dim_date', start_date, end_date)
+
+        if not date_ranges:
+            print("dim_date já cobre o período configurado. Nada a carregar.")
+            return True
+
+        date_data = pd.concat([build_date_attributes(pd.date_range(start=start, end=end, freq='D'))
+                               for start, end in date_ranges], ignore_index=True)
+        print(f"Gerados {len(date_data)} registros para dim_date.")
+
+        bulk_upsert_dataframe(conn_dw, date_data, 'dim_date', ['date_sk'], update_columns=[])
+        conn_dw.commit()
+        print("Carga da dim_date concluída.")
+        return True
+
+    except Exception as e:
+        conn_dw.rollback()
+        print(f"Erro no ETL da DimDate: {e}")
+        return False
+    finally:
+        release_etl_connections(conn_manager, None, conn_dw)
+
+def etl_dim_time_of_day(conn_manager=None):
+    """Carrega os 1440 minutos do dia na dim_time_of_day (modelo de tempo dividido)."""
+    _, conn_dw = get_etl_connections(conn_manager, need_oltp=False)
+    if not conn_dw:
+        print("Erro de conexão. ETL DimTimeOfDay abortado.")
+        return False
+
+    try:
+        time_of_day_data = build_time_of_day_attributes()
+        bulk_upsert_dataframe(conn_dw, time_of_day_data, 'dim_time_of_day', ['hour_sk'], update_columns=[])
+        conn_dw.commit()
+        print("Carga da dim_time_of_day concluída.")
+        return True
+
+    except Exception as e:
+        conn_dw.rollback()
+        print(f"Erro no ETL da DimTimeOfDay: {e}")
+        return False
+    finally:
+        release_etl_connections(conn_manager, None, conn_dw)
@@ -1,11 +1,36 @@
 # dim_scripts/dim_user_etl.py
-import pandas as pd
-from config import DB_OLTP, DB_DW
-from utils import connect_to_db
+from utils import get_etl_connections, release_etl_connections, bulk_upsert_dataframe, new_upsert_stats, format_upsert_stats, extract_in_chunks, get_watermark, set_watermark, max_timestamp
+from etl_metrics import track_phase, timed_chunks, set_step_info
+from etl_pipeline import run_etl_pipeline
 
-def etl_dim_user():
-    conn_oltp = connect_to_db(DB_OLTP)
-    conn_dw = connect_to_db(DB_DW)
+# Colunas do carro que só valem quando o usuário tem carro
+CAR_COLUMNS = ['car_model', 'car_color', 'car_plate']
+# Colunas de texto com poucos valores distintos (repetidos em milhares de usuários): guardadas como category
+CATEGORICAL_COLUMNS = ['course', 'profile', 'app_platform', 'app_version', 'institution_name', 'institution_color']
+
+def transform_users_chunk(users_data):
+    """
+    Transforma um bloco de usuários extraídos do OLTP nas linhas da dim_user (operações vetorizadas).
+    Strings vazias/NaN viram NULL só na serialização para o COPY (dataframe_para_csv), sem copiar o bloco para object.
+    """
+    # 2. Transformação (Transform)
+    users_data['has_car'] = users_data['has_car'].astype('boolean')
+    users_data['is_banned'] = users_data['is_banned'].astype('boolean')
+
+    # Tratar valores nulos ou inconsistências (ex: car_model se has_car é falso)
+    without_car = ~users_data['has_car'].fillna(False).to_numpy(dtype=bool)
+    users_data.loc[without_car, CAR_COLUMNS] = None
+
+    # A categoria '' vira NULL (removê-la das categorias é mais barato que comparar cada linha)
+    for col in CATEGORICAL_COLUMNS:
+        categorical = users_data[col].astype('category')
+        if '' in categorical.cat.categories:
+            categorical = categorical.cat.remove_categories([''])
+        users_data[col] = categorical
+    return users_data
+
+def etl_dim_user(conn_manager=None, sk_cache=None):
+    conn_oltp, conn_dw = get_etl_connections(conn_manager)
 
     if not conn_oltp or not conn_dw:
         print("Erro de conexão. ETL DimUser abortado.")
@@ -13,7 +38,11 @@ def etl_dim_user():
 
     try:
         # 1. Extração (Extract) do OLTP
-        print("Extraindo dados de users e institutions...")
+        # Carga incremental: só usuários (ou instituições) criados/alterados/deletados desde a última marca d'água
+        users_watermark = get_watermark(conn_dw, 'dim_user', 'users')
+        institutions_watermark = get_watermark(conn_dw, 'dim_user', 'institutions')
+        print(f"Extraindo dados de users e institutions. A partir de: users {users_watermark}, institutions {institutions_watermark}")
+        set_step_info('dim_user', watermark=f"users={users_watermark}; institutions={institutions_watermark}")
         query_extract_users = """
         SELECT
             u.id AS user_id,
@@ -36,73 +65,58 @@ def etl_dim_user():
             i.color AS institution_color,
             u.created_at,
             u.updated_at,
-            u.deleted_at
+            u.deleted_at,
+            GREATEST(i.created_at, i.updated_at) AS institution_changed_at -- Só para a marca d'água, não é carregada
         FROM users u
-        LEFT JOIN institutions i ON u.institution_id = i.id;
+        LEFT JOIN institutions i ON u.institution_id = i.id
+        WHERE u.created_at >= %(users_watermark)s
+           OR u.updated_at >= %(users_watermark)s
+           OR u.deleted_at >= %(users_watermark)s
+           OR i.created_at >= %(institutions_watermark)s -- Instituição desnormalizada na dim_user mudou
+           OR i.updated_at >= %(institutions_watermark)s;
         """
-        users_data = pd.read_sql(query_extract_users, conn_oltp)
-        print(f"Extraídos {len(users_data)} usuários.")
+        watermark_params = {'users_watermark': users_watermark, 'institutions_watermark': institutions_watermark}
 
-        # 2. Transformação (Transform)
+        # Extração, transformação e carga em pipeline (cursor do lado do servidor + filas limitadas, ver etl_pipeline.py)
+        total_users = 0
+        upsert_stats = new_upsert_stats()
+        users_high_water_mark = None
+        institutions_high_water_mark = None
 
-        # Tratar valores nulos ou inconsistências (ex: car_model se has_car é falso)
-        users_data['car_model'] = users_data.apply(lambda row: row['car_model'] if row['has_car'] else None, axis=1)
-        users_data['car_color'] = users_data.apply(lambda row: row['car_color'] if row['has_car'] else None, axis=1)
-        users_data['car_plate'] = users_data.apply(lambda row: row['car_plate'] if row['has_car'] else None, axis=1)
-        
-        # Garantir que strings vazias ou NaN sejam None para NULL no banco
-        users_data = users_data.replace({pd.NA: None, '': None})
+        def transform_chunk(users_data):
+            nonlocal users_high_water_mark, institutions_high_water_mark
+            # Novas marcas d'água: maiores timestamps efetivamente extraídos de cada origem
+            # (só são gravadas se o pipeline inteiro terminar sem erro)
+            users_high_water_mark = max_timestamp(users_data, ['created_at', 'updated_at', 'deleted_at'], users_high_water_mark)
+            institutions_high_water_mark = max_timestamp(users_data, ['institution_changed_at'], institutions_high_water_mark)
+            with track_phase('dim_user', 'transform', rows=len(users_data)):
+                return transform_users_chunk(users_data.drop(columns=['institution_changed_at']))
 
-        # 3. Carga (Load) no DW
-        print("Carregando dados na dim_user...")
-        
-        # Usar UPSERT (ON CONFLICT) para lidar com novas inserções e atualizações de usuários
-        # Isso atua como um SCD Tipo 1 (atualiza o registro existente)
-        from psycopg2.extras import execute_batch
-        insert_or_update_query = """
-        INSERT INTO dim_user (
-            user_id, user_name, profile, course, 
-            phone_number, email, has_car,
-            car_model, car_color, car_plate,
-            user_location, cpf, app_platform, app_version,
-            is_banned, institution_id, institution_name, institution_color,
-            created_at, updated_at, deleted_at
-        ) VALUES (
-            %(user_id)s, %(user_name)s, %(profile)s, %(course)s,
-            %(phone_number)s, %(email)s, %(has_car)s,
-            %(car_model)s, %(car_color)s, %(car_plate)s,
-            %(user_location)s, %(cpf)s, %(app_platform)s, %(app_version)s,
-            %(is_banned)s, %(institution_id)s, %(institution_name)s, %(institution_color)s,
-            %(created_at)s, %(updated_at)s, %(deleted_at)s
-        ) ON CONFLICT (user_id) DO UPDATE SET
-            user_name = EXCLUDED.user_name,
-            profile = EXCLUDED.profile,
-            course = EXCLUDED.course,
-            phone_number = EXCLUDED.phone_number,
-            email = EXCLUDED.email,
-            has_car = EXCLUDED.has_car,
-            car_model = EXCLUDED.car_model,
-            car_color = EXCLUDED.car_color,
-            car_plate = EXCLUDED.car_plate,
-            user_location = EXCLUDED.user_location,
-            cpf = EXCLUDED.cpf,
-            app_platform = EXCLUDED.app_platform,
-            app_version = EXCLUDED.app_version,
-            is_banned = EXCLUDED.is_banned,
-            institution_id = EXCLUDED.institution_id;
-            institution_name = EXCLUDED.institution_name;
-            institution_color = EXCLUDED.institution_color;
-            created_at = EXCLUDED.created_at;
-            updated_at = EXCLUDED.updated_at;
-            deleted_at = EXCLUDED.deleted_at;
-        """
-        
-        # Converter DataFrame para lista de dicionários para execute_batch
-        data_to_load = users_data.to_dict(orient='records')
+        def load_chunk(users_data):
+            nonlocal total_users
+            # 3. Carga (Load) no DW
+            # Usar UPSERT (ON CONFLICT) para lidar com novas inserções e atualizações de usuários
+            # Isso atua como um SCD Tipo 1 (atualiza o registro existente)
+            # A carga passa por COPY numa staging e um único merge baseado em conjunto
+            # RETURNING devolve as SKs geradas/atualizadas para o cache compartilhado com os fatos
+            # Só usuários novos ou com hash diferente do armazenado são escritos
+            with track_phase('dim_user', 'load', rows=len(users_data)):
+                returned_sks = bulk_upsert_dataframe(conn_dw, users_data, 'dim_user', ['user_id'], returning=['user_id', 'user_sk'],
+                                                     row_hash_column='row_hash', stats=upsert_stats)
+                conn_dw.commit()
+            if sk_cache is not None:
+                sk_cache.update('dim_user', returned_sks)
+            total_users += len(users_data)
+            print(f"  - Bloco carregado na dim_user: {len(users_data)} usuários (total: {total_users}).")
+
+        run_etl_pipeline(timed_chunks('dim_user', extract_in_chunks(conn_oltp, query_extract_users, watermark_params)),
+                         transform_chunk, load_chunk)
 
-        with conn_dw.cursor() as cur:
-            execute_batch(cur, insert_or_update_query, data_to_load)
+        # Só avança as marcas d'água depois que todos os blocos foram carregados
+        set_watermark(conn_dw, 'dim_user', 'users', users_high_water_mark)
+        set_watermark(conn_dw, 'dim_user', 'institutions', institutions_high_water_mark)
         conn_dw.commit()
+        print(f"Extraídos {total_users} usuários ({format_upsert_stats(upsert_stats)}).")
         print("Carga da dim_user concluída.")
         return True
 
@@ -110,5 +124,4 @@ def etl_dim_user():
         print(f"Erro no ETL da DimUser: {e}")
         return False
     finally:
-        if conn_oltp: conn_oltp.close()
-        if conn_dw: conn_dw.close()
\ No newline at end of file
+        release_etl_connections(conn_manager, conn_oltp, conn_dw)
\ No newline at end of file
@@ -1,12 +1,14 @@
 # etl_main.py
 from datetime import datetime, timedelta
+import argparse
 import os
+import re
 import sys
 
 # Adiciona o diretório raiz do projeto ao PATH para importações relativas
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from dim_scripts.dim_time_etl import etl_dim_time
+from dim_scripts.dim_time_etl import etl_dim_time, etl_dim_date, etl_dim_time_of_day
 from dim_scripts.dim_user_etl import etl_dim_user
 from dim_scripts.dim_neighborhood_etl import etl_dim_neighborhood
 from dim_scripts.dim_hub_etl import etl_dim_hub
@@ -15,10 +17,18 @@ from dim_scripts.dim_flags_carona_etl import etl_dim_flags_carona
 
 from fact_scripts.fact_carona_etl import etl_fact_carona
 from fact_scripts.fact_interacao_carona_etl import etl_fact_interacao_carona
-
-from utils import connect_to_db, execute_sql, insert_unknown_dim_member
-from sql_queries import get_queries
-from config import DB_OLTP, DB_DW, LAST_RUN_FILE
+from fact_scripts.fact_carona_diaria_etl import etl_fact_carona_diaria
+
+from utils import (execute_sql, insert_unknown_dim_member, ETLConnectionManager, get_checkpoint, save_checkpoint, get_completed_steps,
+                   connect_to_db, detach_date_partitions_before)
+from etl_scheduler import ETLStep, run_etl_steps, STEP_OK, STEP_FAILED
+from sk_cache import SurrogateKeyCache
+from etl_metrics import reset_metrics, track_phase, start_etl_run, finish_etl_run, get_resumable_etl_run, resume_etl_run
+from etl_profiling import profile_step
+from etl_pipeline import set_sequential
+from sql_queries import get_queries, get_table_name, split_deferred_constraints, SCHEMA_MIGRATIONS, ETL_CONTROL_TABLES
+from config import (DB_OLTP, DB_DW, LAST_RUN_FILE, DIM_TIME_SPLIT, MAX_PARALLEL_STEPS, ETL_JSON_LOG_FILE, DW_SESSION_SETTINGS,
+                    DW_SCHEMA, DW_SHADOW_SCHEMA, DW_PREVIOUS_SCHEMA)
 
 def get_last_etl_run_date():
     """Lê a última data de execução do arquivo de controle."""
@@ -36,7 +46,7 @@ def set_last_etl_run_date(dt):
     with open(LAST_RUN_FILE, 'w') as f:
         f.write(dt.strftime("%Y-%m-%d %H:%M:%S.%f"))
 
-def create_dw_tables(conn_dw, recria_dim_time, recria_dim_flags_carona):
+def create_dw_tables(conn_dw, recria_dim_time, recria_dim_flags_carona, split_dim_time=DIM_TIME_SPLIT):
     """
     Dropa todas as tabelas existentes no DW e as recria.
     Isso garante um ambiente limpo para cada execução completa do ETL.
@@ -45,7 +55,8 @@ def create_dw_tables(conn_dw, recria_dim_time, recria_dim_flags_carona):
     print("Verificando e recriando tabelas do Data Warehouse...")
 
     # Retorna as queries de DDL baseado na configuração requisitada para as duas tabelas pré-populadas
-    DROP_QUERIES, CREATE_QUERIES = get_queries(recria_dim_time=recria_dim_time, recria_dim_flags_carona=recria_dim_flags_carona)
+    DROP_QUERIES, CREATE_QUERIES = get_queries(recria_dim_time=recria_dim_time, recria_dim_flags_carona=recria_dim_flags_carona,
+                                               split_dim_time=split_dim_time)
     
     try:
         cur = conn_dw.cursor()
@@ -85,10 +96,198 @@ def create_dw_tables(conn_dw, recria_dim_time, recria_dim_flags_carona):
     finally:
         cur.close()
 
+def ensure_dw_tables(conn_dw, split_dim_time=DIM_TIME_SPLIT):
+    """
+    Modo incremental: mantém as tabelas e os dados existentes no DW.
+    Cria apenas as tabelas que ainda não existem e aplica as migrações idempotentes de sql_queries.SCHEMA_MIGRATIONS.
+    Retorna a lista de tabelas criadas nesta execução, ou None em caso de falha.
+    """
+    print("Verificando esquema do Data Warehouse (modo incremental, sem DROP)...")
+
+    # Todas as tabelas do modelo, como numa criação do zero
+    _, CREATE_QUERIES = get_queries(recria_dim_time=True, recria_dim_flags_carona=True, split_dim_time=split_dim_time)
+
+    try:
+        with conn_dw.cursor() as cur:
+            cur.execute("""
+                SELECT table_name FROM information_schema.tables
+                WHERE table_schema = current_schema();
+            """)
+            existing_tables = {row[0] for row in cur.fetchall()}
+
+            created_tables = []
+            for query in CREATE_QUERIES:
+                table_name = get_table_name(query)
+                if table_name in existing_tables:
+                    continue
+                cur.execute(query)
+                conn_dw.commit()
+                created_tables.append(table_name)
+                print(f"  - Tabela ausente criada: {table_name}")
+
+            for migration in SCHEMA_MIGRATIONS:
+                cur.execute(migration)
+                conn_dw.commit()
+
+        if SCHEMA_MIGRATIONS:
+            print(f"  - {len(SCHEMA_MIGRATIONS)} migrações idempotentes aplicadas.")
+        print(f"Esquema do DW verificado: {len(created_tables)} tabelas criadas, demais mantidas com seus dados.")
+        return created_tables
+
+    except Exception as e:
+        conn_dw.rollback()
+        print(f"Erro fatal ao verificar/migrar o esquema do DW: {e}")
+        return None
+
+def get_shadow_create_queries(split_dim_time=DIM_TIME_SPLIT):
+    """DDLs das tabelas do modelo (sem as tabelas de controle), como são recriadas no esquema sombra."""
+    _, CREATE_QUERIES = get_queries(recria_dim_time=True, recria_dim_flags_carona=True, split_dim_time=split_dim_time)
+    return [query for query in CREATE_QUERIES if get_table_name(query) not in ETL_CONTROL_TABLES]
+
+def _list_partitions(cur, schema, table_name):
+    cur.execute("""
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(%s);
+    """, (f"{schema}.{table_name}",))
+    return [row[0] for row in cur.fetchall()]
+
+def create_shadow_dw_tables(conn_dw, recria_dim_time, split_dim_time=DIM_TIME_SPLIT):
+    """
+    Início da reconstrução (--rebuild): cria do zero o esquema sombra com todas as tabelas do modelo, UNLOGGED e sem
+    as FKs/chaves primárias dos fatos (ver sql_queries.split_deferred_constraints). O DW atual não é tocado.
+    As conexões do DW precisam ter search_path '<sombra>, <DW>' para as etapas carregarem no esquema sombra.
+    Sem recria_dim_time, as tabelas de tempo são copiadas do DW atual (o ETL delas só acrescenta os dias que faltarem).
+    Retorna True em caso de sucesso, False em caso de falha.
+    """
+    print(f"Preparando o esquema sombra '{DW_SHADOW_SCHEMA}' para a reconstrução do DW...")
+    try:
+        with conn_dw.cursor() as cur:
+            # Sobra de uma reconstrução que falhou: descartada
+            cur.execute(f"DROP SCHEMA IF EXISTS {DW_SHADOW_SCHEMA} CASCADE;")
+            conn_dw.commit()
+
+        with conn_dw.cursor() as cur:
+            # Só as tabelas de controle (etl_run, ...) são garantidas no esquema do DW: sem o esquema sombra,
+            # o search_path cai nele. As tabelas do modelo só chegam lá pela troca de esquemas
+            _, CREATE_QUERIES = get_queries(recria_dim_time=False, recria_dim_flags_carona=False, split_dim_time=split_dim_time)
+            for query in CREATE_QUERIES:
+                if get_table_name(query) in ETL_CONTROL_TABLES:
+                    cur.execute(query)
+            conn_dw.commit()
+
+            cur.execute(f"CREATE SCHEMA {DW_SHADOW_SCHEMA};")
+            for query in get_shadow_create_queries(split_dim_time):
+                ddl, _ = split_deferred_constraints(query)
+                cur.execute(ddl)
+                print(f"  - Tabela criada no esquema sombra: {get_table_name(ddl)}")
+
+            if not recria_dim_time:
+                time_tables = ['dim_date', 'dim_time_of_day'] if split_dim_time else ['dim_time']
+                for table_name in time_tables:
+                    cur.execute("SELECT to_regclass(%s) IS NOT NULL;", (f"{DW_SCHEMA}.{table_name}",))
+                    if cur.fetchone()[0]:
+                        cur.execute(f"INSERT INTO {DW_SHADOW_SCHEMA}.{table_name} SELECT * FROM {DW_SCHEMA}.{table_name};")
+                        print(f"  - {table_name} copiada do DW atual ({cur.rowcount} linhas).")
+        conn_dw.commit()
+        return True
+
+    except Exception as e:
+        conn_dw.rollback()
+        print(f"Erro fatal ao preparar o esquema sombra: {e}")
+        return False
+
+def finalize_shadow_dw_tables(conn_dw, split_dim_time=DIM_TIME_SPLIT):
+    """
+    Fim da carga no esquema sombra: torna as tabelas LOGGED, cria as constraints adiadas e roda ANALYZE.
+    FKs são criadas com NOT VALID + VALIDATE. Nos fatos particionados (onde o Postgres não aceita NOT VALID na
+    tabela mãe) isso é feito partição a partição, e a FK da tabela mãe só anexa as já validadas.
+    Retorna True em caso de sucesso, False em caso de falha.
+    """
+    print(f"\n--- Finalizando as tabelas do esquema sombra '{DW_SHADOW_SCHEMA}' ---")
+    try:
+        with conn_dw.cursor() as cur:
+            # 1. Cada tabela é escrita no WAL uma única vez, já com todos os dados
+            cur.execute("""
+                SELECT c.relname FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+                WHERE n.nspname = %s AND c.relkind = 'r' AND c.relpersistence = 'u';
+            """, (DW_SHADOW_SCHEMA,))
+            for (table_name,) in cur.fetchall():
+                cur.execute(f"ALTER TABLE {DW_SHADOW_SCHEMA}.{table_name} SET LOGGED;")
+                conn_dw.commit()
+            print("  - Tabelas convertidas para LOGGED.")
+
+            # 2. Chaves primárias e FKs adiadas
+            shadow_tables = []
+            for query in get_shadow_create_queries(split_dim_time):
+                table_name = get_table_name(query)
+                shadow_tables.append(table_name)
+                partitions = _list_partitions(cur, DW_SHADOW_SCHEMA, table_name)
+                _, deferred_constraints = split_deferred_constraints(query)
+                for constraint in deferred_constraints:
+                    constraint = constraint.replace("REFERENCES ", f"REFERENCES {DW_SHADOW_SCHEMA}.")
+                    if not constraint.startswith('FOREIGN KEY'):
+                        cur.execute(f"ALTER TABLE {DW_SHADOW_SCHEMA}.{table_name} ADD {constraint};")
+                        continue
+                    columns = re.search(r"FOREIGN KEY \(([^)]*)\)", constraint).group(1).replace(' ', '').replace(',', '_')
+                    for relation in (partitions or [table_name]):
+                        constraint_name = f"{relation}_{columns}_fkey"
+                        cur.execute(f"ALTER TABLE {DW_SHADOW_SCHEMA}.{relation} ADD CONSTRAINT {constraint_name} {constraint} NOT VALID;")
+                        cur.execute(f"ALTER TABLE {DW_SHADOW_SCHEMA}.{relation} VALIDATE CONSTRAINT {constraint_name};")
+                    if partitions:
+                        cur.execute(f"ALTER TABLE {DW_SHADOW_SCHEMA}.{table_name} ADD CONSTRAINT {table_name}_{columns}_fkey {constraint};")
+                conn_dw.commit()
+                if deferred_constraints:
+                    print(f"  - {len(deferred_constraints)} constraints criadas em {table_name}.")
+
+            # 3. Estatísticas para o planejador antes de as tabelas entrarem no ar
+            for table_name in shadow_tables:
+                cur.execute(f"ANALYZE {DW_SHADOW_SCHEMA}.{table_name};")
+            conn_dw.commit()
+            print("  - ANALYZE concluído.")
+        return True
+
+    except Exception as e:
+        conn_dw.rollback()
+        print(f"Erro fatal ao finalizar o esquema sombra: {e}")
+        return False
+
+def swap_shadow_dw_schema(conn_dw, split_dim_time=DIM_TIME_SPLIT):
+    """
+    Coloca o DW reconstruído no ar: numa única transação, as tabelas do modelo em DW_SCHEMA (com suas partições) vão
+    para DW_PREVIOUS_SCHEMA e as do esquema sombra tomam o lugar delas. Quem consulta o DW vê o antigo ou o novo,
+    nunca um DW vazio. As tabelas de controle não mudam. Retorna True em caso de sucesso, False em caso de falha.
+    """
+    print(f"\n--- Trocando '{DW_SHADOW_SCHEMA}' -> '{DW_SCHEMA}' ---")
+    try:
+        with conn_dw.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {DW_PREVIOUS_SCHEMA} CASCADE;")
+            cur.execute(f"CREATE SCHEMA {DW_PREVIOUS_SCHEMA};")
+            for query in get_shadow_create_queries(split_dim_time):
+                table_name = get_table_name(query)
+                for from_schema, to_schema in ((DW_SCHEMA, DW_PREVIOUS_SCHEMA), (DW_SHADOW_SCHEMA, DW_SCHEMA)):
+                    cur.execute("SELECT to_regclass(%s) IS NOT NULL;", (f"{from_schema}.{table_name}",))
+                    if not cur.fetchone()[0]:
+                        continue
+                    partitions = _list_partitions(cur, from_schema, table_name)
+                    cur.execute(f"ALTER TABLE {from_schema}.{table_name} SET SCHEMA {to_schema};")
+                    for partition_name in partitions:
+                        cur.execute(f"ALTER TABLE {from_schema}.{partition_name} SET SCHEMA {to_schema};")
+            # O que sobrou no esquema sombra (e.g. tabelas de staging) vai embora junto com ele
+            cur.execute(f"DROP SCHEMA {DW_SHADOW_SCHEMA} CASCADE;")
+        conn_dw.commit()
+        print(f"DW reconstruído no ar. As tabelas anteriores ficam em '{DW_PREVIOUS_SCHEMA}' até a próxima reconstrução.")
+        return True
+
+    except Exception as e:
+        conn_dw.rollback()
+        print(f"Erro fatal na troca de esquemas (o DW anterior continua no ar): {e}")
+        return False
+
 # --- NOVA FUNÇÃO PARA INSERIR TODOS OS MEMBROS DESCONHECIDOS ---
-def insert_all_unknown_dim_members(conn_dw):
+def insert_all_unknown_dim_members(conn_dw, split_dim_time=DIM_TIME_SPLIT):
     """
     Insere o membro 'Desconhecido' em todas as tabelas de dimensão.
+    split_dim_time: Se True, usa dim_date + dim_time_of_day no lugar da dim_time.
     """
     print("\n--- Inserindo membros 'Desconhecidos' nas Dimensões ---")
 
@@ -109,7 +308,21 @@ def insert_all_unknown_dim_members(conn_dw):
         'minute_of_hour': -1,
         'time_of_day_bucket': 'Desconhecido'
     }
-    if not insert_unknown_dim_member(conn_dw, 'dim_time', ['date_sk', 'hour_sk'], dim_time_unknown_values):
+    if split_dim_time:
+        # --- dim_date e dim_time_of_day (modelo dividido): mesmos valores, separados por tabela ---
+        dim_date_columns = ['date_sk', 'full_date', 'day_of_week', 'day_name', 'day_of_month',
+                            'month', 'month_name', 'semester', 'year']
+        dim_date_unknown_values = {col: dim_time_unknown_values[col] for col in dim_date_columns}
+        if not insert_unknown_dim_member(conn_dw, 'dim_date', ['date_sk'], dim_date_unknown_values):
+            print("Falha ao inserir membro 'Desconhecido' para dim_date.")
+            return False
+
+        dim_time_of_day_columns = ['hour_sk', 'hour_of_day', 'minute_of_hour', 'time_of_day_bucket']
+        dim_time_of_day_unknown_values = {col: dim_time_unknown_values[col] for col in dim_time_of_day_columns}
+        if not insert_unknown_dim_member(conn_dw, 'dim_time_of_day', ['hour_sk'], dim_time_of_day_unknown_values):
+            print("Falha ao inserir membro 'Desconhecido' para dim_time_of_day.")
+            return False
+    elif not insert_unknown_dim_member(conn_dw, 'dim_time', ['date_sk', 'hour_sk'], dim_time_unknown_values):
         print("Falha ao inserir membro 'Desconhecido' para dim_time.")
         return False
 
@@ -121,11 +334,11 @@ def insert_all_unknown_dim_members(conn_dw):
         'user_name': 'Desconhecido',
         'profile': 'Desconhecido',
         'course': 'Desconhecido',
-        'has_car': None,
+        'has_car': False,
         'car_model': 'Desconhecido',
         'car_color': 'Desconhecido',
         'car_plate': 'Desconhecido',
-        'is_banned': None,
+        'is_banned': False,
         'institution_name': 'Desconhecido'
     }
     if not insert_unknown_dim_member(conn_dw, 'dim_user', ['user_sk'], dim_user_unknown_values):
@@ -174,14 +387,97 @@ def insert_all_unknown_dim_members(conn_dw):
     print("--- Todos os membros 'Desconhecidos' inseridos com sucesso ---")
     return True
 
-def main_etl_process(apaga_ultimo_etl_run, recria_dim_time, recria_dim_flags_carona):
-    conn_oltp = None
+def build_etl_steps(conn_manager, last_run_date_str, recria_dim_flags_carona, split_dim_time=DIM_TIME_SPLIT, sk_cache=None, run_id=None):
+    """
+    Declara as etapas de dimensões e fatos e as dependências entre elas para o agendador.
+    sk_cache: cache de SKs compartilhado, atualizado pelas dimensões e consultado pelos fatos.
+    run_id: execução do ETL, usada pelos fatos para gravar (e retomar de) o checkpoint de cada bloco.
+    """
+    # A dim_time só é gerada por completo quando recriada; nas demais execuções
+    # apenas os dias novos até DIM_TIME_END_DATE (config.py) são acrescentados
+    if split_dim_time:
+        time_steps = [
+            ETLStep('dim_date', etl_dim_date, kwargs={'conn_manager': conn_manager}),
+            ETLStep('dim_time_of_day', etl_dim_time_of_day, kwargs={'conn_manager': conn_manager})
+        ]
+    else:
+        time_steps = [ETLStep('dim_time', etl_dim_time, kwargs={'conn_manager': conn_manager})]
+
+    # A dim_flags_carona só precisa ser carregada uma vez
+    flags_steps = []
+    if recria_dim_flags_carona:
+        flags_steps = [ETLStep('dim_flags_carona', etl_dim_flags_carona, kwargs={'conn_manager': conn_manager})]
+
+    dimension_steps = time_steps + flags_steps + [
+        ETLStep('dim_user', etl_dim_user, kwargs={'conn_manager': conn_manager, 'sk_cache': sk_cache}),
+        ETLStep('dim_neighborhood', etl_dim_neighborhood, kwargs={'conn_manager': conn_manager, 'sk_cache': sk_cache}),
+        ETLStep('dim_hub', etl_dim_hub, kwargs={'conn_manager': conn_manager, 'sk_cache': sk_cache}),
+        ETLStep('dim_status_pedido', etl_dim_status_pedido, kwargs={'conn_manager': conn_manager, 'sk_cache': sk_cache})
+    ]
+    time_step_names = [step.name for step in time_steps]
+    flags_step_names = [step.name for step in flags_steps]
+
+    fact_steps = [
+        ETLStep('fato_carona', etl_fact_carona,
+                depends_on=time_step_names + flags_step_names + ['dim_user', 'dim_neighborhood', 'dim_hub'],
+                kwargs={'last_etl_run_date_str': last_run_date_str, 'conn_manager': conn_manager, 'sk_cache': sk_cache, 'run_id': run_id}),
+        ETLStep('fato_interacao_carona', etl_fact_interacao_carona,
+                depends_on=time_step_names + ['dim_user', 'dim_status_pedido'],
+                kwargs={'last_etl_run_date_str': last_run_date_str, 'conn_manager': conn_manager, 'sk_cache': sk_cache, 'run_id': run_id})
+    ]
+    # Agregados: recalculados só para os dias tocados pelas cargas dos fatos
+    aggregate_steps = [
+        ETLStep('fato_carona_diaria', etl_fact_carona_diaria, depends_on=['fato_carona'], kwargs={'conn_manager': conn_manager})
+    ]
+    return dimension_steps + fact_steps + aggregate_steps
+
+def apply_fact_retention(cutoff_date, fact_tables=('fato_carona', 'fato_interacao_carona')):
+    """
+    Retenção dos fatos particionados (python etl_main.py --retencao AAAA-MM-DD): desanexa as partições que terminam
+    até cutoff_date. Elas continuam no banco como tabelas comuns, para arquivar (pg_dump) ou dropar depois; uma partição
+    que cobre cutoff_date fica inteira. O agregado fato_carona_diaria não é alterado.
+    Retorna True em caso de sucesso, False em caso de falha.
+    """
+    conn_dw = connect_to_db(DB_DW)
+    if not conn_dw:
+        return False
+    cutoff_date_sk = cutoff_date.year * 10000 + cutoff_date.month * 100 + cutoff_date.day
+    try:
+        for table_name in fact_tables:
+            detached = detach_date_partitions_before(conn_dw, table_name, cutoff_date_sk)
+            if detached:
+                print(f"Partições desanexadas de {table_name}: {', '.join(detached)}")
+            else:
+                print(f"Nenhuma partição de {table_name} termina até {cutoff_date:%Y-%m-%d}.")
+        return True
+    except Exception as e:
+        conn_dw.rollback()
+        print(f"Erro ao aplicar a retenção dos fatos: {e}")
+        return False
+    finally:
+        conn_dw.close()
+
+def main_etl_process(apaga_ultimo_etl_run, recria_dim_time, recria_dim_flags_carona, profile_dir=None, resume=False, rebuild=False):
+    """
+    profile_dir: se informado, cada etapa roda com cProfile + tracemalloc (ver etl_profiling.py) e os
+    perfis são gravados nessa pasta. As etapas passam a rodar uma de cada vez para não misturar as medições.
+    resume: retoma a última execução, se ela falhou ou foi interrompida: sem DROP, com a mesma marca d'água,
+    pulando as etapas já concluídas e continuando os fatos a partir do último bloco commitado (etl_checkpoint).
+    rebuild: carga completa num esquema sombra (DW_SHADOW_SCHEMA no config.py), trocado pelo DW atual só no final.
+    Durante a carga o DW atual continua no ar com seus dados e o last_etl_run.txt só muda se tudo der certo.
+    Retorna True se a execução terminou com sucesso, False em qualquer falha.
+    """
+    conn_manager = None
     conn_dw = None
     try:
         print("Iniciando processo ETL para Caronaê DW...")
 
         # 0. Apaga o last_etl_run.txt se o parâmetro for True
-        if apaga_ultimo_etl_run:
+        if resume:
+            print(f"Modo retomada: '{LAST_RUN_FILE}' e tabelas do DW mantidos.")
+        elif rebuild:
+            print(f"Modo reconstrução: '{LAST_RUN_FILE}' e tabelas do DW mantidos até a troca de esquemas.")
+        elif apaga_ultimo_etl_run:
             if os.path.exists(LAST_RUN_FILE):
                 os.remove(LAST_RUN_FILE)
                 print(f"Arquivo '{LAST_RUN_FILE}' apagado (reset de carga incremental).")
@@ -191,20 +487,61 @@ def main_etl_process(apaga_ultimo_etl_run, recria_dim_time, recria_dim_flags_car
             print(f"Arquivo '{LAST_RUN_FILE}' não será apagado (carga incremental mantida).")
 
         # Conectar aos bancos de dados OLTP e DW
+        # Um único pool por execução: todas as etapas reaproveitam as mesmas conexões
         print("\nEstabelecendo conexões com os bancos de dados...")
-        conn_oltp = connect_to_db(DB_OLTP)
-        conn_dw = connect_to_db(DB_DW)
-
-        if not conn_oltp or not conn_dw:
-            print("Erro: Não foi possível conectar a um ou ambos os bancos de dados. Abortando ETL.")
-            return # Sai da função se a conexão falhar
+        try:
+            dw_session_settings = DW_SESSION_SETTINGS
+            if rebuild:
+                # Tabelas sem esquema nas queries das etapas resolvem primeiro para o esquema sombra
+                dw_session_settings = {**DW_SESSION_SETTINGS, 'search_path': f"{DW_SHADOW_SCHEMA}, {DW_SCHEMA}"}
+            conn_manager = ETLConnectionManager(DB_OLTP, DB_DW, dw_session_settings=dw_session_settings)
+            conn_dw = conn_manager.get_dw()
+        except Exception as e:
+            print(f"Erro: Não foi possível conectar a um ou ambos os bancos de dados: {e}. Abortando ETL.")
+            return False # Sai da função se a conexão falhar
 
         print("Conexões com os bancos de dados estabelecidas com sucesso.")
 
-        # 1. Criar/Recriar tabelas do DW (Drop e Create)
-        if not create_dw_tables(conn_dw, recria_dim_time, recria_dim_flags_carona):
-            print("ETL abortado devido a falha na criação/recriação das tabelas do DW.")
-            return # Sai da função se as tabelas não puderem ser criadas
+        # 1. Preparar as tabelas do DW
+        resumed_run = None
+        if resume:
+            # Retomada: mantém tudo o que a execução interrompida já carregou
+            created_tables = ensure_dw_tables(conn_dw)
+            if created_tables is None:
+                print("ETL abortado devido a falha na verificação do esquema do DW.")
+                return False
+            resumed_run = get_resumable_etl_run(conn_dw)
+            if resumed_run is None:
+                print("Nenhuma execução interrompida para retomar: a última execução terminou com sucesso.")
+                return True
+            if resumed_run['mode'] == 'reconstrucao':
+                print("A última execução foi uma reconstrução, que não pode ser retomada: rode python etl_main.py --rebuild de novo.")
+                return False
+            print(f"Retomando a execução {resumed_run['run_id']} ({resumed_run['mode']}, iniciada em {resumed_run['started_at']}).")
+            # A dim_flags_carona entra se fazia parte da execução original (sempre, na carga completa)
+            recria_dim_flags_carona = (resumed_run['mode'] == 'completa' or 'dim_flags_carona' in created_tables
+                                       or get_checkpoint(conn_dw, resumed_run['run_id'], 'dim_flags_carona')[0] is not None)
+        elif rebuild:
+            # Reconstrução: tabelas novas no esquema sombra, sem DROP no DW atual
+            if not create_shadow_dw_tables(conn_dw, recria_dim_time):
+                print("ETL abortado devido a falha na preparação do esquema sombra.")
+                return False
+            recria_dim_flags_carona = True
+        elif apaga_ultimo_etl_run:
+            # Carga completa: Drop e Create de tudo (exceto dim_time/dim_flags_carona, conforme os parâmetros)
+            if not create_dw_tables(conn_dw, recria_dim_time, recria_dim_flags_carona):
+                print("ETL abortado devido a falha na criação/recriação das tabelas do DW.")
+                return False # Sai da função se as tabelas não puderem ser criadas
+        else:
+            # Carga incremental: mantém tabelas e dados, cria só o que falta
+            created_tables = ensure_dw_tables(conn_dw)
+            if created_tables is None:
+                print("ETL abortado devido a falha na verificação do esquema do DW.")
+                return False
+            if recria_dim_time:
+                print("Aviso: recria_dim_time é ignorado na carga incremental (a dim_time só recebe os dias novos).")
+            # A dim_flags_carona só precisa ser carregada se foi criada agora (ou se pedido explicitamente)
+            recria_dim_flags_carona = recria_dim_flags_carona or 'dim_flags_carona' in created_tables
 
         # 2. Inserir TODOS os membros "Desconhecidos" nas Dimensões
         # Chame a nova função que encapsula todas as inserções
@@ -215,58 +552,130 @@ def main_etl_process(apaga_ultimo_etl_run, recria_dim_time, recria_dim_flags_car
         
         # conn_dw.close() # Feche a conexão temporária usada apenas para inserções de membros desconhecidos
 
-        # Obter a última data de execução para carga incremental
-        last_run_date = get_last_etl_run_date()
-        current_run_date = datetime.now() # Marcar a hora de início desta execução
+        # Cache de SKs da execução: lido do DW uma única vez (já com os membros desconhecidos)
+        # e depois mantido em dia pelas cargas das dimensões
+        sk_cache = SurrogateKeyCache()
+        sk_cache.load(conn_dw)
+
+        reset_metrics()
+        if resumed_run:
+            # Mesma janela da execução original: mesma data de partida e, ao final, a marca d'água do seu início
+            run_id = resumed_run['run_id']
+            last_run_date = resumed_run['last_run_date']
+            current_run_date = resumed_run['started_at']
+            completed_steps = get_completed_steps(conn_dw, run_id)
+            resume_etl_run(conn_dw, run_id)
+        else:
+            # Obter a última data de execução para carga incremental (a reconstrução carrega tudo)
+            last_run_date = datetime(2000, 1, 1) if rebuild else get_last_etl_run_date()
+            current_run_date = datetime.now() # Marcar a hora de início desta execução
+            completed_steps = set()
 
-        # 3. Executar ETL das Dimensões
-        print("\n--- Iniciando ETL das Dimensões ---")
+            # Registrar a execução na etl_run (as métricas das etapas são gravadas ao final)
+            mode = 'reconstrucao' if rebuild else 'completa' if apaga_ultimo_etl_run else 'incremental'
+            run_id = start_etl_run(conn_dw, mode, last_run_date)
 
-        # A dim_time geralmente só precisa ser carregada uma vez ou quando estender o período
-        if recria_dim_time:
-            etl_dim_time()
-        
-        # A dim_flags_carona só precisa ser carregada uma vez
-        if recria_dim_flags_carona:
-            etl_dim_flags_carona()
-        
-        if not etl_dim_user(): print("ETL DimUser falhou.")
-        if not etl_dim_neighborhood(): print("ETL DimNeighborhood falhou.")
-        if not etl_dim_hub(): print("ETL DimHub falhou.")
-        if not etl_dim_status_pedido(): print("ETL DimStatusPedido falhou.")
-        print("--- ETL das Dimensões Concluído ---")
-
-        # 4. Executar ETL dos Fatos (Carga Incremental)
-        print("\n--- Iniciando ETL dos Fatos (Incremental) ---")
-        # Passar a data de last_run_date como string para a função
-        if not etl_fact_carona(last_run_date.strftime("%Y-%m-%d %H:%M:%S.%f")): print("ETL FatoCarona falhou.")
-        if not etl_fact_interacao_carona(last_run_date.strftime("%Y-%m-%d %H:%M:%S.%f")): print("ETL FatoInteracaoCarona falhou.")
-        print("--- ETL dos Fatos Concluído ---")
+        def record_step_checkpoint(step_name, step_status):
+            # Roda na thread do agendador (a mesma de conn_dw): cada etapa terminada fica registrada para o --resume
+            try:
+                save_checkpoint(conn_dw, run_id, step_name, step_status)
+                conn_dw.commit()
+            except Exception as e:
+                conn_dw.rollback()
+                print(f"Aviso: não foi possível gravar o checkpoint da etapa {step_name}: {e}")
+
+        # 3 e 4. Executar ETL das Dimensões e dos Fatos (Carga Incremental)
+        # As etapas independentes rodam em paralelo; cada fato espera apenas as dimensões que consulta
+        print(f"\n--- Iniciando ETL das Dimensões e dos Fatos (até {MAX_PARALLEL_STEPS} etapas em paralelo) ---")
+        # Passar a data de last_run_date como string para as funções dos fatos
+        steps = build_etl_steps(conn_manager, last_run_date.strftime("%Y-%m-%d %H:%M:%S.%f"), recria_dim_flags_carona,
+                                sk_cache=sk_cache, run_id=run_id)
+        max_workers = MAX_PARALLEL_STEPS
+        # No --profile, extract/transform/load de cada etapa rodam na mesma thread (visível para o cProfile)
+        set_sequential(bool(profile_dir))
+        if profile_dir:
+            for step in steps:
+                step.func = profile_step(step.func, step.name, profile_dir)
+            max_workers = 1
+            print(f"Modo --profile: etapas em sequência, perfis gravados em '{profile_dir}'.")
+        steps_status = run_etl_steps(steps, max_workers=max_workers, completed=completed_steps,
+                                     on_step_finished=record_step_checkpoint)
+        print("--- ETL das Dimensões e dos Fatos Concluído ---")
+
+        if rebuild and all(status == STEP_OK for status in steps_status.values()):
+            # Índices/constraints adiados, ANALYZE e troca atômica dos esquemas, antes de fechar a etl_run:
+            # se a troca falhar, a execução fica registrada como falha
+            with track_phase('troca_de_esquemas', 'total'):
+                swapped = finalize_shadow_dw_tables(conn_dw) and swap_shadow_dw_schema(conn_dw)
+            steps_status['troca_de_esquemas'] = STEP_OK if swapped else STEP_FAILED
+
+        # Auditoria: métricas de cada etapa na etl_step_run (e nos logs JSON, se configurados)
+        try:
+            # As etapas concluídas numa tentativa anterior mantêm as métricas daquela tentativa
+            ran_steps_status = {name: status for name, status in steps_status.items() if name not in completed_steps}
+            finish_etl_run(conn_dw, run_id, ran_steps_status, ETL_JSON_LOG_FILE)
+            print(f"Métricas da execução {run_id} gravadas em etl_run/etl_step_run.")
+        except Exception as e:
+            conn_dw.rollback()
+            print(f"Aviso: não foi possível gravar as métricas da execução {run_id}: {e}")
+
+        failed_steps = [name for name, status in steps_status.items() if status != STEP_OK]
+        if failed_steps:
+            # Não avança a marca d'água: a próxima execução reprocessa o mesmo intervalo
+            print(f"\nETL concluído com falhas nas etapas: {', '.join(failed_steps)}. Marca d'água não atualizada.")
+            if rebuild:
+                print(f"O DW atual continua no ar; o esquema '{DW_SHADOW_SCHEMA}' é descartado na próxima reconstrução.")
+            else:
+                print("Para continuar de onde parou: python etl_main.py --resume")
+            return False
 
         # 5. Atualizar a marca d'água da última execução
         set_last_etl_run_date(current_run_date)
         print(f"\nProcesso ETL concluído com sucesso! Última execução registrada em: {current_run_date}")
+        return True
     
     except Exception as e:
         # Captura qualquer exceção não tratada e a imprime
         print(f"\nOcorreu um erro crítico inesperado no processo ETL: {e}")
+        return False
         # Opcional: registrar stack trace para depuração mais detalhada
         # import traceback
         # traceback.print_exc()
     finally:
         # Garante que as conexões sejam fechadas, mesmo em caso de erro
-        if conn_oltp:
-            print("Fechando conexão com OLTP.")
-            conn_oltp.close()
-        if conn_dw:
-            print("Fechando conexão com DW.")
-            conn_dw.close()
+        if conn_manager:
+            if conn_dw:
+                conn_manager.put_dw(conn_dw)
+            print("Fechando pools de conexões com OLTP e DW.")
+            conn_manager.close_all()
         print("Conexões de banco de dados fechadas.")
 
 if __name__ == "__main__":
-    # Para forçar uma carga completa (apaga o last_etl_run.txt e recarrega tudo):
-    # Use isso quando quiser ter certeza que tudo está limpo e do zero.
-    main_etl_process(apaga_ultimo_etl_run=True, recria_dim_time=False, recria_dim_flags_carona=True)
-
-    # Para uma carga normal (mantém o last_etl_run.txt e faz carga incremental):
-    # main_etl_process(apaga_ultimo_etl_run=False, recria_dim_time=False, recria_dim_flags_carona=True)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="ETL do Caronaê DW.")
+    # Sem --incremental: carga completa (apaga o last_etl_run.txt, dropa e recria as tabelas e recarrega tudo)
+    # Com --incremental: mantém o last_etl_run.txt e as tabelas do DW, cria só o que faltar e carrega só o que mudou
+    parser.add_argument('--incremental', action='store_true', help="Carga incremental em vez de completa")
+    parser.add_argument('--recria-dim-time', action='store_true', help="Recria a dim_time por completo")
+    parser.add_argument('--recria-dim-flags-carona', action='store_true',
+                        help="Recria a dim_flags_carona (sempre recriada na carga completa)")
+    parser.add_argument('--resume', action='store_true',
+                        help="Retoma a última execução interrompida: pula as etapas concluídas e continua os fatos do último bloco")
+    parser.add_argument('--rebuild', action='store_true',
+                        help="Carga completa num esquema sombra, trocado pelo DW atual no final (o DW não fica vazio durante a carga)")
+    parser.add_argument('--retencao', type=datetime.fromisoformat, metavar='DATA',
+                        help="Só manutenção, sem rodar o ETL: desanexa as partições dos fatos anteriores a DATA (ex: 2020-01-01)")
+    parser.add_argument('--profile', nargs='?', const='profiles', default=None, metavar='PASTA',
+                        help="Perfila cada etapa (cProfile + tracemalloc) e grava os resultados em PASTA (padrão: profiles)")
+    args = parser.parse_args()
+    if args.rebuild and (args.incremental or args.resume):
+        parser.error("--rebuild não pode ser combinado com --incremental ou --resume")
+
+    if args.retencao:
+        apply_fact_retention(args.retencao)
+    else:
+        main_etl_process(apaga_ultimo_etl_run=not args.incremental,
+                         recria_dim_time=args.recria_dim_time,
+                         recria_dim_flags_carona=args.recria_dim_flags_carona or not args.incremental,
+                         profile_dir=args.profile,
+                         resume=args.resume,
+                         rebuild=args.rebuild)
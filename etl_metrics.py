@@ -0,0 +1,331 @@
+# etl_metrics.py
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+import psycopg2.extensions
+
+# resource e /proc só existem no Linux/Unix; no Windows a memória vem do psutil (opcional) ou não é medida
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Contadores por thread: cada etapa do ETL roda inteira numa única thread (etl_scheduler)
+_thread_state = threading.local()
+
+def _count_round_trip():
+    count_round_trips(1)
+
+def count_round_trips(n):
+    _thread_state.round_trips = getattr(_thread_state, 'round_trips', 0) + n
+
+def current_round_trips():
+    """Idas e voltas ao banco feitas pela thread atual até agora (por todos os CountingCursor)."""
+    return getattr(_thread_state, 'round_trips', 0)
+
+def count_bytes(n):
+    _thread_state.bytes = getattr(_thread_state, 'bytes', 0) + n
+
+def current_bytes():
+    """Bytes transferidos pela thread atual até agora (COPY enviados ao DW e blocos extraídos do OLTP)."""
+    return getattr(_thread_state, 'bytes', 0)
+
+def peak_rss_kb():
+    """
+    Pico de memória residente do processo até agora, em KB (ru_maxrss no Linux, peak_wset do psutil no Windows).
+    Nunca diminui: só mede uma execução se ela tiver o processo só para si (ver benchmark_etl.py).
+    Retorna None se não há como medir (Windows sem psutil).
+    """
+    if resource is not None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if psutil is not None:
+        peak = getattr(psutil.Process().memory_info(), 'peak_wset', None)
+        return peak // 1024 if peak is not None else None
+    return None
+
+def current_rss_kb():
+    """Memória residente atual do processo, em KB (psutil se instalado, senão /proc/self/statm); None se não há como medir."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss // 1024
+    if resource is not None and os.path.exists('/proc/self/statm'):
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize() // 1024
+    return None
+
+class CountingCursor(psycopg2.extensions.cursor):
+    """
+    Cursor que conta as idas e voltas ao banco (execute, COPY e cada FETCH de um cursor do lado do servidor).
+    Usado como cursor_factory das conexões do ETL, inclusive pelas chamadas de pd.read_sql.
+    """
+
+    def execute(self, query, vars=None):
+        _count_round_trip()
+        return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        vars_list = list(vars_list)
+        for _ in vars_list:
+            _count_round_trip()
+        return super().executemany(query, vars_list)
+
+    def copy_expert(self, sql, file, size=8192):
+        _count_round_trip()
+        if hasattr(file, 'getvalue'):
+            count_bytes(len(file.getvalue()))
+        return super().copy_expert(sql, file, size)
+
+    # Em cursores nomeados (lado do servidor) cada fetch vira um FETCH no banco
+    def fetchmany(self, size=None):
+        if self.name:
+            _count_round_trip()
+        return super().fetchmany(size) if size is not None else super().fetchmany()
+
+    def fetchall(self):
+        if self.name:
+            _count_round_trip()
+        return super().fetchall()
+
+class PhaseMetrics:
+    """Métricas acumuladas de uma fase (extract, transform, load...) de uma etapa do ETL."""
+
+    def __init__(self, step, phase):
+        self.step = step
+        self.phase = phase
+        self.seconds = 0.0
+        self.rows = 0
+        self.rejected = 0
+        self.bytes = 0
+        self.round_trips = 0
+        self.calls = 0
+        self.rss_growth_kb = 0
+        self.started_at = None
+        self.finished_at = None
+
+    def as_dict(self):
+        return {
+            'step': self.step,
+            'phase': self.phase,
+            'seconds': round(self.seconds, 6),
+            'rows': self.rows,
+            'rows_per_second': round(self.rows / self.seconds, 1) if self.seconds > 0 else None,
+            'rejected': self.rejected,
+            'bytes': self.bytes,
+            'round_trips': self.round_trips,
+            'calls': self.calls,
+            'rss_growth_kb': self.rss_growth_kb,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+class MetricsCollector:
+    """Coleta as métricas por (etapa, fase) de uma execução; seguro para etapas rodando em paralelo."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._phases = {}
+        self._step_info = {}
+
+    def get(self, step, phase):
+        with self._lock:
+            key = (step, phase)
+            if key not in self._phases:
+                self._phases[key] = PhaseMetrics(step, phase)
+            return self._phases[key]
+
+    def reset(self):
+        with self._lock:
+            self._phases = {}
+            self._step_info = {}
+
+    def as_list(self):
+        with self._lock:
+            return [metrics.as_dict() for metrics in self._phases.values()]
+
+    def set_step_info(self, step, **info):
+        with self._lock:
+            self._step_info.setdefault(step, {}).update(info)
+
+    def step_summary(self, step):
+        """Resumo de uma etapa no formato da tabela etl_step_run."""
+        with self._lock:
+            phases = {phase: metrics for (name, phase), metrics in self._phases.items() if name == step}
+            info = dict(self._step_info.get(step, {}))
+
+        def phase_value(phase, attribute, default=0):
+            return getattr(phases[phase], attribute) if phase in phases else default
+
+        transformed_in = phase_value('transform', 'rows')
+        rejected = phase_value('transform', 'rejected')
+        return {
+            'step_name': step,
+            'started_at': phase_value('total', 'started_at', None),
+            'finished_at': phase_value('total', 'finished_at', None),
+            'rows_extracted': phase_value('extract', 'rows'),
+            'rows_transformed': transformed_in - rejected,
+            'rows_rejected': rejected,
+            'rows_loaded': phase_value('load', 'rows'),
+            'bytes_extracted': phase_value('extract', 'bytes'),
+            'bytes_loaded': phase_value('load', 'bytes'),
+            'round_trips': phase_value('total', 'round_trips'),
+            'extract_seconds': round(phase_value('extract', 'seconds'), 3),
+            'transform_seconds': round(phase_value('transform', 'seconds'), 3),
+            'load_seconds': round(phase_value('load', 'seconds'), 3),
+            'watermark': info.get('watermark')
+        }
+
+# Coletor global do processo (zerado a cada execução do ETL por reset_metrics)
+METRICS = MetricsCollector()
+
+def reset_metrics():
+    METRICS.reset()
+
+def get_metrics():
+    return METRICS.as_list()
+
+def set_step_info(step, **info):
+    """Informações extras da etapa para o etl_step_run (e.g. watermark=... usada na extração)."""
+    METRICS.set_step_info(step, **info)
+
+@contextmanager
+def track_phase(step, phase, rows=0):
+    """
+    Mede uma fase de uma etapa (tempo de parede, idas e voltas ao banco e crescimento do RSS) e acumula no coletor.
+    O crescimento do RSS é o pico durante a chamada menos o RSS no início dela (o maior entre as chamadas); o pico
+    só é conhecido quando a chamada eleva o pico do processo, senão vale o RSS do fim. Fica None se a memória não
+    pode ser medida (Windows sem psutil). Com etapas em paralelo,
+    a memória das outras threads também entra: para medições isoladas use o --profile (etapas em sequência).
+    O objeto devolvido permite informar as linhas processadas: `with track_phase(...) as fase: fase.rows += n`.
+    """
+    metrics = METRICS.get(step, phase)
+    counter = _RowCounter(rows)
+    started_at = datetime.now()
+    start_round_trips = current_round_trips()
+    start_bytes = current_bytes()
+    start_rss = current_rss_kb()
+    start_peak_rss = peak_rss_kb()
+    start = time.perf_counter()
+    try:
+        yield counter
+    finally:
+        elapsed = time.perf_counter() - start
+        growth = _rss_growth_kb(start_rss, start_peak_rss)
+        with METRICS._lock:
+            metrics.seconds += elapsed
+            metrics.rows += counter.rows
+            metrics.rejected += counter.rejected
+            metrics.bytes += current_bytes() - start_bytes
+            metrics.round_trips += current_round_trips() - start_round_trips
+            metrics.calls += 1
+            if growth is None:
+                metrics.rss_growth_kb = None
+            elif metrics.rss_growth_kb is not None:
+                metrics.rss_growth_kb = max(metrics.rss_growth_kb, growth)
+            metrics.started_at = metrics.started_at or started_at
+            metrics.finished_at = datetime.now()
+
+def _rss_growth_kb(start_rss, start_peak_rss):
+    """Crescimento do RSS desde o início da fase, ou None se a memória não pode ser medida nesta plataforma."""
+    end_rss = current_rss_kb()
+    if start_rss is None or end_rss is None:
+        return None
+    end_peak_rss = peak_rss_kb()
+    if start_peak_rss is not None and end_peak_rss is not None and end_peak_rss > start_peak_rss:
+        return end_peak_rss - start_rss
+    return end_rss - start_rss
+
+class _RowCounter:
+    def __init__(self, rows=0):
+        self.rows = rows
+        self.rejected = 0
+
+def timed_chunks(step, chunks, phase='extract'):
+    """Repassa os blocos de um gerador de extração (e.g. extract_in_chunks), medindo o tempo gasto em cada busca."""
+    iterator = iter(chunks)
+    while True:
+        with track_phase(step, phase) as tracked:
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+            tracked.rows += len(chunk)
+            count_bytes(int(chunk.memory_usage(index=False).sum())) # Aproximação do volume trazido do banco
+        yield chunk
+
+def start_etl_run(conn_dw, mode, last_run_date):
+    """Registra o início de uma execução do ETL na etl_run e retorna o run_id."""
+    with conn_dw.cursor() as cur:
+        cur.execute("""
+            INSERT INTO etl_run (started_at, status, mode, last_run_date)
+            VALUES (NOW(), 'executando', %s, %s)
+            RETURNING run_id;
+        """, (mode, last_run_date))
+        run_id = cur.fetchone()[0]
+    conn_dw.commit()
+    return run_id
+
+def get_resumable_etl_run(conn_dw):
+    """
+    Última execução do ETL, se ela não terminou com sucesso (falhou ou foi interrompida).
+    Retorna um dicionário com run_id, started_at, mode e last_run_date, ou None se não há o que retomar.
+    """
+    with conn_dw.cursor() as cur:
+        cur.execute("""
+            SELECT run_id, started_at, status, mode, last_run_date
+            FROM etl_run
+            ORDER BY run_id DESC
+            LIMIT 1;
+        """)
+        result = cur.fetchone()
+    if result is None or result[2] == 'ok':
+        return None
+    run_id, started_at, _, mode, last_run_date = result
+    return {'run_id': run_id, 'started_at': started_at, 'mode': mode, 'last_run_date': last_run_date}
+
+def resume_etl_run(conn_dw, run_id):
+    """Marca uma execução interrompida como em andamento de novo (etl_main.py --resume)."""
+    with conn_dw.cursor() as cur:
+        cur.execute("UPDATE etl_run SET status = 'executando', finished_at = NULL WHERE run_id = %s;", (run_id,))
+    conn_dw.commit()
+
+def finish_etl_run(conn_dw, run_id, steps_status, json_log_file=None):
+    """
+    Grava na etl_step_run o resumo de cada etapa (linhas, bytes, tempos, marca d'água) e fecha a etl_run.
+    Com json_log_file, também acrescenta uma linha JSON por etapa e uma para a execução nesse arquivo.
+    Numa execução retomada, as linhas das etapas que rodaram de novo substituem as da tentativa anterior.
+    """
+    run_status = 'ok' if all(status == 'ok' for status in steps_status.values()) else 'falhou'
+    step_rows = []
+    for step, status in steps_status.items():
+        summary = METRICS.step_summary(step)
+        summary['status'] = status
+        step_rows.append(summary)
+
+    columns = ['step_name', 'status', 'started_at', 'finished_at', 'rows_extracted', 'rows_transformed',
+               'rows_rejected', 'rows_loaded', 'bytes_extracted', 'bytes_loaded', 'round_trips',
+               'extract_seconds', 'transform_seconds', 'load_seconds', 'watermark']
+    with conn_dw.cursor() as cur:
+        for row in step_rows:
+            cur.execute(f"""
+                INSERT INTO etl_step_run (run_id, {', '.join(columns)})
+                VALUES (%s, {', '.join(['%s'] * len(columns))})
+                ON CONFLICT (run_id, step_name) DO UPDATE SET
+                    {', '.join(f"{col} = EXCLUDED.{col}" for col in columns[1:])};
+            """, [run_id] + [row[col] for col in columns])
+        cur.execute("UPDATE etl_run SET finished_at = NOW(), status = %s WHERE run_id = %s;", (run_status, run_id))
+    conn_dw.commit()
+
+    if json_log_file:
+        with open(json_log_file, 'a', encoding='utf-8') as f:
+            for row in step_rows:
+                f.write(json.dumps({'event': 'etl_step_run', 'run_id': run_id, **row}, default=str, ensure_ascii=False) + '\n')
+            f.write(json.dumps({'event': 'etl_run', 'run_id': run_id, 'status': run_status,
+                                'finished_at': datetime.now()}, default=str, ensure_ascii=False) + '\n')
+    return run_status
@@ -0,0 +1,126 @@
+# etl_pipeline.py
+import queue
+import threading
+from config import PIPELINE_QUEUE_SIZE
+from etl_metrics import count_round_trips, count_bytes, current_round_trips, current_bytes
+
+# Marca de fim de fluxo entre os estágios
+_END = object()
+# Intervalo (s) em que um estágio bloqueado numa fila verifica se outro estágio falhou
+_POLL_SECONDS = 0.1
+
+# Com True, os três estágios rodam em sequência na thread de quem chamou (usado pelo --profile,
+# pois o cProfile só enxerga a thread em que foi ativado)
+_run_sequentially = False
+
+def set_sequential(enabled=True):
+    global _run_sequentially
+    _run_sequentially = enabled
+
+def _put(out_queue, item, stop):
+    """Coloca item na fila, esperando enquanto ela estiver cheia (backpressure). Retorna False se o pipeline parou."""
+    while not stop.is_set():
+        try:
+            out_queue.put(item, timeout=_POLL_SECONDS)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _get(in_queue, stop):
+    """Tira o próximo item da fila; devolve _END se o pipeline parou."""
+    while not stop.is_set():
+        try:
+            return in_queue.get(timeout=_POLL_SECONDS)
+        except queue.Empty:
+            continue
+    return _END
+
+def _produce(chunks, out_queue, stop, errors, counters):
+    # O gerador de extração (e o cursor do lado do servidor dele) vive inteiro nesta thread
+    iterator = iter(chunks)
+    try:
+        for chunk in iterator:
+            if not _put(out_queue, chunk, stop):
+                break
+        _put(out_queue, _END, stop)
+    except Exception as e:
+        errors.append(e)
+        stop.set()
+    finally:
+        if hasattr(iterator, 'close'):
+            iterator.close() # Fecha o cursor mesmo se o pipeline parou no meio
+        counters.append((current_round_trips(), current_bytes()))
+
+def _transform(transform, in_queue, out_queue, stop, errors, counters):
+    try:
+        while True:
+            chunk = _get(in_queue, stop)
+            if chunk is _END:
+                break
+            if not _put(out_queue, transform(chunk), stop):
+                break
+        _put(out_queue, _END, stop)
+    except Exception as e:
+        errors.append(e)
+        stop.set()
+    finally:
+        counters.append((current_round_trips(), current_bytes()))
+
+def run_etl_pipeline(chunks, transform, load, queue_size=PIPELINE_QUEUE_SIZE):
+    """
+    Executa extract -> transform -> load em paralelo, bloco a bloco: enquanto um bloco é carregado no DW,
+    o seguinte é transformado e o próximo já é lido do OLTP.
+    chunks: gerador de blocos da extração (e.g. timed_chunks(...extract_in_chunks(...))), consumido numa thread própria.
+    transform: função bloco -> resultado, chamada numa segunda thread, na ordem dos blocos.
+    load: função chamada com cada resultado na thread de quem chamou (a dona da conexão do DW, que faz os commits).
+    As filas entre os estágios têm no máximo queue_size blocos: o estágio mais rápido espera o mais lento.
+    Se qualquer estágio falhar, os outros param e a exceção é relançada aqui. Retorna o número de blocos carregados.
+    """
+    if _run_sequentially:
+        loaded_chunks = 0
+        iterator = iter(chunks)
+        try:
+            for chunk in iterator:
+                load(transform(chunk))
+                loaded_chunks += 1
+        finally:
+            if hasattr(iterator, 'close'):
+                iterator.close() # Como em _produce: fecha o cursor mesmo se um bloco falhar
+        return loaded_chunks
+
+    extracted_queue = queue.Queue(maxsize=queue_size)
+    transformed_queue = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors = []
+    counters = []
+    threads = [
+        threading.Thread(target=_produce, args=(chunks, extracted_queue, stop, errors, counters), daemon=True),
+        threading.Thread(target=_transform, args=(transform, extracted_queue, transformed_queue, stop, errors, counters), daemon=True)
+    ]
+    for thread in threads:
+        thread.start()
+
+    loaded_chunks = 0
+    try:
+        while True:
+            item = _get(transformed_queue, stop)
+            if item is _END:
+                break
+            load(item)
+            loaded_chunks += 1
+    except Exception as e:
+        errors.append(e)
+    finally:
+        stop.set() # Libera os estágios que ainda estejam esperando numa fila
+        for thread in threads:
+            thread.join()
+
+    # Idas e voltas ao banco e bytes das outras threads entram nas contagens da etapa (thread atual)
+    for round_trips, transferred_bytes in counters:
+        count_round_trips(round_trips)
+        count_bytes(transferred_bytes)
+
+    if errors:
+        raise errors[0]
+    return loaded_chunks
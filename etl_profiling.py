@@ -0,0 +1,61 @@
+# etl_profiling.py
+import cProfile
+import io
+import os
+import pstats
+import tracemalloc
+from functools import wraps
+
+# Quantidade de funções (por tempo acumulado) e de linhas alocadoras listadas nos relatórios de cada etapa
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 25
+
+def profile_step(func, step_name, output_dir):
+    """
+    Envolve uma função etl_* com cProfile e snapshots do tracemalloc.
+    Ao final da etapa grava em output_dir:
+      <etapa>.prof       -> estatísticas completas do cProfile (abrir com pstats/snakeviz)
+      <etapa>_cpu.txt    -> funções com maior tempo acumulado
+      <etapa>_memoria.txt -> pico de memória rastreada e as linhas que mais alocaram durante a etapa
+    O tracemalloc é global ao processo: rode as etapas uma de cada vez para não misturar as alocações.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        os.makedirs(output_dir, exist_ok=True)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(10) # 10 frames por alocação para achar a origem dentro do pandas
+        tracemalloc.reset_peak()
+        snapshot_before = tracemalloc.take_snapshot()
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.disable()
+            snapshot_after = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            _write_profile_reports(step_name, output_dir, profiler, snapshot_before, snapshot_after, peak)
+
+    return wrapper
+
+def _write_profile_reports(step_name, output_dir, profiler, snapshot_before, snapshot_after, peak):
+    base_path = os.path.join(output_dir, step_name)
+    profiler.dump_stats(f"{base_path}.prof")
+
+    cpu_report = io.StringIO()
+    pstats.Stats(profiler, stream=cpu_report).sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+    with open(f"{base_path}_cpu.txt", 'w', encoding='utf-8') as f:
+        f.write(cpu_report.getvalue())
+
+    # Ignora as alocações do próprio tracemalloc/cProfile
+    filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, cProfile.__file__)]
+    differences = snapshot_after.filter_traces(filters).compare_to(snapshot_before.filter_traces(filters), 'lineno')
+    with open(f"{base_path}_memoria.txt", 'w', encoding='utf-8') as f:
+        f.write(f"Etapa: {step_name}\n")
+        f.write(f"Pico de memória rastreada durante a etapa: {peak / 1024 / 1024:.1f} MB\n\n")
+        f.write(f"Top {TOP_ALLOCATIONS} linhas por memória alocada (ainda viva ao final da etapa):\n")
+        for difference in differences[:TOP_ALLOCATIONS]:
+            f.write(f"{difference}\n")
+
+    print(f"Perfil da etapa {step_name} gravado em {base_path}.prof, {base_path}_cpu.txt e {base_path}_memoria.txt.")
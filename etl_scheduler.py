@@ -0,0 +1,90 @@
+# etl_scheduler.py
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from config import MAX_PARALLEL_STEPS
+from etl_metrics import track_phase
+
+# Situação final de cada etapa
+STEP_OK = 'ok'
+STEP_FAILED = 'falhou'
+STEP_SKIPPED = 'pulada'
+
+class ETLStep:
+    """
+    Uma etapa do ETL (ex: etl_dim_user) e as etapas das quais ela depende.
+    func deve retornar True em caso de sucesso (o padrão de todas as funções etl_*).
+    """
+
+    def __init__(self, name, func, depends_on=(), kwargs=None):
+        self.name = name
+        self.func = func
+        self.depends_on = list(depends_on)
+        self.kwargs = kwargs or {}
+
+    def run(self):
+        # Fase 'total': tempo de parede da etapa inteira (as fases extract/transform/load são medidas dentro dela)
+        with track_phase(self.name, 'total'):
+            return self.func(**self.kwargs)
+
+def run_etl_steps(steps, max_workers=MAX_PARALLEL_STEPS, completed=(), on_step_finished=None):
+    """
+    Executa as etapas respeitando as dependências: etapas independentes rodam em paralelo
+    (até max_workers ao mesmo tempo) e uma etapa só começa quando todas as suas dependências terminaram com sucesso.
+    Se uma etapa falha, todas as que dependem dela (direta ou indiretamente) são puladas.
+    completed: etapas já concluídas numa tentativa anterior (execução retomada): não rodam e contam como STEP_OK.
+    on_step_finished: chamada como on_step_finished(nome, situação) na thread do agendador ao fim de cada etapa.
+    Retorna um dicionário {nome da etapa: STEP_OK | STEP_FAILED | STEP_SKIPPED}.
+    """
+    steps_by_name = {step.name: step for step in steps}
+    for step in steps:
+        for dependency in step.depends_on:
+            if dependency not in steps_by_name:
+                raise ValueError(f"Etapa '{step.name}' depende de '{dependency}', que não foi declarada.")
+
+    status = {name: STEP_OK for name in completed if name in steps_by_name}
+    pending = {name: step for name, step in steps_by_name.items() if name not in status}
+    for name in status:
+        print(f"Etapa {name} já concluída numa tentativa anterior: não será executada.")
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            # Pula as etapas cujas dependências falharam ou foram puladas (repete até propagar pela cadeia toda)
+            skipped_any = True
+            while skipped_any:
+                skipped_any = False
+                for name, step in list(pending.items()):
+                    if any(status.get(dep) in (STEP_FAILED, STEP_SKIPPED) for dep in step.depends_on):
+                        status[name] = STEP_SKIPPED
+                        del pending[name]
+                        skipped_any = True
+                        print(f"Etapa {name} pulada: uma dependência falhou.")
+                        if on_step_finished:
+                            on_step_finished(name, STEP_SKIPPED)
+
+            # Dispara as etapas com todas as dependências concluídas com sucesso
+            for name, step in list(pending.items()):
+                if all(status.get(dep) == STEP_OK for dep in step.depends_on):
+                    print(f"Iniciando etapa {name}...")
+                    running[executor.submit(step.run)] = name
+                    del pending[name]
+
+            if not running:
+                if pending:
+                    # Só sobra o que depende de algo que nunca vai terminar (dependência circular)
+                    raise ValueError(f"Dependência circular entre as etapas: {', '.join(pending)}")
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    succeeded = future.result()
+                except Exception as e:
+                    print(f"Erro inesperado na etapa {name}: {e}")
+                    succeeded = False
+                status[name] = STEP_OK if succeeded else STEP_FAILED
+                print(f"Etapa {name} {'concluída' if succeeded else 'falhou'}.")
+                if on_step_finished:
+                    on_step_finished(name, status[name])
+
+    return status
@@ -0,0 +1,78 @@
+# fact_scripts/fact_carona_diaria_etl.py
+from utils import get_etl_connections, release_etl_connections, get_pending_dates
+from etl_metrics import track_phase
+
+# Recalcula por completo os grupos (dia x hub x bairro) dos dias informados, a partir da fato_carona.
+# Caronas apagadas (deleted_at) só entram em deleted_rides_count. A ocupação média segue a das análises
+# ad hoc (_outros/SQLs/queries-caronae.sql): aceitos por carona + 1 (o motorista).
+# LEFT JOIN: caronas com flags_carona_sk -1 (combinação fora da dim_flags_carona) contam como não concluídas
+REFRESH_FATO_CARONA_DIARIA_QUERY = """
+    DELETE FROM fato_carona_diaria WHERE date_sk = ANY(%(date_sks)s);
+
+    INSERT INTO fato_carona_diaria (
+        date_sk, hub_sk, neighborhood_sk, rides_count, done_rides_count, deleted_rides_count, slots_offered,
+        requests_count, accepted_requests_count, refused_requests_count, pending_requests_count, quit_requests_count,
+        avg_occupancy, slots_occupancy_rate
+    )
+    SELECT
+        date_sk, hub_sk, neighborhood_sk, rides_count, done_rides_count, deleted_rides_count, slots_offered,
+        requests_count, accepted_requests_count, refused_requests_count, pending_requests_count, quit_requests_count,
+        (accepted_requests_count + rides_count)::NUMERIC / NULLIF(rides_count, 0),
+        accepted_requests_count::NUMERIC / NULLIF(slots_offered, 0)
+    FROM (
+        SELECT
+            f.date_sk, f.hub_sk, f.neighborhood_sk,
+            COUNT(*) FILTER (WHERE f.deleted_at IS NULL) AS rides_count,
+            COUNT(*) FILTER (WHERE f.deleted_at IS NULL AND COALESCE(fl.done, FALSE)) AS done_rides_count,
+            COUNT(*) FILTER (WHERE f.deleted_at IS NOT NULL) AS deleted_rides_count,
+            COALESCE(SUM(f.slots) FILTER (WHERE f.deleted_at IS NULL), 0) AS slots_offered,
+            COALESCE(SUM(f.requests_count) FILTER (WHERE f.deleted_at IS NULL), 0) AS requests_count,
+            COALESCE(SUM(f.accepted_requests_count) FILTER (WHERE f.deleted_at IS NULL), 0) AS accepted_requests_count,
+            COALESCE(SUM(f.refused_requests_count) FILTER (WHERE f.deleted_at IS NULL), 0) AS refused_requests_count,
+            COALESCE(SUM(f.pending_requests_count) FILTER (WHERE f.deleted_at IS NULL), 0) AS pending_requests_count,
+            COALESCE(SUM(f.quit_requests_count) FILTER (WHERE f.deleted_at IS NULL), 0) AS quit_requests_count
+        FROM fato_carona f
+        LEFT JOIN dim_flags_carona fl ON fl.flags_carona_sk = f.flags_carona_sk
+        WHERE f.date_sk = ANY(%(date_sks)s)
+        GROUP BY f.date_sk, f.hub_sk, f.neighborhood_sk
+    ) grupos;
+
+    DELETE FROM etl_pending_date WHERE target_table = 'fato_carona_diaria' AND date_sk = ANY(%(date_sks)s);
+"""
+
+def etl_fact_carona_diaria(conn_manager=None):
+    """
+    Mantém o agregado fato_carona_diaria: recalcula só os dias marcados em etl_pending_date pelas cargas da
+    fato_carona (utils.mark_pending_dates). Com o agregado ainda vazio (tabela recém-criada), calcula todos os dias.
+    """
+    _, conn_dw = get_etl_connections(conn_manager, need_oltp=False)
+    if not conn_dw:
+        print("Erro de conexão. ETL FatoCaronaDiaria abortado.")
+        return False
+
+    try:
+        date_sks = get_pending_dates(conn_dw, 'fato_carona_diaria')
+        with conn_dw.cursor() as cur:
+            cur.execute("SELECT NOT EXISTS (SELECT 1 FROM fato_carona_diaria);")
+            if cur.fetchone()[0]:
+                cur.execute("SELECT DISTINCT date_sk FROM fato_carona;")
+                date_sks = sorted(set(date_sks) | {row[0] for row in cur.fetchall()})
+
+        if not date_sks:
+            print("Nenhum dia alterado na fato_carona: fato_carona_diaria já está em dia.")
+            return True
+
+        print(f"Recalculando a fato_carona_diaria para {len(date_sks)} dias ({date_sks[0]} a {date_sks[-1]})...")
+        with track_phase('fato_carona_diaria', 'load', rows=len(date_sks)):
+            with conn_dw.cursor() as cur:
+                cur.execute(REFRESH_FATO_CARONA_DIARIA_QUERY, {'date_sks': date_sks})
+            conn_dw.commit()
+        print("Carga da fato_carona_diaria concluída.")
+        return True
+
+    except Exception as e:
+        conn_dw.rollback()
+        print(f"Erro no ETL da FatoCaronaDiaria: {e}")
+        return False
+    finally:
+        release_etl_connections(conn_manager, None, conn_dw)
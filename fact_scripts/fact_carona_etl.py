@@ -1,12 +1,179 @@
 # fact_scripts/fact_carona_etl.py
+from datetime import datetime
 import pandas as pd
-from config import DB_OLTP, DB_DW
-from utils import connect_to_db, get_last_etl_run_date_se_houver
-from psycopg2.extras import execute_batch
-
-def etl_fact_carona(last_etl_run_date_str=None):
-    conn_oltp = connect_to_db(DB_OLTP)
-    conn_dw = connect_to_db(DB_DW)
+from utils import get_etl_connections, release_etl_connections, get_last_etl_run_date_se_houver, bulk_upsert_dataframe, new_upsert_stats, format_upsert_stats, derive_date_hour_sks, extract_in_chunks, get_checkpoint, save_checkpoint, ensure_date_partitions, mark_pending_dates
+from sk_cache import get_sk_cache
+from etl_metrics import track_phase, timed_chunks, set_step_info
+from etl_pipeline import run_etl_pipeline
+from dim_scripts.dim_flags_carona_etl import load_carona_flags_lookup, resolve_flags_carona_sks
+
+# Status de ride_user e as colunas de contagem correspondentes na fato_carona
+# (o status 'driver' é o evento de criação da carona pelo motorista: vira o driver_id, não uma contagem)
+STATUS_TO_COUNT_COLUMN = {
+    'pending': 'pending_requests_count',
+    'accepted': 'accepted_requests_count',
+    'refused': 'refused_requests_count',
+    'quit': 'quit_requests_count'
+}
+COUNT_COLUMNS = list(STATUS_TO_COUNT_COLUMN.values()) + ['requests_count', 'messages_count']
+
+# Data usada quando não há execução anterior (ver get_last_etl_run_date_se_houver): carga completa
+FULL_LOAD_START_DATE = datetime(2000, 1, 1)
+
+# Caronas afetadas desde a última execução: alteradas em rides ou com pedidos/mensagens novos ou alterados.
+# Os contadores dessas caronas são recalculados por completo (não só a partir das linhas alteradas),
+# então a carga incremental chega ao mesmo resultado de uma carga completa
+INCREMENTAL_RIDES_CTE = """
+    affected_ride_ids AS (
+        SELECT r.id AS ride_id
+        FROM rides r
+        WHERE r.created_at >= %(last_run)s OR r.updated_at >= %(last_run)s OR r.deleted_at >= %(last_run)s
+        UNION
+        SELECT ru.ride_id
+        FROM ride_user ru
+        WHERE ru.created_at >= %(last_run)s OR ru.updated_at >= %(last_run)s
+        UNION
+        SELECT m.ride_id
+        FROM messages m
+        WHERE m.created_at >= %(last_run)s
+    ),
+    changed_rides AS (
+        SELECT r.*
+        FROM rides r
+        JOIN affected_ride_ids a ON r.id = a.ride_id
+        WHERE r.id > %(resume_after_id)s{date_filter}
+    )"""
+
+# Carga completa: todas as caronas, sem precisar descobrir quais foram afetadas
+FULL_RIDES_CTE = """
+    changed_rides AS (
+        SELECT *
+        FROM rides r
+        WHERE r.id > %(resume_after_id)s{date_filter}
+    )"""
+
+# Filtro do backfill por faixa de datas (backfill_etl.py): só caronas marcadas para [date_from, date_to)
+RIDES_DATE_FILTER = """
+          AND r.date >= %(date_from)s AND r.date < %(date_to)s"""
+
+def build_rides_extract_query(incremental=True, date_filtered=False):
+    """
+    Monta a consulta de extração da fato_carona: as caronas afetadas desde a última execução
+    (ou todas, se incremental=False), já com as contagens de pedidos por status (COUNT(*) FILTER),
+    o motorista e a contagem de mensagens.
+    A agregação roda no OLTP, num único passo baseado em conjunto, e só para as caronas afetadas:
+    trafega uma linha por carona.
+    As caronas saem em ordem de id, a partir de resume_after_id (0 numa execução nova, o checkpoint numa retomada).
+    date_filtered: restringe às caronas com date em [date_from, date_to) (uma fatia do backfill).
+    """
+    status_counts_sql = ',\n            '.join(
+        f"COUNT(*) FILTER (WHERE ru.status = '{status}') AS {column}"
+        for status, column in STATUS_TO_COUNT_COLUMN.items()
+    )
+    coalesce_counts_sql = ',\n        '.join(
+        f"COALESCE(rc.{column}, 0) AS {column}" for column in STATUS_TO_COUNT_COLUMN.values()
+    )
+    requests_count_sql = ' + '.join(f"COALESCE(rc.{column}, 0)" for column in STATUS_TO_COUNT_COLUMN.values())
+    changed_rides_cte = (INCREMENTAL_RIDES_CTE if incremental else FULL_RIDES_CTE).format(
+        date_filter=RIDES_DATE_FILTER if date_filtered else '')
+    return f"""
+    WITH{changed_rides_cte},
+    request_counts AS (
+        SELECT
+            ru.ride_id,
+            {status_counts_sql},
+            MAX(ru.user_id) FILTER (WHERE ru.status = 'driver') AS driver_id
+        FROM ride_user ru
+        WHERE ru.ride_id IN (SELECT id FROM changed_rides)
+        GROUP BY ru.ride_id
+    ),
+    message_counts AS (
+        SELECT m.ride_id, COUNT(*) AS messages_count
+        FROM messages m
+        WHERE m.ride_id IN (SELECT id FROM changed_rides)
+        GROUP BY m.ride_id
+    )
+    SELECT
+        cr.id AS ride_id,
+        cr.neighborhood AS neighborhood_name, -- Bairro e pólo são mapeados pelo nome
+        cr.going AS is_going_to_campus, -- Renomear para clareza
+        cr.routine_id,
+        cr.hub AS hub_name,
+        cr.slots,
+        cr.created_at,
+        cr.updated_at,
+        cr.week_days,
+        cr.repeats_until,
+        cr.done,
+        cr.deleted_at,
+        cr.date,
+        rc.driver_id,
+        {coalesce_counts_sql},
+        {requests_count_sql} AS requests_count,
+        COALESCE(mc.messages_count, 0) AS messages_count
+    FROM changed_rides cr
+    LEFT JOIN request_counts rc ON cr.id = rc.ride_id
+    LEFT JOIN message_counts mc ON cr.id = mc.ride_id
+    ORDER BY cr.id;
+    """
+
+def transform_rides_chunk(rides_data, sk_cache, flags_lookup):
+    """Transforma um bloco de caronas extraídas do OLTP nas linhas da fato_carona."""
+    # 1.5. Tratamento de tipos
+    # Convertendo as colunas numéricas que são chaves
+    colunas_numericas = ['ride_id', 'driver_id']
+    for coluna in colunas_numericas:
+        rides_data[coluna] = pd.to_numeric(rides_data[coluna], errors='coerce').astype('Int64')
+
+    # Convertendo as colunas booleanas
+    rides_data['is_going_to_campus'] = rides_data['is_going_to_campus'].fillna(False).astype(bool)
+
+    # 2. Transformação (Transform)
+    # Gerar chaves de data/hora a partir das datas em que a carona estava marcada para ocorrer (da coluna date)
+    # (as mesmas chaves valem para a dim_time e para o modelo dim_date + dim_time_of_day)
+    rides_data['date_sk'], rides_data['hour_sk'] = derive_date_hour_sks(rides_data['date'])
+
+    # Determinar se é carona de rotina
+    rides_data['is_routine_ride'] = (rides_data['week_days'].notna()) | (rides_data['repeats_until'].notna())
+
+    # As métricas de pedidos e mensagens já vêm agregadas por carona da extração (build_rides_extract_query)
+    rides_data[COUNT_COLUMNS] = rides_data[COUNT_COLUMNS].astype(int)
+
+    # Tratar NAs antes da seleção final
+    rides_data.fillna({'slots': 0, 'is_routine_ride': False}, inplace=True)
+
+    # Converter a coluna is_routine_ride para Python booleano (True/False)
+    rides_data['is_routine_ride'] = rides_data['is_routine_ride'].fillna(False).astype(bool)
+
+    # Chaves substitutas a partir do cache de SKs (IDs/nomes não mapeados vão para o membro desconhecido, -1)
+    rides_data['driver_user_sk'] = sk_cache.lookup('dim_user', rides_data['driver_id'])
+    rides_data['neighborhood_sk'] = sk_cache.lookup('dim_neighborhood', rides_data['neighborhood_name'])
+    rides_data['hub_sk'] = sk_cache.lookup('dim_hub', rides_data['hub_name'])
+
+    # Junk dimension dim_flags_carona: flags empacotadas num código inteiro e resolvidas pelo array de lookup
+    rides_data['done'] = rides_data['done'].fillna(False).astype(bool)
+    rides_data['flags_carona_sk'] = resolve_flags_carona_sks(rides_data, flags_lookup)
+
+    # Limpar colunas temporárias e selecionar as finais (alinhadas com a DDL da fato_carona)
+    final_fact_columns = [
+        'ride_id', 'driver_user_sk', 'neighborhood_sk', 'hub_sk', 'date_sk', 'hour_sk',
+        'flags_carona_sk', 'routine_id', 'slots', 'repeats_until',
+        'requests_count', 'accepted_requests_count', 'refused_requests_count',
+        'pending_requests_count', 'quit_requests_count', 'messages_count',
+        'created_at', 'updated_at', 'deleted_at'
+    ]
+    # Garantir que as colunas SK não são nulas se as FKs não são opcionais (refletir se deixamos assim, mas acho que sim)
+    rides_data.dropna(subset=['driver_user_sk', 'neighborhood_sk', 'hub_sk', 'date_sk', 'hour_sk'], inplace=True)
+
+    return rides_data[final_fact_columns]
+
+def etl_fact_carona(last_etl_run_date_str=None, conn_manager=None, sk_cache=None, run_id=None, date_range=None):
+    """
+    run_id: execução do ETL (etl_run). Cada bloco carregado grava o maior ride_id no etl_checkpoint, na mesma transação;
+    se a execução for retomada (--resume), a extração recomeça depois desse ride_id.
+    date_range: (início, fim) para carregar só as caronas marcadas nesse intervalo (uma fatia do backfill).
+    """
+    conn_oltp, conn_dw = get_etl_connections(conn_manager)
 
     if not conn_oltp or not conn_dw:
         print("Erro de conexão. ETL FatoCarona abortado.")
@@ -15,213 +182,74 @@ def etl_fact_carona(last_etl_run_date_str=None):
     try:
         # Obter o último timestamp do DW para carga incremental
         last_etl_run_date = get_last_etl_run_date_se_houver(conn_dw, last_etl_run_date_str)
-        print(f"Extraindo dados de caronas (rides) e ride_user. A partir de: {last_etl_run_date}")
+        print(f"Extraindo dados de caronas (rides), ride_user e messages. A partir de: {last_etl_run_date}")
+        set_step_info('fato_carona', watermark=str(last_etl_run_date))
+
+        # Obter chaves substitutas das dimensões já carregadas
+        # Otimização: o cache de SKs da execução já foi carregado uma vez e atualizado pelas cargas das dimensões
+        sk_cache = get_sk_cache(conn_dw, sk_cache, ['dim_user', 'dim_neighborhood', 'dim_hub'])
+        flags_lookup = load_carona_flags_lookup(conn_dw)
 
         # 1. Extração (Extract) dos dados incrementais do OLTP
-        # JOIN com ride_user para garantir que pegamos o driver_id associado à carona
-        # e com messages para contar as mensagens (se houver uma tabela de mensagens)
-        query_extract_rides = f"""
-        SELECT
-            r.id AS ride_id,
-            r.neighborhood AS neighborhood_name, -- Temos que pegar o neighborhood_id  
-            r.going AS is_going_to_campus, -- Renomear para clareza
-            r.routine_id,
-            r.hub AS hub_name, -- Temos que pegar o hub_id
-            r.slots,
-            r.created_at,
-            r.updated_at,
-            r.week_days,
-            r.repeats_until,
-            r.done,
-            r.deleted_at,
-            r.date,
-            ru_driver.user_id AS driver_id
-        FROM rides r 
-        JOIN ride_user ru_driver ON r.id = ru_driver.ride_id AND ru_driver.status = 'driver'
-        LEFT JOIN (
-            SELECT ride_id, COUNT(*) AS num_messages
-            FROM messages
-            GROUP BY ride_id
-        ) AS message_counts ON r.id = message_counts.ride_id
-        WHERE r.created_at >= '{last_etl_run_date}' OR r.updated_at >= '{last_etl_run_date}' OR r.deleted_at >= '{last_etl_run_date}';
-        """
-        rides_data = pd.read_sql(query_extract_rides, conn_oltp)
-
-        # Extrair dados de ride_user para agregação de status
-        # Filtrar por updated_at ou created_at para pegar apenas os pedidos recentes ou atualizados
-        query_extract_ride_users_for_aggregation = f"""
-        SELECT
-            ride_id,
-            status
-        FROM ride_user
-        WHERE created_at >= '{last_etl_run_date}' OR updated_at >= '{last_etl_run_date}';
-        """
-        ride_users_agg_data = pd.read_sql(query_extract_ride_users_for_aggregation, conn_oltp)
-
-        # 1.5. Tratamento de tipos
-        # Convertendo as colunas numéricas que são chaves
-        colunas_numericas = ['ride_id', 'driver_id']
-        for coluna in colunas_numericas:
-            rides_data[coluna] = pd.to_numeric(rides_data[coluna], errors='coerce').astype('Int64')
-        
-        # Convertendo as colunas booleanas
-        rides_data['is_going_to_campus'] = rides_data['is_going_to_campus'].fillna(False).astype(bool)
-
-        # 2. Transformação (Transform)
-        print(f"Extraídas {len(rides_data)} caronas para processamento incremental.")
-
-        if rides_data.empty and ride_users_agg_data.empty:
+        # Contagens de pedidos, motorista e mensagens agregados no próprio OLTP, uma linha por carona
+        incremental = last_etl_run_date > FULL_LOAD_START_DATE
+        query_extract_rides = build_rides_extract_query(incremental=incremental, date_filtered=date_range is not None)
+        print(f"Modo de agregação: {'incremental (só caronas afetadas)' if incremental else 'carga completa'}.")
+        _, resume_after_id = get_checkpoint(conn_dw, run_id, 'fato_carona')
+        if resume_after_id:
+            print(f"Retomando a fato_carona a partir do ride_id {resume_after_id} (último bloco commitado).")
+        extract_params = {'last_run': last_etl_run_date, 'resume_after_id': resume_after_id or 0}
+        if date_range is not None:
+            extract_params['date_from'], extract_params['date_to'] = date_range
+            print(f"Fatia de datas: {date_range[0]} a {date_range[1]} (exclusivo).")
+
+        # Extração, transformação e carga em pipeline (cursor do lado do servidor + filas limitadas, ver etl_pipeline.py):
+        # enquanto um bloco é carregado no DW, o próximo é transformado e o seguinte já é lido do OLTP
+        total_extracted = 0
+        total_loaded = 0
+        upsert_stats = new_upsert_stats()
+
+        def transform_chunk(rides_data):
+            last_ride_id = rides_data['ride_id'].max() # Extração ordenada por ride_id
+            with track_phase('fato_carona', 'transform', rows=len(rides_data)) as transform_phase:
+                fact_data_to_load = transform_rides_chunk(rides_data, sk_cache, flags_lookup)
+                transform_phase.rejected = len(rides_data) - len(fact_data_to_load)
+            return len(rides_data), last_ride_id, fact_data_to_load
+
+        def load_chunk(transformed):
+            nonlocal total_extracted, total_loaded
+            extracted_rows, last_ride_id, fact_data_to_load = transformed
+            # 3. Carga (Load) no DW
+            # created_at não é atualizado no conflito: é a data de criação original da carona
+            update_columns = [col for col in fact_data_to_load.columns if col not in ('ride_id', 'created_at')]
+            # Fato particionado por date_sk: cria antes as partições das datas novas do bloco
+            # Os dias tocados pelo bloco ficam marcados, na mesma transação, para o recálculo da fato_carona_diaria
+            touched_date_sks = set()
+            with track_phase('fato_carona', 'load', rows=len(fact_data_to_load)):
+                ensure_date_partitions(conn_dw, 'fato_carona', fact_data_to_load['date_sk'])
+                bulk_upsert_dataframe(conn_dw, fact_data_to_load, 'fato_carona', ['ride_id'], update_columns=update_columns,
+                                      row_hash_column='row_hash', stats=upsert_stats, partition_column='date_sk',
+                                      touched_partitions=touched_date_sks)
+                mark_pending_dates(conn_dw, 'fato_carona_diaria', touched_date_sks)
+                save_checkpoint(conn_dw, run_id, 'fato_carona', 'executando', last_key=last_ride_id)
+                conn_dw.commit()
+            total_extracted += extracted_rows
+            total_loaded += len(fact_data_to_load)
+            print(f"  - Bloco carregado na fato_carona: {len(fact_data_to_load)} registros (total: {total_loaded}).")
+
+        run_etl_pipeline(timed_chunks('fato_carona', extract_in_chunks(conn_oltp, query_extract_rides, extract_params)),
+                         transform_chunk, load_chunk)
+
+        print(f"Extraídas {total_extracted} caronas afetadas para processamento incremental.")
+        if total_extracted == 0:
             print("Nenhum dado novo ou atualizado para processar na fato_carona.")
             return True # Não há dados para carregar, mas não é um erro
 
-        # Gerar chaves de data/hora a partir das datas em que a carona estava marcada para ocorrer (da coluna date)
-        rides_data['date_sk'] = pd.to_datetime(rides_data['date']).dt.strftime('%Y%m%d').astype(int)
-        rides_data['hour_sk'] = pd.to_datetime(rides_data['date']).dt.strftime('%H%M').astype(int)
-
-        # Determinar se é carona de rotina
-        rides_data['is_routine_ride'] = (rides_data['week_days'].notna()) | (rides_data['repeats_until'].notna())
-
-        # Agregar métricas de pedidos
-        # Usar pivot_table para garantir que todos os status possíveis são colunas
-        if not ride_users_agg_data.empty:
-            requests_summary = ride_users_agg_data.pivot_table(
-                index='ride_id',
-                columns='status',
-                aggfunc='size',
-                fill_value=0
-            )
-            # Renomear e garantir que todas as colunas de status existam (mesmo que com 0)
-            status_columns = ['pending', 'accepted', 'refused', 'quit', 'driver']
-            for col in status_columns:
-                if col not in requests_summary.columns:
-                    requests_summary[col] = 0
-            
-            requests_summary.rename(columns={
-                'pending': 'pending_requests_count',
-                'accepted': 'accepted_requests_count',
-                'refused': 'refused_requests_count',
-                'quit': 'quit_requests_count',
-                'driver': 'driver_creation_events_agg' # É o evento de criação da carona pelo motorista
-            }, inplace=True)
-            
-            rides_data = rides_data.merge(requests_summary, how='left', left_on='ride_id', right_index=True)
-        else: # Se não houver dados de ride_user para agregar
-            rides_data['pending_requests_count'] = 0
-            rides_data['accepted_requests_count'] = 0
-            rides_data['refused_requests_count'] = 0
-            rides_data['quit_requests_count'] = 0
-            rides_data['driver_creation_events_agg'] = 0
-
-        rides_data['requests_count'] = rides_data[['pending_requests_count', 'accepted_requests_count', 'refused_requests_count', 'quit_requests_count']].sum(axis=1)
-
-        # Tratar NAs após o merge e antes da seleção final
-        rides_data.fillna({
-            'pending_requests_count': 0, 'accepted_requests_count': 0,
-            'refused_requests_count': 0, 'quit_requests_count': 0,
-            'requests_count': 0, 'messages_count': 0,
-            'is_going_to_campus': False, 'slots': 0, 'is_routine_ride': False,
-            'driver_creation_events_agg': 0
-        }, inplace=True)
-        
-        # Converter a coluna is_routine_ride para Python booleano (True/False)
-        rides_data['is_routine_ride'] = rides_data['is_routine_ride'].fillna(False).astype(bool)
-
-        # Obter chaves substitutas das dimensões já carregadas
-        # Otimização: Carregar mapas de SKs uma vez
-        dim_user_map = pd.read_sql("SELECT user_id, user_sk FROM dim_user;", conn_dw)
-        dim_neighborhood_map = pd.read_sql("SELECT neighborhood_name, neighborhood_sk FROM dim_neighborhood;", conn_dw)
-        dim_hub_map = pd.read_sql("SELECT hub_name, hub_sk FROM dim_hub;", conn_dw)
-
-        # Convertendo para numéricos os mapas das dimensões
-        dim_user_map['user_id'] = pd.to_numeric(dim_user_map['user_id'], errors='coerce').astype('Int64')
-        dim_neighborhood_map['neighborhood_id'] = pd.to_numeric(dim_neighborhood_map['neighborhood_id'], errors='coerce').astype('Int64')
-        dim_hub_map['hub_id'] = pd.to_numeric(dim_hub_map['hub_id'], errors='coerce').astype('Int64')
-
-        # Fazendo o merge com dim_user_map
-        rides_data = rides_data.merge(dim_user_map, left_on='driver_id', right_on='user_id', how='left')
-        rides_data.rename(columns={'user_sk': 'driver_user_sk'}, inplace=True)
-
-        # Fazendo o merge com dim_neighborhood_map
-        rides_data = rides_data.merge(dim_neighborhood_map, left_on='neighborhood_name', right_on='neighborhood_name', how='left')
-        rides_data.rename(columns={'neighborhood_sk': 'neighborhood_sk_mapped'}, inplace=True)
-        rides_data['neighborhood_sk'] = rides_data['neighborhood_sk_mapped']
-
-        # Fazendo o merge com dim_hub_map
-        rides_data = rides_data.merge(dim_hub_map, left_on='hub_name', right_on='hub_name', how='left')
-        rides_data.rename(columns={'hub_sk': 'hub_sk_mapped'}, inplace=True)
-        rides_data['hub_sk'] = rides_data['hub_sk_mapped']
-
-        # Tratamento de SKs nulas após o merge (se houver IDs que não foram mapeados - assumindo -1 para sk desconhecido)
-        rides_data['driver_user_sk'].fillna(-1, inplace=True)
-        rides_data['neighborhood_sk'].fillna(-1, inplace=True)
-        rides_data['hub_sk'].fillna(-1, inplace=True)
-
-        # Limpar colunas temporárias e selecionar as finais
-        final_fact_columns = [
-            'ride_id', 'driver_user_sk', 'neighborhood_sk', 'hub_sk', 'date_sk', 'hour_sk',
-            'is_going_to_campus', 'is_routine_ride', 'routine_id', 'slots',
-            'week_days', 'repeats_until', 'done',
-            'requests_count', 'accepted_requests_count', 'refused_requests_count',
-            'pending_requests_count', 'quit_requests_count', 'messages_count',
-            'created_at', 'updated_at', 'deleted_at'
-        ]
-        # Garantir que as colunas SK não são nulas se as FKs não são opcionais (refletir se deixamos assim, mas acho que sim)
-        rides_data.dropna(subset=['driver_user_sk', 'neighborhood_sk', 'hub_sk', 'date_sk', 'hour_sk'], inplace=True)
-        
-        fact_data_to_load = rides_data[final_fact_columns]
-        fact_data_to_load = fact_data_to_load.replace({pd.NA: None, '': None})
-
-        # 3. Carga (Load) no DW
-        print(f"Carregando {len(fact_data_to_load)} registros na fato_carona...")
-        
-        insert_or_update_query = """
-        INSERT INTO fato_carona (
-            ride_id, driver_user_sk, neighborhood_sk, hub_sk, date_sk, hour_sk,
-            is_going_to_campus, is_routine_ride, routine_id, slots,
-            week_days, repeats_until, done,
-            requests_count, accepted_requests_count, refused_requests_count,
-            pending_requests_count, quit_requests_count, messages_count,
-            created_at, updated_at, deleted_at
-        ) VALUES (
-            %(ride_id)s, %(driver_user_sk)s, %(neighborhood_sk)s, %(hub_sk)s, %(date_sk)s, %(hour_sk)s,
-            %(is_going_to_campus)s, %(is_routine_ride)s, %(routine_id)s, %(slots)s,
-            %(week_days)s, %(repeats_until)s, %(done)s,
-            %(requests_count)s, %(accepted_requests_count)s, %(refused_requests_count)s,
-            %(pending_requests_count)s, %(quit_requests_count)s, %(messages_count)s
-            %(created_at)s, %(updated_at)s, %(deleted_at)s
-        ) ON CONFLICT (ride_id) DO UPDATE SET
-            driver_user_sk = EXCLUDED.driver_user_sk,
-            neighborhood_sk = EXCLUDED.neighborhood_sk,
-            hub_sk = EXCLUDED.hub_sk,
-            date_sk = EXCLUDED.date_sk,
-            hour_sk = EXCLUDED.hour_sk,
-            is_going_to_campus = EXCLUDED.is_going_to_campus,
-            is_routine_ride = EXCLUDED.is_routine_ride,
-            routine_id = EXCLUDED.routine_id,
-            slots = EXCLUDED.slots,
-            week_days = EXCLUDED.week_days,
-            repeats_until = EXCLUDED.repeats_until,
-            done = EXCLUDED.done,
-            requests_count = EXCLUDED.requests_count,
-            accepted_requests_count = EXCLUDED.accepted_requests_count,
-            refused_requests_count = EXCLUDED.refused_requests_count,
-            pending_requests_count = EXCLUDED.pending_requests_count,
-            quit_requests_count = EXCLUDED.quit_requests_count,
-            messages_count = EXCLUDED.messages_count,
-            updated_at = EXCLUDED.updated_at; -- Atualizar o updated_at para a marca d'água
-            deleted_at = EXCLUDED.deleted_at; -- Atualizar o deleted_at para a marca d'água, se a carona foi deletada de lá pra cá
-        """
-        data_to_load_dicts = fact_data_to_load.to_dict(orient='records')
-
-        with conn_dw.cursor() as cur:
-            execute_batch(cur, insert_or_update_query, data_to_load_dicts)
-        conn_dw.commit()
-        print("Carga da fato_carona concluída.")
+        print(f"Carga da fato_carona concluída ({format_upsert_stats(upsert_stats)}).")
         return True
 
     except Exception as e:
         print(f"Erro no ETL da FatoCarona: {e}")
         return False
     finally:
-        if conn_oltp: conn_oltp.close()
-        if conn_dw: conn_dw.close()
\ No newline at end of file
+        release_etl_connections(conn_manager, conn_oltp, conn_dw)
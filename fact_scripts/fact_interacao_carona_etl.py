@@ -1,12 +1,46 @@
 # fact_scripts/fact_interacao_carona_etl.py
-import pandas as pd
-from config import DB_OLTP, DB_DW
-from utils import connect_to_db, get_last_etl_run_date
-from psycopg2.extras import execute_batch
-
-def etl_fact_interacao_carona(last_etl_run_date_str=None):
-    conn_oltp = connect_to_db(DB_OLTP)
-    conn_dw = connect_to_db(DB_DW)
+from utils import get_etl_connections, release_etl_connections, get_last_etl_run_date_se_houver, bulk_upsert_dataframe, new_upsert_stats, format_upsert_stats, derive_date_hour_sks, extract_in_chunks, get_checkpoint, save_checkpoint, ensure_date_partitions
+from sk_cache import get_sk_cache
+from etl_metrics import track_phase, timed_chunks, set_step_info
+from etl_pipeline import run_etl_pipeline
+
+def transform_ride_users_chunk(ride_users_data, sk_cache):
+    """Transforma um bloco de ride_user extraído do OLTP nas linhas da fato_interacao_carona."""
+    # 2. Transformação (Transform)
+    # (as mesmas chaves valem para a dim_time e para o modelo dim_date + dim_time_of_day)
+    ride_users_data['date_sk'], ride_users_data['hour_sk'] = derive_date_hour_sks(ride_users_data['created_at'])
+
+    # Criar as colunas booleanas de status
+    ride_users_data['is_driver_interaction'] = (ride_users_data['status'] == 'driver')
+    ride_users_data['is_passenger_request'] = (ride_users_data['status'].isin(['pending', 'accepted', 'refused', 'quit']))
+    ride_users_data['request_accepted'] = (ride_users_data['status'] == 'accepted')
+    ride_users_data['request_refused'] = (ride_users_data['status'] == 'refused')
+    ride_users_data['request_pending'] = (ride_users_data['status'] == 'pending')
+    ride_users_data['request_quit'] = (ride_users_data['status'] == 'quit')
+
+    # Chaves substitutas a partir do cache de SKs (chaves não mapeadas vão para o membro desconhecido, -1)
+    ride_users_data['user_sk'] = sk_cache.lookup('dim_user', ride_users_data['user_id'])
+    ride_users_data['status_sk'] = sk_cache.lookup('dim_status_pedido', ride_users_data['status'])
+
+    # Limpar colunas temporárias e selecionar as finais
+    final_fact_columns = [
+        'ride_user_id', 'ride_id', 'user_sk', 'date_sk', 'hour_sk', 'status_sk',
+        'is_driver_interaction', 'is_passenger_request', 'request_accepted',
+        'request_refused', 'request_pending', 'request_quit',
+        'created_at', 'updated_at'
+    ]
+    # Garantir que as colunas SK não são nulas
+    ride_users_data.dropna(subset=['user_sk', 'date_sk', 'hour_sk', 'status_sk'], inplace=True)
+
+    return ride_users_data[final_fact_columns]
+
+def etl_fact_interacao_carona(last_etl_run_date_str=None, conn_manager=None, sk_cache=None, run_id=None, date_range=None):
+    """
+    run_id: execução do ETL (etl_run). Cada bloco carregado grava o maior ride_user_id no etl_checkpoint;
+    numa execução retomada (--resume) a extração recomeça depois dele.
+    date_range: (início, fim) para carregar só as interações criadas nesse intervalo (uma fatia do backfill).
+    """
+    conn_oltp, conn_dw = get_etl_connections(conn_manager)
 
     if not conn_oltp or not conn_dw:
         print("Erro de conexão. ETL FatoInteracaoCarona abortado.")
@@ -14,11 +48,21 @@ def etl_fact_interacao_carona(last_etl_run_date_str=None):
 
     try:
         # Obter o último timestamp do DW para carga incremental
-        last_etl_run_date = get_last_etl_run_date(conn_dw, last_etl_run_date_str)
+        last_etl_run_date = get_last_etl_run_date_se_houver(conn_dw, last_etl_run_date_str)
 
         print(f"Extraindo dados de ride_user. A partir de: {last_etl_run_date}")
+        set_step_info('fato_interacao_carona', watermark=str(last_etl_run_date))
+
+        # Obter chaves substitutas das dimensões (cache de SKs compartilhado da execução)
+        sk_cache = get_sk_cache(conn_dw, sk_cache, ['dim_user', 'dim_status_pedido'])
+
+        _, resume_after_id = get_checkpoint(conn_dw, run_id, 'fato_interacao_carona')
+        if resume_after_id:
+            print(f"Retomando a fato_interacao_carona a partir do ride_user_id {resume_after_id} (último bloco commitado).")
 
         # 1. Extração (Extract)
+        # Em ordem de id, para o checkpoint de cada bloco marcar até onde a carga já foi
+        date_filter_sql = "\n          AND created_at >= %(date_from)s AND created_at < %(date_to)s" if date_range is not None else ""
         query_extract_ride_users = f"""
         SELECT
             id AS ride_user_id,
@@ -28,91 +72,56 @@ def etl_fact_interacao_carona(last_etl_run_date_str=None):
             updated_at,
             status
         FROM ride_user
-        WHERE created_at >= '{last_etl_run_date}' OR updated_at >= '{last_etl_run_date}';
+        WHERE (created_at >= %(last_run)s OR updated_at >= %(last_run)s)
+          AND id > %(resume_after_id)s{date_filter_sql}
+        ORDER BY id;
         """
-        ride_users_data = pd.read_sql(query_extract_ride_users, conn_oltp)
-        print(f"Extraídas {len(ride_users_data)} interações de carona para processamento incremental.")
 
-        if ride_users_data.empty:
+        # Extração, transformação e carga em pipeline (cursor do lado do servidor + filas limitadas, ver etl_pipeline.py)
+        total_extracted = 0
+        total_loaded = 0
+        upsert_stats = new_upsert_stats()
+
+        def transform_chunk(ride_users_data):
+            last_ride_user_id = ride_users_data['ride_user_id'].max()
+            with track_phase('fato_interacao_carona', 'transform', rows=len(ride_users_data)) as transform_phase:
+                fact_data_to_load = transform_ride_users_chunk(ride_users_data, sk_cache)
+                transform_phase.rejected = len(ride_users_data) - len(fact_data_to_load)
+            return len(ride_users_data), last_ride_user_id, fact_data_to_load
+
+        def load_chunk(transformed):
+            nonlocal total_extracted, total_loaded
+            extracted_rows, last_ride_user_id, fact_data_to_load = transformed
+            # 3. Carga (Load) no DW
+            # created_at não é atualizado no conflito: é a data de criação original do pedido
+            update_columns = [col for col in fact_data_to_load.columns if col not in ('ride_user_id', 'created_at')]
+            # Fato particionado por date_sk: cria antes as partições das datas novas do bloco
+            with track_phase('fato_interacao_carona', 'load', rows=len(fact_data_to_load)):
+                ensure_date_partitions(conn_dw, 'fato_interacao_carona', fact_data_to_load['date_sk'])
+                bulk_upsert_dataframe(conn_dw, fact_data_to_load, 'fato_interacao_carona', ['ride_user_id'], update_columns=update_columns,
+                                      row_hash_column='row_hash', stats=upsert_stats, partition_column='date_sk')
+                save_checkpoint(conn_dw, run_id, 'fato_interacao_carona', 'executando', last_key=last_ride_user_id)
+                conn_dw.commit()
+            total_extracted += extracted_rows
+            total_loaded += len(fact_data_to_load)
+            print(f"  - Bloco carregado na fato_interacao_carona: {len(fact_data_to_load)} registros (total: {total_loaded}).")
+
+        extract_params = {'last_run': last_etl_run_date, 'resume_after_id': resume_after_id or 0}
+        if date_range is not None:
+            extract_params['date_from'], extract_params['date_to'] = date_range
+        run_etl_pipeline(timed_chunks('fato_interacao_carona', extract_in_chunks(conn_oltp, query_extract_ride_users, extract_params)),
+                         transform_chunk, load_chunk)
+
+        print(f"Extraídas {total_extracted} interações de carona para processamento incremental.")
+        if total_extracted == 0:
             print("Nenhum dado novo ou atualizado para processar na fato_interacao_carona.")
             return True
 
-        # 2. Transformação (Transform)
-        ride_users_data['date_sk'] = pd.to_datetime(ride_users_data['created_at']).dt.strftime('%Y%m%d').astype(int)
-        ride_users_data['hour_sk'] = pd.to_datetime(ride_users_data['created_at']).dt.strftime('%H%M').astype(int)
-
-        # Criar as colunas booleanas de status
-        ride_users_data['is_driver_interaction'] = (ride_users_data['status'] == 'driver')
-        ride_users_data['is_passenger_request'] = (ride_users_data['status'].isin(['pending', 'accepted', 'refused', 'quit']))
-        ride_users_data['request_accepted'] = (ride_users_data['status'] == 'accepted')
-        ride_users_data['request_refused'] = (ride_users_data['status'] == 'refused')
-        ride_users_data['request_pending'] = (ride_users_data['status'] == 'pending')
-        ride_users_data['request_quit'] = (ride_users_data['status'] == 'quit')
-
-        # Obter chaves substitutas das dimensões
-        dim_user_map = pd.read_sql("SELECT user_id, user_sk FROM dim_user;", conn_dw)
-        dim_status_pedido_map = pd.read_sql("SELECT status_name, status_sk FROM dim_status_pedido;", conn_dw)
-
-        ride_users_data = ride_users_data.merge(dim_user_map, left_on='user_id', right_on='user_id', how='left')
-        ride_users_data.rename(columns={'user_sk': 'user_sk_mapped'}, inplace=True)
-        ride_users_data['user_sk'] = ride_users_data['user_sk_mapped']
-        
-        ride_users_data = ride_users_data.merge(dim_status_pedido_map, left_on='status', right_on='status_name', how='left')
-        ride_users_data.rename(columns={'status_sk': 'status_sk_mapped'}, inplace=True)
-        ride_users_data['status_sk'] = ride_users_data['status_sk_mapped']
-
-        # Limpar colunas temporárias e selecionar as finais
-        final_fact_columns = [
-            'ride_user_id', 'ride_id', 'user_sk', 'date_sk', 'hour_sk', 'status_sk',
-            'is_driver_interaction', 'is_passenger_request', 'request_accepted',
-            'request_refused', 'request_pending', 'request_quit',
-            'created_at', 'updated_at'
-        ]
-        # Garantir que as colunas SK não são nulas
-        ride_users_data.dropna(subset=['user_sk', 'date_sk', 'hour_sk', 'status_sk'], inplace=True)
-
-        fact_data_to_load = ride_users_data[final_fact_columns]
-        fact_data_to_load = fact_data_to_load.replace({pd.NA: None, '': None})
-
-        # 3. Carga (Load) no DW
-        print(f"Carregando {len(fact_data_to_load)} registros na fato_interacao_carona...")
-
-        insert_or_update_query = """
-        INSERT INTO fato_interacao_carona (
-            ride_user_id, ride_id, user_sk, date_sk, hour_sk, status_sk,
-            is_driver_interaction, is_passenger_request, request_accepted,
-            request_refused, request_pending, request_quit,
-            created_at, updated_at
-        ) VALUES (
-            %(ride_user_id)s, %(ride_id)s, %(user_sk)s, %(date_sk)s, %(hour_sk)s, %(status_sk)s,
-            %(is_driver_interaction)s, %(is_passenger_request)s, %(request_accepted)s,
-            %(request_refused)s, %(request_pending)s, %(request_quit)s,
-            %(created_at)s, %(updated_at)s
-        ) ON CONFLICT (ride_user_id) DO UPDATE SET
-            ride_id = EXCLUDED.ride_id,
-            user_sk = EXCLUDED.user_sk,
-            date_sk = EXCLUDED.date_sk,
-            hour_sk = EXCLUDED.hour_sk,
-            status_sk = EXCLUDED.status_sk,
-            is_driver_interaction = EXCLUDED.is_driver_interaction,
-            is_passenger_request = EXCLUDED.is_passenger_request,
-            request_accepted = EXCLUDED.request_accepted,
-            request_refused = EXCLUDED.request_refused,
-            request_pending = EXCLUDED.request_pending,
-            request_quit = EXCLUDED.request_quit,
-            updated_at = EXCLUDED.updated_at;
-        """
-        data_to_load_dicts = fact_data_to_load.to_dict(orient='records')
-
-        with conn_dw.cursor() as cur:
-            execute_batch(cur, insert_or_update_query, data_to_load_dicts)
-        conn_dw.commit()
-        print("Carga da fato_interacao_carona concluída.")
+        print(f"Carga da fato_interacao_carona concluída ({format_upsert_stats(upsert_stats)}).")
         return True
 
     except Exception as e:
         print(f"Erro no ETL da FatoInteracaoCarona: {e}")
         return False
     finally:
-        if conn_oltp: conn_oltp.close()
-        if conn_dw: conn_dw.close()
\ No newline at end of file
+        release_etl_connections(conn_manager, conn_oltp, conn_dw)
@@ -0,0 +1,309 @@
+# gerador_dados_oltp.py
+# Gera um OLTP sintético do Caronaê num PostgreSQL local (DB_OLTP do config.py), para testar o ETL em escala.
+# Mesma semente -> mesmos dados. Uso:
+#     python gerador_dados_oltp.py --escala 10 --seed 42 --recria
+import argparse
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from utils import connect_to_db, dataframe_para_csv, COPY_NULL
+from config import DB_OLTP
+
+# Volumes aproximados do dump real (escala 1). Tabelas de referência (instituições, campi, pólos,
+# zonas e bairros) não crescem com a escala, só usuários, caronas, pedidos e mensagens
+BASE_VOLUMES = {
+    'users': 30000,
+    'rides': 150000
+}
+
+# Distribuições observadas no dump real (aproximadas)
+PROPORCAO_ROTINA = 0.4              # caronas de rotina (com week_days e repeats_until)
+CARONAS_POR_ROTINA = 8              # ocorrências geradas por rotina (mesmo routine_id)
+PROPORCAO_DELETADAS = 0.08          # caronas com deleted_at
+PROPORCAO_FINALIZADAS = 0.7         # caronas já passadas marcadas como done
+PROPORCAO_INDO_CAMPUS = 0.55        # going = True
+PEDIDOS_POR_CARONA = 2.2            # média (Poisson) de pedidos de caronistas por carona
+MENSAGENS_POR_CARONA = 1.5          # média (Poisson) de mensagens por carona
+STATUS_PEDIDOS = {'pending': 0.15, 'accepted': 0.45, 'refused': 0.2, 'quit': 0.2}
+PROPORCAO_COM_CARRO = 0.3
+PROPORCAO_BANIDOS = 0.005
+PERFIS = {'Aluno': 0.8, 'Servidor': 0.12, 'Professor': 0.08}
+PLATAFORMAS = {'android': 0.65, 'ios': 0.35}
+
+# Período dos dados (o mesmo da dim_time)
+INICIO = datetime(2016, 4, 1)
+FIM = datetime(2023, 12, 31)
+
+# Texto da coluna week_days para cada máscara de 7 bits (bit 0 = 1 = segunda, ..., bit 6 = 7 = domingo)
+WEEK_DAYS_POR_MASCARA = np.array([
+    ','.join(str(day + 1) for day in range(7) if mask >> day & 1) for mask in range(128)
+], dtype=object)
+
+# Caronas geradas e enviadas ao banco por vez (junto com os seus pedidos e mensagens)
+CARONAS_POR_BLOCO = 100000
+
+OLTP_DDL = """
+CREATE TABLE IF NOT EXISTS institutions (
+    id INT PRIMARY KEY, name VARCHAR(255), color VARCHAR(10),
+    created_at TIMESTAMP, updated_at TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS campi (
+    id INT PRIMARY KEY, name VARCHAR(100), color VARCHAR(10), institution_id INT,
+    created_at TIMESTAMP, updated_at TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS hubs (
+    id INT PRIMARY KEY, name VARCHAR(100), center VARCHAR(100), campus_id INT
+);
+CREATE TABLE IF NOT EXISTS zones (
+    id INT PRIMARY KEY, name VARCHAR(100), color VARCHAR(10)
+);
+CREATE TABLE IF NOT EXISTS neighborhoods (
+    id INT PRIMARY KEY, name VARCHAR(100), distance NUMERIC(10, 2), zone_id INT
+);
+CREATE TABLE IF NOT EXISTS users (
+    id INT PRIMARY KEY, name VARCHAR(255), profile VARCHAR(50), course VARCHAR(100),
+    phone_number VARCHAR(100), email VARCHAR(255), car_owner BOOLEAN, car_model VARCHAR(100),
+    car_color VARCHAR(50), car_plate VARCHAR(20), location VARCHAR(255), id_ufrj VARCHAR(20),
+    app_platform VARCHAR(255), app_version VARCHAR(255), banned BOOLEAN, institution_id INT,
+    created_at TIMESTAMP, updated_at TIMESTAMP, deleted_at TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS rides (
+    id INT PRIMARY KEY, neighborhood VARCHAR(100), going BOOLEAN, routine_id INT, hub VARCHAR(100),
+    slots INT, week_days VARCHAR(20), repeats_until TIMESTAMP, done BOOLEAN, date TIMESTAMP,
+    created_at TIMESTAMP, updated_at TIMESTAMP, deleted_at TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS ride_user (
+    id INT PRIMARY KEY, ride_id INT, user_id INT, status VARCHAR(20),
+    created_at TIMESTAMP, updated_at TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INT PRIMARY KEY, ride_id INT, user_id INT, body TEXT,
+    created_at TIMESTAMP, updated_at TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS ride_user_ride_id_idx ON ride_user (ride_id);
+CREATE INDEX IF NOT EXISTS messages_ride_id_idx ON messages (ride_id);
+"""
+
+OLTP_TABLES = ['messages', 'ride_user', 'rides', 'users', 'neighborhoods', 'zones', 'hubs', 'campi', 'institutions']
+
+def _escolher(rng, opcoes, n):
+    """Sorteia n valores de um dicionário {valor: probabilidade}."""
+    return rng.choice(list(opcoes.keys()), size=n, p=list(opcoes.values()))
+
+def _datas_aleatorias(rng, n, inicio=INICIO, fim=FIM):
+    segundos = rng.integers(0, int((fim - inicio).total_seconds()), size=n)
+    return pd.Timestamp(inicio) + pd.to_timedelta(segundos, unit='s')
+
+def _copiar(conn, df, tabela):
+    columns_sql = ', '.join(df.columns)
+    with conn.cursor() as cur:
+        cur.copy_expert(f"COPY {tabela} ({columns_sql}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')",
+                        dataframe_para_csv(df))
+
+def gerar_tabelas_referencia(rng):
+    """Instituições, campi, pólos, zonas e bairros: volume fixo, como no Caronaê real."""
+    criacao = pd.Timestamp(INICIO)
+    institutions = pd.DataFrame({
+        'id': [1, 2, 3],
+        'name': ['UFRJ', 'UFF', 'UNIRIO'],
+        'color': ['#0a5c9b', '#0b3b60', '#7a1e2c'],
+        'created_at': criacao, 'updated_at': criacao
+    })
+    campi = pd.DataFrame({
+        'id': np.arange(1, 9),
+        'name': ['Cidade Universitária', 'Praia Vermelha', 'Macaé', 'Duque de Caxias',
+                 'Gragoatá', 'Valonguinho', 'Praia Vermelha (UFF)', 'Urca'],
+        'color': ['#f0a30a', '#2d89ef', '#00a300', '#b91d47', '#603cba', '#ff0097', '#1e7145', '#da532c'],
+        'institution_id': [1, 1, 1, 1, 2, 2, 2, 3],
+        'created_at': criacao, 'updated_at': criacao
+    })
+    n_hubs = 40
+    hubs = pd.DataFrame({
+        'id': np.arange(1, n_hubs + 1),
+        'name': [f"Pólo {i}" for i in range(1, n_hubs + 1)],
+        'center': _escolher(rng, {'CT': 0.3, 'CCS': 0.25, 'CCMN': 0.15, 'Letras': 0.15, 'Reitoria': 0.15}, n_hubs),
+        'campus_id': rng.integers(1, len(campi) + 1, size=n_hubs)
+    })
+    zones = pd.DataFrame({
+        'id': np.arange(1, 9),
+        'name': ['Centro', 'Zona Sul', 'Zona Norte', 'Zona Oeste', 'Baixada', 'Niterói', 'São Gonçalo', 'Grande Niterói'],
+        'color': ['#e51400', '#a4c400', '#1ba1e2', '#f09609', '#8cbf26', '#a05000', '#e671b8', '#339933']
+    })
+    n_neighborhoods = 160
+    neighborhoods = pd.DataFrame({
+        'id': np.arange(1, n_neighborhoods + 1),
+        'name': [f"Bairro {i}" for i in range(1, n_neighborhoods + 1)],
+        'distance': np.round(rng.gamma(2.0, 8.0, size=n_neighborhoods), 2),
+        'zone_id': rng.integers(1, len(zones) + 1, size=n_neighborhoods)
+    })
+    return {'institutions': institutions, 'campi': campi, 'hubs': hubs, 'zones': zones, 'neighborhoods': neighborhoods}
+
+def gerar_usuarios(rng, n_users):
+    created_at = _datas_aleatorias(rng, n_users)
+    updated_at = created_at + pd.to_timedelta(rng.integers(0, 365 * 24 * 3600, size=n_users), unit='s')
+    car_owner = rng.random(n_users) < PROPORCAO_COM_CARRO
+    ids = np.arange(1, n_users + 1)
+    return pd.DataFrame({
+        'id': ids,
+        'name': [f"Usuário {i}" for i in ids],
+        'profile': _escolher(rng, PERFIS, n_users),
+        'course': _escolher(rng, {'Engenharia': 0.35, 'Medicina': 0.15, 'Direito': 0.1, 'Letras': 0.1,
+                                  'Computação': 0.15, 'Administração': 0.15}, n_users),
+        'phone_number': [f"21 9{i:08d}" for i in ids],
+        'email': [f"usuario{i}@exemplo.com" for i in ids],
+        'car_owner': car_owner,
+        'car_model': np.where(car_owner, _escolher(rng, {'Gol': 0.3, 'Onix': 0.3, 'HB20': 0.2, 'Palio': 0.2}, n_users), None),
+        'car_color': np.where(car_owner, _escolher(rng, {'Prata': 0.4, 'Preto': 0.3, 'Branco': 0.3}, n_users), None),
+        'car_plate': np.where(car_owner, [f"ABC{i % 10000:04d}" for i in ids], None),
+        'location': _escolher(rng, {f"Bairro {i}": 1 / 160 for i in range(1, 161)}, n_users),
+        'id_ufrj': [f"{i:011d}" for i in ids],
+        'app_platform': _escolher(rng, PLATAFORMAS, n_users),
+        'app_version': _escolher(rng, {'1.4.0': 0.2, '1.5.2': 0.3, '2.0.1': 0.5}, n_users),
+        'banned': rng.random(n_users) < PROPORCAO_BANIDOS,
+        'institution_id': _escolher(rng, {1: 0.8, 2: 0.15, 3: 0.05}, n_users),
+        'created_at': created_at,
+        'updated_at': updated_at,
+        'deleted_at': pd.NaT
+    })
+
+def gerar_bloco_caronas(rng, primeiro_id, n_rides, n_users, referencias, proximo_ride_user_id, proximo_message_id):
+    """Gera um bloco de caronas (ids a partir de primeiro_id) com os seus pedidos (ride_user) e mensagens."""
+    ride_ids = np.arange(primeiro_id, primeiro_id + n_rides)
+    date = _datas_aleatorias(rng, n_rides)
+    created_at = date - pd.to_timedelta(rng.integers(3600, 7 * 24 * 3600, size=n_rides), unit='s')
+    updated_at = created_at + pd.to_timedelta(rng.integers(0, 14 * 24 * 3600, size=n_rides), unit='s')
+    deleted = rng.random(n_rides) < PROPORCAO_DELETADAS
+    deleted_at = pd.Series(updated_at).where(deleted)
+
+    # Caronas de rotina: ocorrências da mesma rotina compartilham routine_id, week_days e repeats_until
+    is_routine = rng.random(n_rides) < PROPORCAO_ROTINA
+    routine_ids = np.where(is_routine, (ride_ids // CARONAS_POR_ROTINA) + 1, 0)
+    routine_days = (routine_ids * 2654435761 % 127) + 1 # Máscara de dias determinística por rotina (1 a 127)
+    week_days = pd.Series(WEEK_DAYS_POR_MASCARA[routine_days]).where(is_routine)
+    repeats_until = (pd.Series(date) + pd.to_timedelta(rng.integers(7, 120, size=n_rides), unit='D')).where(is_routine)
+
+    rides = pd.DataFrame({
+        'id': ride_ids,
+        'neighborhood': referencias['neighborhoods']['name'].to_numpy()[rng.integers(0, len(referencias['neighborhoods']), size=n_rides)],
+        'going': rng.random(n_rides) < PROPORCAO_INDO_CAMPUS,
+        'routine_id': pd.Series(routine_ids).where(is_routine).astype('Int64'),
+        'hub': referencias['hubs']['name'].to_numpy()[rng.integers(0, len(referencias['hubs']), size=n_rides)],
+        'slots': rng.integers(1, 5, size=n_rides),
+        'week_days': week_days,
+        'repeats_until': repeats_until,
+        'done': (rng.random(n_rides) < PROPORCAO_FINALIZADAS) & (date < pd.Timestamp(FIM)),
+        'date': date,
+        'created_at': created_at,
+        'updated_at': updated_at,
+        'deleted_at': deleted_at
+    })
+
+    # ride_user: um registro 'driver' por carona e uma quantidade Poisson de pedidos de caronistas
+    driver_ids = rng.integers(1, n_users + 1, size=n_rides)
+    n_requests = rng.poisson(PEDIDOS_POR_CARONA, size=n_rides)
+    request_ride_pos = np.repeat(np.arange(n_rides), n_requests)
+    n_request_rows = len(request_ride_pos)
+    request_created_at = (pd.Series(created_at).to_numpy()[request_ride_pos]
+                          + pd.to_timedelta(rng.integers(0, 48 * 3600, size=n_request_rows), unit='s'))
+    requests = pd.DataFrame({
+        'ride_id': ride_ids[request_ride_pos],
+        'user_id': rng.integers(1, n_users + 1, size=n_request_rows),
+        'status': _escolher(rng, STATUS_PEDIDOS, n_request_rows),
+        'created_at': request_created_at,
+        'updated_at': request_created_at + pd.to_timedelta(rng.integers(0, 24 * 3600, size=n_request_rows), unit='s')
+    })
+    drivers = pd.DataFrame({
+        'ride_id': ride_ids, 'user_id': driver_ids, 'status': 'driver',
+        'created_at': created_at, 'updated_at': created_at
+    })
+    ride_user = pd.concat([drivers, requests], ignore_index=True)
+    ride_user.insert(0, 'id', np.arange(proximo_ride_user_id, proximo_ride_user_id + len(ride_user)))
+
+    # messages: quantidade Poisson por carona, escritas perto do horário da carona,
+    # mas nunca antes de a carona ser criada nem depois de ser apagada
+    n_messages = rng.poisson(MENSAGENS_POR_CARONA, size=n_rides)
+    message_ride_pos = np.repeat(np.arange(n_rides), n_messages)
+    message_created_at = (pd.Series(date).to_numpy()[message_ride_pos]
+                          - pd.to_timedelta(rng.integers(0, 24 * 3600, size=len(message_ride_pos)), unit='s'))
+    message_created_at = np.maximum(message_created_at, pd.Series(created_at).to_numpy()[message_ride_pos])
+    ride_deleted_at = deleted_at.to_numpy()[message_ride_pos]
+    message_created_at = np.where(pd.notna(ride_deleted_at), np.minimum(message_created_at, ride_deleted_at), message_created_at)
+    messages = pd.DataFrame({
+        'id': np.arange(proximo_message_id, proximo_message_id + len(message_ride_pos)),
+        'ride_id': ride_ids[message_ride_pos],
+        'user_id': rng.integers(1, n_users + 1, size=len(message_ride_pos)),
+        'body': 'Mensagem gerada',
+        'created_at': message_created_at,
+        'updated_at': message_created_at
+    })
+    return rides, ride_user, messages
+
+def gerar_oltp(escala=1, seed=42, recria=False, db_config=DB_OLTP):
+    """Popula o OLTP com dados sintéticos na escala pedida (1 = volume aproximado do dump real)."""
+    rng = np.random.default_rng(seed)
+    n_users = int(BASE_VOLUMES['users'] * escala)
+    n_rides = int(BASE_VOLUMES['rides'] * escala)
+
+    conn = connect_to_db(db_config)
+    if not conn:
+        print("Erro de conexão com o OLTP. Geração abortada.")
+        return False
+
+    try:
+        with conn.cursor() as cur:
+            if recria:
+                cur.execute(f"DROP TABLE IF EXISTS {', '.join(OLTP_TABLES)} CASCADE;")
+            cur.execute(OLTP_DDL)
+            # Os ids sempre começam em 1: gerar de novo sobre dados existentes só daria conflito de chave primária
+            cur.execute("SELECT EXISTS (SELECT 1 FROM users) OR EXISTS (SELECT 1 FROM rides);")
+            oltp_populado = cur.fetchone()[0]
+        conn.commit()
+        if oltp_populado:
+            print("O OLTP já tem dados. Use --recria para apagar as tabelas e gerar de novo.")
+            return False
+
+        print(f"Gerando OLTP sintético: escala {escala}, semente {seed} ({n_users} usuários, {n_rides} caronas)...")
+        referencias = gerar_tabelas_referencia(rng)
+        for tabela, df in referencias.items():
+            _copiar(conn, df, tabela)
+        _copiar(conn, gerar_usuarios(rng, n_users), 'users')
+        conn.commit()
+        print("  - Tabelas de referência e usuários carregados.")
+
+        proximo_ride_user_id = 1
+        proximo_message_id = 1
+        for primeiro_id in range(1, n_rides + 1, CARONAS_POR_BLOCO):
+            n_bloco = min(CARONAS_POR_BLOCO, n_rides - primeiro_id + 1)
+            rides, ride_user, messages = gerar_bloco_caronas(
+                rng, primeiro_id, n_bloco, n_users, referencias, proximo_ride_user_id, proximo_message_id
+            )
+            _copiar(conn, rides, 'rides')
+            _copiar(conn, ride_user, 'ride_user')
+            _copiar(conn, messages, 'messages')
+            conn.commit()
+            proximo_ride_user_id += len(ride_user)
+            proximo_message_id += len(messages)
+            print(f"  - Caronas {primeiro_id} a {primeiro_id + n_bloco - 1} carregadas "
+                  f"({len(ride_user)} ride_user, {len(messages)} mensagens).")
+
+        with conn.cursor() as cur:
+            cur.execute(f"ANALYZE {', '.join(OLTP_TABLES)};")
+        conn.commit()
+        print("Geração do OLTP sintético concluída.")
+        return True
+
+    except Exception as e:
+        conn.rollback()
+        print(f"Erro na geração do OLTP sintético: {e}")
+        return False
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera um OLTP sintético do Caronaê para testes de escala do ETL.")
+    parser.add_argument('--escala', type=float, default=1, help="Fator de escala sobre o volume real (ex: 1, 10, 100)")
+    parser.add_argument('--seed', type=int, default=42, help="Semente do gerador (mesma semente, mesmos dados)")
+    parser.add_argument('--recria', action='store_true', help="Apaga as tabelas do OLTP antes de gerar (obrigatório se já houver dados)")
+    args = parser.parse_args()
+
+    gerar_oltp(escala=args.escala, seed=args.seed, recria=args.recria)
@@ -0,0 +1,79 @@
+# sk_cache.py
+import threading
+import numpy as np
+import pandas as pd
+
+# Dimensões mantidas no cache: tabela -> (chave de negócio usada pelos fatos, chave substituta)
+# Bairro e pólo são mapeados pelo nome porque é assim que aparecem na tabela rides do OLTP
+CACHED_DIMENSIONS = {
+    'dim_user': ('user_id', 'user_sk'),
+    'dim_neighborhood': ('neighborhood_name', 'neighborhood_sk'),
+    'dim_hub': ('hub_name', 'hub_sk'),
+    'dim_status_pedido': ('status_name', 'status_sk')
+}
+
+# SK dos membros "Desconhecidos" inseridos por insert_all_unknown_dim_members
+UNKNOWN_SK = -1
+
+class SurrogateKeyCache:
+    """
+    Mapas chave de negócio -> chave substituta das dimensões, carregados uma vez por execução
+    e compartilhados entre as cargas dos fatos (no lugar de pd.read_sql + merge em cada fato).
+    As cargas das dimensões atualizam o cache com as SKs devolvidas pelo RETURNING do upsert.
+    """
+
+    def __init__(self, dimensions=CACHED_DIMENSIONS):
+        self.dimensions = dict(dimensions)
+        self._maps = {dim_table: {} for dim_table in self.dimensions}
+        # Índice do pandas montado a partir do dicionário sob demanda (invalidado a cada atualização)
+        self._indexes = {}
+        self._loaded = set()
+        self._lock = threading.Lock() # As etapas rodam em threads (etl_scheduler)
+
+    def load(self, conn_dw, dim_tables=None):
+        """Lê do DW os pares (chave de negócio, SK) das dimensões ainda não carregadas."""
+        for dim_table in dim_tables or list(self.dimensions):
+            if dim_table in self._loaded:
+                continue
+            business_key, sk_column = self.dimensions[dim_table]
+            with conn_dw.cursor() as cur:
+                # ORDER BY: se a chave de negócio se repetir, vale a maior SK (a mais recente)
+                cur.execute(f"SELECT {business_key}, {sk_column} FROM {dim_table} ORDER BY {sk_column};")
+                rows = cur.fetchall()
+            self.update(dim_table, rows)
+            with self._lock:
+                self._loaded.add(dim_table)
+            print(f"  - Cache de SKs: {len(rows)} chaves carregadas de {dim_table}.")
+
+    def update(self, dim_table, rows):
+        """Acrescenta/atualiza pares (chave de negócio, SK), e.g. as linhas devolvidas por bulk_upsert_dataframe(returning=...)."""
+        with self._lock:
+            mapping = self._maps[dim_table]
+            for business_key, sk in rows:
+                if business_key is not None:
+                    mapping[business_key] = sk
+            self._indexes.pop(dim_table, None)
+
+    def lookup(self, dim_table, keys):
+        """
+        Converte uma Series de chaves de negócio nas SKs correspondentes (Series de int, mesmo índice).
+        Chaves nulas ou ausentes da dimensão vão para o membro desconhecido (-1).
+        """
+        with self._lock:
+            if dim_table not in self._indexes:
+                mapping = self._maps[dim_table]
+                self._indexes[dim_table] = (pd.Index(list(mapping.keys())),
+                                            np.fromiter(mapping.values(), dtype=np.int64, count=len(mapping)))
+            key_index, sks = self._indexes[dim_table]
+
+        positions = key_index.get_indexer(keys)
+        if len(sks) == 0:
+            return pd.Series(UNKNOWN_SK, index=keys.index, dtype=np.int64)
+        return pd.Series(np.where(positions >= 0, sks[positions], UNKNOWN_SK), index=keys.index)
+
+def get_sk_cache(conn_dw, sk_cache=None, dim_tables=None):
+    """Retorna o cache compartilhado da execução (ou um novo, se a etapa rodar isolada) com as dimensões pedidas carregadas."""
+    if sk_cache is None:
+        sk_cache = SurrogateKeyCache()
+    sk_cache.load(conn_dw, dim_tables)
+    return sk_cache
@@ -1,4 +1,5 @@
 # sql_queries.py
+import re
 
 # DDLs para as tabelas de dimensão
 CREATE_DIM_TIME_TABLE = """
@@ -23,6 +24,31 @@ CREATE TABLE IF NOT EXISTS dim_time (
 );
 """
 
+# Modelo alternativo (DIM_TIME_SPLIT = True no config.py): uma linha por dia na dim_date
+# e uma linha por minuto do dia na dim_time_of_day, em vez do produto cartesiano da dim_time
+CREATE_DIM_DATE_TABLE = """
+CREATE TABLE IF NOT EXISTS dim_date (
+    date_sk INT PRIMARY KEY, -- ex: 20190315
+    full_date DATE NOT NULL,
+    day_of_week INT NOT NULL,
+    day_name VARCHAR(20) NOT NULL,
+    day_of_month INT NOT NULL,
+    month INT NOT NULL,
+    month_name VARCHAR(20) NOT NULL,
+    semester INT NOT NULL,
+    year INT NOT NULL
+);
+"""
+
+CREATE_DIM_TIME_OF_DAY_TABLE = """
+CREATE TABLE IF NOT EXISTS dim_time_of_day (
+    hour_sk INT PRIMARY KEY, -- ex: 1435 para 14:35
+    hour_of_day INT NOT NULL,
+    minute_of_hour INT NOT NULL,
+    time_of_day_bucket VARCHAR(50) NOT NULL
+);
+"""
+
 CREATE_DIM_USER_TABLE = """
 CREATE TABLE IF NOT EXISTS dim_user (
     user_sk SERIAL PRIMARY KEY,
@@ -41,12 +67,13 @@ CREATE TABLE IF NOT EXISTS dim_user (
     app_platform VARCHAR(255),
     app_version VARCHAR(255),
     is_banned BOOLEAN NOT NULL,
-    institution_id INT UNIQUE NOT NULL,    
+    institution_id INT,
     institution_name VARCHAR(255),
     institution_color VARCHAR(10),
-    u.created_at TIMESTAMP,
-    u.updated_at TIMESTAMP,
-    u.deleted_at TIMESTAMP
+    created_at TIMESTAMP,
+    updated_at TIMESTAMP,
+    deleted_at TIMESTAMP,
+    row_hash UUID -- md5 das colunas rastreadas: o upsert só reescreve a linha se o hash mudar
 );
 """
 
@@ -56,9 +83,10 @@ CREATE TABLE IF NOT EXISTS dim_neighborhood (
     neighborhood_id INT UNIQUE NOT NULL,
     neighborhood_name VARCHAR(100) NOT NULL,
     distance_to_fundao NUMERIC(10, 2),
-    zone_id INT UNIQUE NOT NULL,
-    zone_name VARCHAR(100) -- Desnormalizado de DimZone
-    zone_color VARCHAR(10) -- Desnormalizado de DimZone
+    zone_id INT,
+    zone_name VARCHAR(100), -- Desnormalizado de DimZone
+    zone_color VARCHAR(10), -- Desnormalizado de DimZone
+    row_hash UUID -- md5 das colunas rastreadas: o upsert só reescreve a linha se o hash mudar
 );
 """
 
@@ -68,15 +96,16 @@ CREATE TABLE IF NOT EXISTS dim_hub (
     hub_id INT UNIQUE NOT NULL,
     hub_name VARCHAR(100) NOT NULL,
     center VARCHAR(100),
-    campus_id INT UNIQUE NOT NULL,
+    campus_id INT,
     campus_name VARCHAR(100) NOT NULL, -- Desnormalizado de DimCampi
     campus_color VARCHAR(10),
     campus_created_at TIMESTAMP,
     campus_updated_at TIMESTAMP,
-    institution_id INT UNIQUE NOT NULL,
+    institution_id INT,
     institution_name VARCHAR(255),
     institution_created_at TIMESTAMP,
-    institution_updated_at TIMESTAMP
+    institution_updated_at TIMESTAMP,
+    row_hash UUID -- md5 das colunas rastreadas: o upsert só reescreve a linha se o hash mudar
 );
 """
 
@@ -105,18 +134,88 @@ CREATE TABLE IF NOT EXISTS dim_flags_carona (
 );
 """
 
-# DDLs para as tabelas de fatos
-CREATE_FACT_CARONA_TABLE = """
+# Tabela de controle do ETL: uma marca d'água por tabela de origem (no OLTP) e tabela de destino (no DW)
+# A mesma origem pode alimentar mais de uma dimensão (ex: institutions -> dim_user e dim_hub),
+# então a marca d'água é guardada por par (destino, origem)
+CREATE_ETL_WATERMARK_TABLE = """
+CREATE TABLE IF NOT EXISTS etl_watermark (
+    target_table VARCHAR(100) NOT NULL,
+    source_table VARCHAR(100) NOT NULL,
+    high_water_mark TIMESTAMP NOT NULL, -- Maior created_at/updated_at/deleted_at já carregado
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (target_table, source_table)
+);
+"""
+
+# Auditoria das execuções do ETL: uma linha por execução (etl_run) e uma por etapa de cada execução (etl_step_run)
+# Não entram nos DROPs da recarga completa: o histórico de execuções é mantido entre recargas
+CREATE_ETL_RUN_TABLE = """
+CREATE TABLE IF NOT EXISTS etl_run (
+    run_id SERIAL PRIMARY KEY,
+    started_at TIMESTAMP NOT NULL,
+    finished_at TIMESTAMP,
+    status VARCHAR(20) NOT NULL, -- executando, ok, falhou
+    mode VARCHAR(20) NOT NULL, -- completa, incremental ou reconstrucao
+    last_run_date TIMESTAMP -- Marca d'água global (last_etl_run.txt) usada pelos fatos
+);
+"""
+
+CREATE_ETL_STEP_RUN_TABLE = """
+CREATE TABLE IF NOT EXISTS etl_step_run (
+    run_id INT NOT NULL REFERENCES etl_run(run_id),
+    step_name VARCHAR(100) NOT NULL,
+    status VARCHAR(20) NOT NULL, -- ok, falhou, pulada
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP,
+    rows_extracted BIGINT,
+    rows_transformed BIGINT,
+    rows_rejected BIGINT, -- Descartadas na transformação
+    rows_loaded BIGINT,
+    bytes_extracted BIGINT, -- Aproximado: memória dos blocos extraídos
+    bytes_loaded BIGINT, -- CSV enviado por COPY ao DW
+    round_trips BIGINT,
+    extract_seconds NUMERIC(12, 3),
+    transform_seconds NUMERIC(12, 3),
+    load_seconds NUMERIC(12, 3),
+    watermark TEXT, -- Marca(s) d'água usada(s) na extração
+    PRIMARY KEY (run_id, step_name)
+);
+"""
+
+# Checkpoints das etapas de cada execução, para retomar uma execução interrompida (etl_main.py --resume)
+# last_key: maior chave de negócio (ride_id, ride_user_id) do último bloco commitado pela etapa
+CREATE_ETL_CHECKPOINT_TABLE = """
+CREATE TABLE IF NOT EXISTS etl_checkpoint (
+    run_id INT NOT NULL REFERENCES etl_run(run_id),
+    step_name VARCHAR(100) NOT NULL,
+    status VARCHAR(20) NOT NULL, -- executando, ok, falhou, pulada
+    last_key BIGINT,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (run_id, step_name)
+);
+"""
+
+# FKs de tempo das tabelas de fatos, de acordo com o modelo de dimensão de tempo escolhido
+# A FK deve referenciar a combinação única (date_sk, hour_sk)
+TIME_FK_DIM_TIME = "FOREIGN KEY (date_sk, hour_sk) REFERENCES dim_time(date_sk, hour_sk)"
+TIME_FK_DIM_DATE_TIME_OF_DAY = """FOREIGN KEY (date_sk) REFERENCES dim_date(date_sk),
+    FOREIGN KEY (hour_sk) REFERENCES dim_time_of_day(hour_sk)"""
+
+# DDLs para as tabelas de fatos ({time_fk} é preenchido com uma das FKs de tempo acima)
+# Os fatos são particionados por faixa de date_sk (semestre ou mês, ver FACT_PARTITION_GRANULARITY no config.py).
+# As partições são criadas pelo ETL conforme chegam datas novas (utils.ensure_date_partitions); date_sk -1
+# (data desconhecida) cai na partição default. Toda chave única de uma tabela particionada inclui a chave de partição
+CREATE_FACT_CARONA_TABLE_TEMPLATE = """
 CREATE TABLE IF NOT EXISTS fato_carona (
-    ride_pk SERIAL PRIMARY KEY, -- Chave primária para o fato
-    ride_id INT UNIQUE NOT NULL, -- Chave de negócio original da carona
+    ride_pk SERIAL, -- Chave primária para o fato (junto com date_sk)
+    ride_id INT NOT NULL, -- Chave de negócio original da carona (única, ver bulk_upsert_dataframe com partition_column)
     driver_user_sk INT NOT NULL,
     neighborhood_sk INT NOT NULL,
     hub_sk INT NOT NULL,
     date_sk INT NOT NULL,
     hour_sk INT NOT NULL,
     flags_carona_sk INT NOT NULL,
-    routine_id INT NOT NULL,
+    routine_id INT,
     slots INT,
     repeats_until TIMESTAMP,
     requests_count INT DEFAULT 0,
@@ -128,20 +227,21 @@ CREATE TABLE IF NOT EXISTS fato_carona (
     created_at TIMESTAMP, -- Para controle do ETL, marca d'água
     updated_at TIMESTAMP, -- Para controle do ETL, marca d'água
     deleted_at TIMESTAMP, -- Para controle do ETL, marca d'água
+    row_hash UUID, -- md5 das colunas rastreadas: o upsert só reescreve a linha se o hash mudar
 
+    PRIMARY KEY (ride_pk, date_sk),
+    UNIQUE (ride_id, date_sk),
     FOREIGN KEY (driver_user_sk) REFERENCES dim_user(user_sk),
-    FOREIGN KEY (zone_sk) REFERENCES dim_zone(zone_sk),
     FOREIGN KEY (neighborhood_sk) REFERENCES dim_neighborhood(neighborhood_sk),
     FOREIGN KEY (hub_sk) REFERENCES dim_hub(hub_sk),
-    -- A FK deve referenciar a combinação única (date_sk, hour_sk)
-    FOREIGN KEY (date_sk, hour_sk) REFERENCES dim_time(date_sk, hour_sk)
-);
+    {time_fk}
+) PARTITION BY RANGE (date_sk);
 """
 
-CREATE_FACT_INTERACAO_CARONA_TABLE = """
+CREATE_FACT_INTERACAO_CARONA_TABLE_TEMPLATE = """
 CREATE TABLE IF NOT EXISTS fato_interacao_carona (
-    interaction_pk SERIAL PRIMARY KEY, -- Chave primária para o fato
-    ride_user_id INT UNIQUE NOT NULL, -- Chave de negócio original da ride_user
+    interaction_pk SERIAL, -- Chave primária para o fato (junto com date_sk)
+    ride_user_id INT NOT NULL, -- Chave de negócio original da ride_user
     ride_id INT NOT NULL, -- ID da carona a que se refere (pode ser FK para fato_carona.ride_id)
     user_sk INT NOT NULL, -- Usuário que fez a interação (motorista ou caronista)
     date_sk INT NOT NULL,
@@ -155,11 +255,54 @@ CREATE TABLE IF NOT EXISTS fato_interacao_carona (
     request_quit BOOLEAN NOT NULL,
     created_at TIMESTAMP, -- Para controle do ETL, marca d'água
     updated_at TIMESTAMP, -- Para controle do ETL, marca d'água
+    row_hash UUID, -- md5 das colunas rastreadas: o upsert só reescreve a linha se o hash mudar
 
+    PRIMARY KEY (interaction_pk, date_sk),
+    UNIQUE (ride_user_id, date_sk),
     FOREIGN KEY (user_sk) REFERENCES dim_user(user_sk),
-    -- A FK deve referenciar a combinação única (date_sk, hour_sk)
-    FOREIGN KEY (date_sk, hour_sk) REFERENCES dim_time(date_sk, hour_sk),
+    {time_fk},
     FOREIGN KEY (status_sk) REFERENCES dim_status_pedido(status_sk)
+) PARTITION BY RANGE (date_sk);
+"""
+
+CREATE_FACT_CARONA_TABLE = CREATE_FACT_CARONA_TABLE_TEMPLATE.format(time_fk=TIME_FK_DIM_TIME)
+CREATE_FACT_INTERACAO_CARONA_TABLE = CREATE_FACT_INTERACAO_CARONA_TABLE_TEMPLATE.format(time_fk=TIME_FK_DIM_TIME)
+CREATE_FACT_CARONA_TABLE_SPLIT = CREATE_FACT_CARONA_TABLE_TEMPLATE.format(time_fk=TIME_FK_DIM_DATE_TIME_OF_DAY)
+CREATE_FACT_INTERACAO_CARONA_TABLE_SPLIT = CREATE_FACT_INTERACAO_CARONA_TABLE_TEMPLATE.format(time_fk=TIME_FK_DIM_DATE_TIME_OF_DAY)
+
+# Fato agregado (dia x hub x bairro) das caronas, mantido a partir da fato_carona (ver fact_carona_diaria_etl.py).
+# Só os dias tocados por cada carga da fato_carona são recalculados. Caronas apagadas (deleted_at) ficam fora das
+# demais métricas e são contadas à parte. Sem FK de date_sk: na dim_time a chave é (date_sk, hour_sk)
+CREATE_FACT_CARONA_DIARIA_TABLE = """
+CREATE TABLE IF NOT EXISTS fato_carona_diaria (
+    date_sk INT NOT NULL,
+    hub_sk INT NOT NULL,
+    neighborhood_sk INT NOT NULL,
+    rides_count INT NOT NULL,
+    done_rides_count INT NOT NULL,
+    deleted_rides_count INT NOT NULL,
+    slots_offered INT NOT NULL,
+    requests_count INT NOT NULL,
+    accepted_requests_count INT NOT NULL,
+    refused_requests_count INT NOT NULL,
+    pending_requests_count INT NOT NULL,
+    quit_requests_count INT NOT NULL,
+    avg_occupancy NUMERIC(6, 3), -- Pessoas por carona (motorista + aceitos), como a ocupação média por dia das análises
+    slots_occupancy_rate NUMERIC(6, 3), -- Aceitos / vagas oferecidas
+
+    PRIMARY KEY (date_sk, hub_sk, neighborhood_sk),
+    FOREIGN KEY (hub_sk) REFERENCES dim_hub(hub_sk),
+    FOREIGN KEY (neighborhood_sk) REFERENCES dim_neighborhood(neighborhood_sk)
+);
+"""
+
+# Tabela de controle dos agregados: dias (date_sk) com dados alterados nos fatos e ainda não recalculados no agregado.
+# Gravada na mesma transação de cada bloco carregado no fato, então nenhum dia se perde se a execução parar no meio
+CREATE_ETL_PENDING_DATE_TABLE = """
+CREATE TABLE IF NOT EXISTS etl_pending_date (
+    target_table VARCHAR(100) NOT NULL, -- Agregado que precisa ser recalculado
+    date_sk INT NOT NULL,
+    PRIMARY KEY (target_table, date_sk)
 );
 """
 
@@ -167,13 +310,19 @@ CREATE TABLE IF NOT EXISTS fato_interacao_carona (
 DROP_FACT_CARONA_TABLE = "DROP TABLE IF EXISTS fato_carona CASCADE;"
 DROP_FACT_INTERACAO_CARONA_TABLE = "DROP TABLE IF EXISTS fato_interacao_carona CASCADE;"
 DROP_DIM_TIME_TABLE = "DROP TABLE IF EXISTS dim_time CASCADE;"
+DROP_DIM_DATE_TABLE = "DROP TABLE IF EXISTS dim_date CASCADE;"
+DROP_DIM_TIME_OF_DAY_TABLE = "DROP TABLE IF EXISTS dim_time_of_day CASCADE;"
 DROP_DIM_USER_TABLE = "DROP TABLE IF EXISTS dim_user CASCADE;"
 DROP_DIM_NEIGHBORHOOD_TABLE = "DROP TABLE IF EXISTS dim_neighborhood CASCADE;"
 DROP_DIM_HUB_TABLE = "DROP TABLE IF EXISTS dim_hub CASCADE;"
 DROP_DIM_STATUS_PEDIDO_TABLE = "DROP TABLE IF EXISTS dim_status_pedido CASCADE;"
 DROP_DIM_FLAGS_CARONA_TABLE = "DROP TABLE IF EXISTS dim_flags_carona CASCADE;"
+DROP_ETL_WATERMARK_TABLE = "DROP TABLE IF EXISTS etl_watermark CASCADE;"
+DROP_FACT_CARONA_DIARIA_TABLE = "DROP TABLE IF EXISTS fato_carona_diaria CASCADE;"
+DROP_ETL_PENDING_DATE_TABLE = "DROP TABLE IF EXISTS etl_pending_date CASCADE;"
 
 ALL_DDL_DROP_QUERIES = [
+    DROP_FACT_CARONA_DIARIA_TABLE,
     DROP_FACT_CARONA_TABLE,
     DROP_FACT_INTERACAO_CARONA_TABLE,
     DROP_DIM_TIME_TABLE,
@@ -181,7 +330,9 @@ ALL_DDL_DROP_QUERIES = [
     DROP_DIM_NEIGHBORHOOD_TABLE,
     DROP_DIM_HUB_TABLE,
     DROP_DIM_STATUS_PEDIDO_TABLE,
-    DROP_DIM_FLAGS_CARONA_TABLE
+    DROP_DIM_FLAGS_CARONA_TABLE,
+    DROP_ETL_WATERMARK_TABLE, # Recarga completa: as marcas d'água voltam do zero junto com as tabelas
+    DROP_ETL_PENDING_DATE_TABLE
 ]
 
 ALL_DDL_CREATE_QUERIES = [
@@ -192,19 +343,94 @@ ALL_DDL_CREATE_QUERIES = [
     CREATE_DIM_STATUS_PEDIDO_TABLE,
     CREATE_DIM_FLAGS_CARONA_TABLE,
     CREATE_FACT_CARONA_TABLE,
-    CREATE_FACT_INTERACAO_CARONA_TABLE
+    CREATE_FACT_INTERACAO_CARONA_TABLE,
+    CREATE_FACT_CARONA_DIARIA_TABLE,
+    CREATE_ETL_WATERMARK_TABLE,
+    CREATE_ETL_PENDING_DATE_TABLE,
+    CREATE_ETL_RUN_TABLE,
+    CREATE_ETL_STEP_RUN_TABLE,
+    CREATE_ETL_CHECKPOINT_TABLE
+]
+
+# Migrações aplicadas no modo incremental (ensure schema) sobre tabelas que já existem no DW.
+# Devem ser idempotentes (ADD COLUMN IF NOT EXISTS, CREATE INDEX IF NOT EXISTS, ...), pois rodam a cada execução.
+# Toda coluna nova adicionada a uma DDL acima precisa de uma entrada aqui para chegar aos DWs já existentes
+SCHEMA_MIGRATIONS = [
+    # Detecção de mudanças por hash de linha (bulk_upsert_dataframe com row_hash_column)
+    "ALTER TABLE dim_user ADD COLUMN IF NOT EXISTS row_hash UUID;",
+    "ALTER TABLE dim_neighborhood ADD COLUMN IF NOT EXISTS row_hash UUID;",
+    "ALTER TABLE dim_hub ADD COLUMN IF NOT EXISTS row_hash UUID;",
+    "ALTER TABLE fato_carona ADD COLUMN IF NOT EXISTS row_hash UUID;",
+    "ALTER TABLE fato_interacao_carona ADD COLUMN IF NOT EXISTS row_hash UUID;",
+    # Fatos particionados: o upsert usa (chave de negócio, date_sk) no ON CONFLICT. Em DWs criados antes do
+    # particionamento (tabelas comuns, que só viram particionadas numa carga completa) esse índice dá suporte ao
+    # mesmo ON CONFLICT; nas tabelas novas ele já existe (constraint UNIQUE de mesmo nome) e nada é feito
+    "CREATE UNIQUE INDEX IF NOT EXISTS fato_carona_ride_id_date_sk_key ON fato_carona (ride_id, date_sk);",
+    "CREATE UNIQUE INDEX IF NOT EXISTS fato_interacao_carona_ride_user_id_date_sk_key ON fato_interacao_carona (ride_user_id, date_sk);"
 ]
 
+def get_table_name(create_query):
+    """Extrai o nome da tabela de uma query CREATE TABLE."""
+    match = re.search(r"CREATE\s+(?:UNLOGGED\s+)?TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)", create_query, re.IGNORECASE)
+    return match.group(1) if match else None
+
+# Tabelas de controle das execuções do ETL: ficam sempre no esquema do DW (não entram na reconstrução em esquema sombra)
+ETL_CONTROL_TABLES = ('etl_run', 'etl_step_run', 'etl_checkpoint')
+
+def split_deferred_constraints(create_query):
+    """
+    Prepara uma DDL para a reconstrução em esquema sombra (etl_main.py --rebuild): tira as constraints criadas
+    só depois da carga (as FKs e, nos fatos particionados, a chave primária surrogate) e torna a tabela UNLOGGED.
+    As chaves únicas usadas pelo ON CONFLICT das cargas (e referenciadas pelas FKs) continuam na DDL.
+    Tabelas particionadas não podem ser UNLOGGED: as partições delas é que são (utils.ensure_date_partitions).
+    Retorna (DDL ajustada, lista das constraints adiadas).
+    """
+    partitioned = 'PARTITION BY' in create_query
+    kept_lines = []
+    deferred_constraints = []
+    for line in create_query.splitlines():
+        clause = line.strip().rstrip(',')
+        if clause.startswith('FOREIGN KEY') or (partitioned and clause.startswith('PRIMARY KEY (')):
+            deferred_constraints.append(clause)
+        else:
+            kept_lines.append(line)
+    # Remove a vírgula que sobra antes do fechamento da tabela
+    ddl = re.sub(r",(\s*\n\))", r"\1", '\n'.join(kept_lines))
+    if not partitioned:
+        ddl = re.sub(r"CREATE\s+TABLE", "CREATE UNLOGGED TABLE", ddl, count=1)
+    return ddl, deferred_constraints
+
 # Retorna as queries de DDL corretamente
-def get_queries(recria_dim_time, recria_dim_flags_carona):
-    # Se não quisermos recriar a tabela dim_time, não a dropamos nem a criamos
+def get_queries(recria_dim_time, recria_dim_flags_carona, split_dim_time=False):
+    # Monta listas novas a cada chamada (sem alterar as listas globais acima)
+    drop_queries = list(ALL_DDL_DROP_QUERIES)
+    create_queries = list(ALL_DDL_CREATE_QUERIES)
+
+    # No modelo dividido, a dim_time dá lugar à dim_date + dim_time_of_day e as FKs dos fatos mudam
+    if split_dim_time:
+        time_drop_queries = [DROP_DIM_DATE_TABLE, DROP_DIM_TIME_OF_DAY_TABLE]
+        time_create_queries = [CREATE_DIM_DATE_TABLE, CREATE_DIM_TIME_OF_DAY_TABLE]
+        create_queries[create_queries.index(CREATE_FACT_CARONA_TABLE)] = CREATE_FACT_CARONA_TABLE_SPLIT
+        create_queries[create_queries.index(CREATE_FACT_INTERACAO_CARONA_TABLE)] = CREATE_FACT_INTERACAO_CARONA_TABLE_SPLIT
+    else:
+        time_drop_queries = [DROP_DIM_TIME_TABLE]
+        time_create_queries = [CREATE_DIM_TIME_TABLE]
+
+    drop_index = drop_queries.index(DROP_DIM_TIME_TABLE)
+    drop_queries[drop_index:drop_index + 1] = time_drop_queries
+    create_index = create_queries.index(CREATE_DIM_TIME_TABLE)
+    create_queries[create_index:create_index + 1] = time_create_queries
+
+    # Se não quisermos recriar as tabelas de tempo, não as dropamos nem as criamos
     if not recria_dim_time:
-        ALL_DDL_DROP_QUERIES.remove(DROP_DIM_TIME_TABLE)
-        ALL_DDL_CREATE_QUERIES.remove(CREATE_DIM_TIME_TABLE)
+        for query in time_drop_queries:
+            drop_queries.remove(query)
+        for query in time_create_queries:
+            create_queries.remove(query)
     
     # Se não quisermos recriar a tabela dim_flags_carona, não a dropamos nem a criamos
     if not recria_dim_flags_carona:
-        ALL_DDL_DROP_QUERIES.remove(DROP_DIM_FLAGS_CARONA_TABLE)
-        ALL_DDL_CREATE_QUERIES.remove(CREATE_DIM_FLAGS_CARONA_TABLE)
+        drop_queries.remove(DROP_DIM_FLAGS_CARONA_TABLE)
+        create_queries.remove(CREATE_DIM_FLAGS_CARONA_TABLE)
     
-    return ALL_DDL_DROP_QUERIES, ALL_DDL_CREATE_QUERIES
\ No newline at end of file
+    return drop_queries, create_queries
@@ -0,0 +1,6 @@
+# testes/conftest.py
+import os
+import sys
+
+# Os módulos do ETL ficam na raiz do projeto (mesmo esquema do etl_main.py)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
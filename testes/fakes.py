@@ -0,0 +1,53 @@
+# testes/fakes.py
+# Conexão e cursor falsos que gravam o SQL executado, para testar o ETL sem um Postgres
+
+class RecordingCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.rowcount = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        self.connection.executed.append((query, params))
+        self.rowcount = 0
+
+    def copy_expert(self, sql, file, size=8192):
+        self.connection.executed.append((sql, None))
+        self.connection.copied.append(file.getvalue())
+
+    def fetchone(self):
+        return self.connection.results.pop(0) if self.connection.results else None
+
+    def fetchall(self):
+        return self.connection.results.pop(0) if self.connection.results else []
+
+class RecordingConnection:
+    """results: respostas devolvidas, em ordem, pelos fetchone/fetchall."""
+
+    def __init__(self, results=None):
+        self.executed = []
+        self.copied = []
+        self.results = list(results or [])
+        self.commits = 0
+        self.rollbacks = 0
+        self.closed = 0
+
+    def cursor(self, name=None):
+        return RecordingCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = 1
+
+    def queries(self):
+        return [query for query, _ in self.executed]
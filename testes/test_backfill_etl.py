@@ -0,0 +1,21 @@
+# testes/test_backfill_etl.py
+from datetime import datetime
+from backfill_etl import gerar_fatias
+
+def test_gerar_fatias_follows_partitions_and_cuts_the_ends():
+    fatias = gerar_fatias(datetime(2019, 3, 10), datetime(2020, 2, 1), 'semestre')
+    assert fatias == [
+        ('2019_s1', datetime(2019, 3, 10), datetime(2019, 7, 1)),
+        ('2019_s2', datetime(2019, 7, 1), datetime(2020, 1, 1)),
+        ('2020_s1', datetime(2020, 1, 1), datetime(2020, 2, 1))
+    ]
+
+def test_gerar_fatias_monthly_covers_the_period_without_gaps():
+    inicio, fim = datetime(2018, 11, 15), datetime(2019, 2, 15)
+    fatias = gerar_fatias(inicio, fim, 'mes')
+    assert [sufixo for sufixo, _, _ in fatias] == ['2018_11', '2018_12', '2019_01', '2019_02']
+    assert fatias[0][1] == inicio and fatias[-1][2] == fim
+    assert all(anterior[2] == seguinte[1] for anterior, seguinte in zip(fatias, fatias[1:]))
+
+def test_gerar_fatias_empty_period():
+    assert gerar_fatias(datetime(2019, 1, 1), datetime(2019, 1, 1)) == []
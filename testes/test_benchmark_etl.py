@@ -0,0 +1,8 @@
+# testes/test_benchmark_etl.py
+from benchmark_etl import nomes_das_etapas
+
+def test_standalone_steps_cover_every_etl_step_in_dependency_order():
+    etapas = nomes_das_etapas()
+    assert {'dim_user', 'dim_neighborhood', 'dim_hub', 'dim_status_pedido', 'dim_flags_carona',
+            'fato_carona', 'fato_interacao_carona', 'fato_carona_diaria'} <= set(etapas)
+    assert etapas.index('dim_user') < etapas.index('fato_carona') < etapas.index('fato_carona_diaria')
@@ -0,0 +1,95 @@
+# testes/test_bulk_upsert.py
+import os
+import re
+import pandas as pd
+from utils import bulk_upsert_dataframe, dedupe_business_keys, new_upsert_stats
+from fakes import RecordingConnection
+
+STAGING = f"stg_dim_user_{os.getpid()}"
+
+def _normalize(query):
+    return re.sub(r'\s+', ' ', query).strip()
+
+def _merge_query(conn):
+    return next(_normalize(query) for query in conn.queries() if query.lstrip().startswith('INSERT INTO'))
+
+def _users():
+    return pd.DataFrame({'user_id': [1, 2], 'name': ['Ana', 'Bia'], 'course': ['ECI', 'EQ']})
+
+def test_staging_copy_and_update_merge():
+    conn = RecordingConnection()
+    assert bulk_upsert_dataframe(conn, _users(), 'dim_user', ['user_id']) == 2
+    queries = [_normalize(query) for query in conn.queries()]
+    assert queries[0] == (f"DROP TABLE IF EXISTS {STAGING}; CREATE UNLOGGED TABLE {STAGING} AS "
+                          "SELECT user_id, name, course FROM dim_user WITH NO DATA;")
+    assert queries[1] == f"COPY {STAGING} (user_id, name, course) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+    assert _merge_query(conn) == (f"INSERT INTO dim_user (user_id, name, course) SELECT user_id, name, course FROM {STAGING} "
+                                  "ON CONFLICT (user_id) DO UPDATE SET name = EXCLUDED.name, course = EXCLUDED.course;")
+    assert queries[-1] == f"DROP TABLE IF EXISTS {STAGING};"
+    assert conn.copied == ['1,Ana,ECI\n2,Bia,EQ\n']
+    assert conn.commits == 0 # Quem chama decide quando commitar
+
+def test_empty_update_columns_uses_do_nothing_and_returning():
+    conn = RecordingConnection(results=[[(1, 10)]])
+    returned = bulk_upsert_dataframe(conn, _users(), 'dim_user', ['user_id'], update_columns=[], returning=['user_id', 'user_sk'])
+    assert _merge_query(conn).endswith("ON CONFLICT (user_id) DO NOTHING RETURNING user_id, user_sk;")
+    assert returned == [(1, 10)]
+
+def test_row_hash_skips_unchanged_rows_and_counts_stats():
+    # RETURNING (xmax = 0): uma linha inserida e uma atualizada; a terceira não mudou
+    conn = RecordingConnection(results=[[(1, True), (2, False)]])
+    stats = new_upsert_stats()
+    users = pd.concat([_users(), pd.DataFrame({'user_id': [3], 'name': ['Caio'], 'course': ['EM']})], ignore_index=True)
+    returned = bulk_upsert_dataframe(conn, users, 'dim_user', ['user_id'], update_columns=['name', 'course'],
+                                     returning=['user_id'], row_hash_column='row_hash', stats=stats)
+    assert _merge_query(conn) == (
+        f"INSERT INTO dim_user (user_id, name, course, row_hash) "
+        f"SELECT user_id, name, course, md5(ROW(name, course)::text)::uuid FROM {STAGING} "
+        "ON CONFLICT (user_id) DO UPDATE SET name = EXCLUDED.name, course = EXCLUDED.course, row_hash = EXCLUDED.row_hash "
+        "WHERE dim_user.row_hash IS DISTINCT FROM EXCLUDED.row_hash RETURNING user_id, (xmax = 0);")
+    assert returned == [(1,), (2,)]
+    assert stats == {'inserted': 1, 'updated': 1, 'unchanged': 1}
+
+def test_partition_column_moves_rows_and_collects_touched_partitions():
+    rides = pd.DataFrame({'ride_id': [7, 8], 'date_sk': [20190316, 20190401], 'slots': [3, 2]})
+    # O DELETE devolve a partição antiga da carona 7 (estava em 15/03)
+    conn = RecordingConnection(results=[[(20190315,)]])
+    touched = set()
+    bulk_upsert_dataframe(conn, rides, 'fato_carona', ['ride_id'], partition_column='date_sk', touched_partitions=touched)
+    staging = f"stg_fato_carona_{os.getpid()}"
+    delete_query = next(_normalize(query) for query in conn.queries() if query.lstrip().startswith('DELETE'))
+    assert delete_query == (f"DELETE FROM fato_carona t USING {staging} s "
+                            "WHERE t.ride_id = s.ride_id AND t.date_sk IS DISTINCT FROM s.date_sk RETURNING t.date_sk;")
+    assert "ON CONFLICT (ride_id, date_sk) DO UPDATE SET date_sk = EXCLUDED.date_sk, slots = EXCLUDED.slots;" in _merge_query(conn)
+    assert touched == {20190315, 20190316, 20190401}
+
+def test_duplicated_business_key_keeps_the_latest_version():
+    users = pd.DataFrame({
+        'user_id': [1, 2, 1],
+        'name': ['Ana nova', 'Bia', 'Ana antiga'],
+        'updated_at': pd.to_datetime(['2019-03-02', '2019-03-01', '2019-03-01'])
+    })
+    conn = RecordingConnection()
+    assert bulk_upsert_dataframe(conn, users, 'dim_user', ['user_id']) == 2
+    assert conn.copied == ['2,Bia,2019-03-01\n1,Ana nova,2019-03-02\n']
+
+def test_dedupe_without_order_column_keeps_last_occurrence():
+    df = pd.DataFrame({'status_name': ['accepted', 'pending', 'accepted'], 'ordem': [1, 2, 3]})
+    assert dedupe_business_keys(df, ['status_name'])['ordem'].tolist() == [2, 3]
+    unique = df.drop_duplicates(subset=['status_name'])
+    assert dedupe_business_keys(unique, ['status_name']) is unique
+
+def test_ride_whose_date_changed_goes_only_to_the_latest_partition():
+    # A mesma carona extraída duas vezes: remarcada de 15/03 para 20/03
+    rides = pd.DataFrame({
+        'ride_id': [7, 7],
+        'date_sk': [20190320, 20190315],
+        'updated_at': pd.to_datetime(['2019-03-10 12:00', '2019-03-01 08:00'])
+    })
+    conn = RecordingConnection(results=[[(20190315,)]])
+    touched = set()
+    bulk_upsert_dataframe(conn, rides, 'fato_carona', ['ride_id'], update_columns=['updated_at'],
+                          partition_column='date_sk', touched_partitions=touched)
+    # Só a versão remarcada chega à staging usada pelo DELETE e pelo merge
+    assert conn.copied == ['7,20190320,2019-03-10 12:00:00\n']
+    assert touched == {20190315, 20190320}
@@ -0,0 +1,70 @@
+# testes/test_csvs_pra_postgres.py
+import csv
+import io
+import pandas as pd
+import psycopg2
+import pytest
+
+pytest.importorskip('chardet') # Dependência só do importador de CSVs
+from csvs_pra_postgres import _valores_invalidos, inferir_tipos, _copiar_bloco
+
+def test_valores_invalidos_por_tipo():
+    valores = pd.Series(['12', ' -3 ', '1.5', 'abc', None])
+    assert _valores_invalidos(valores, 'inteiro').tolist() == [False, False, True, True, False]
+    assert _valores_invalidos(valores, 'decimal').tolist() == [False, False, False, True, False]
+    assert _valores_invalidos(pd.Series(['True', 'f', 'sim', None]), 'booleano').tolist() == [False, False, True, False]
+    assert _valores_invalidos(pd.Series(['2019-03-15 14:35:00', 'ontem']), 'timestamp').tolist() == [False, True]
+    assert not _valores_invalidos(valores, 'texto').any()
+
+def test_inferir_tipos_da_amostra(tmp_path):
+    arquivo = tmp_path / 'rides.csv'
+    arquivo.write_text(
+        "id|slots|preco|done|date|hub|vazia\n"
+        "1|3|10.5|true|2019-03-15 14:35:00|Fundão|\n"
+        "2|NULL|7|f|2019-03-16 08:00:00|Praia Vermelha|NULL\n", encoding='utf-8')
+    assert inferir_tipos(str(arquivo), 'utf-8') == {
+        'id': 'inteiro', 'slots': 'inteiro', 'preco': 'decimal', 'done': 'booleano',
+        'date': 'timestamp', 'hub': 'texto', 'vazia': 'texto'
+    }
+
+class CursorQueRecusa:
+    """Cursor falso: o COPY falha (como o PostgreSQL) se o bloco tiver um valor em recusados."""
+
+    def __init__(self, recusados):
+        self.recusados = recusados
+        self.carregado = []
+        self.comandos = []
+
+    def execute(self, query):
+        self.comandos.append(query)
+
+    def copy_expert(self, sql, buffer):
+        linhas = buffer.getvalue().splitlines()
+        if any(valor in linha for linha in linhas for valor in self.recusados):
+            raise psycopg2.DataError('invalid input syntax for type timestamp\nCONTEXT: COPY rides')
+        self.carregado.extend(linhas)
+
+def _rejeitados():
+    saida = io.StringIO()
+    return saida, csv.writer(saida, delimiter='|')
+
+def test_copiar_bloco_rejeita_valores_invalidos_com_motivo():
+    linhas = [(2, ['1', '3']), (3, ['2', 'muitas']), (4, ['3', ''])]
+    saida, rejeitados = _rejeitados()
+    cur = CursorQueRecusa(recusados=[])
+    carregadas = _copiar_bloco(cur, 'rides', ['id', 'slots'], {'id': 'inteiro', 'slots': 'inteiro'}, linhas, rejeitados)
+    assert carregadas == 2
+    assert cur.carregado == ['1,3', '3,\\N']
+    assert saida.getvalue().splitlines() == ['3|valor inválido para slots (inteiro)|2|muitas']
+
+def test_copiar_bloco_isola_por_bisseccao_as_linhas_recusadas_pelo_banco():
+    # A linha 5 passa na validação do pandas, mas o "banco" a recusa no COPY
+    linhas = [(numero, [str(numero), f'2019-03-{numero:02d}']) for numero in range(2, 8)]
+    saida, rejeitados = _rejeitados()
+    cur = CursorQueRecusa(recusados=['2019-03-05'])
+    carregadas = _copiar_bloco(cur, 'rides', ['id', 'date'], {'id': 'inteiro', 'date': 'texto'}, linhas, rejeitados)
+    assert carregadas == 5
+    assert sorted(cur.carregado) == [f'{numero},2019-03-{numero:02d}' for numero in (2, 3, 4, 6, 7)]
+    assert saida.getvalue().splitlines() == ['5|recusada pelo PostgreSQL: invalid input syntax for type timestamp|5|2019-03-05']
+    # Cada tentativa recusada é desfeita só até o savepoint do bloco
+    assert cur.comandos.count('ROLLBACK TO SAVEPOINT bloco_copy;') == 3
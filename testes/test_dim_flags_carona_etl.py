@@ -0,0 +1,38 @@
+# testes/test_dim_flags_carona_etl.py
+import numpy as np
+import pandas as pd
+from dim_scripts.dim_flags_carona_etl import (FLAG_BITS, FLAG_NAMES_ORDER, encode_flags, week_days_to_mask,
+                                              resolve_flags_carona_sks)
+
+def test_week_days_to_mask():
+    week_days = pd.Series(['1,3,5', '7', None, '', '12', '0,8'])
+    mask = week_days_to_mask(week_days)
+    expected_first = FLAG_BITS['is_routine_monday'] | FLAG_BITS['is_routine_wednesday'] | FLAG_BITS['is_routine_friday']
+    # '12' não é segunda nem terça; dias fora de 1 a 7 são ignorados
+    assert mask.tolist() == [expected_first, FLAG_BITS['is_routine_sunday'], 0, 0, 0, 0]
+
+def test_encode_flags_uses_one_bit_per_flag():
+    flags = pd.DataFrame([[False] * len(FLAG_NAMES_ORDER), [True] * len(FLAG_NAMES_ORDER)], columns=FLAG_NAMES_ORDER)
+    flags.loc[2] = [name == 'done' for name in FLAG_NAMES_ORDER]
+    assert encode_flags(flags).tolist() == [0, 2 ** len(FLAG_NAMES_ORDER) - 1, FLAG_BITS['done']]
+
+def test_encode_flags_treats_null_as_false():
+    flags = pd.DataFrame({'is_routine_ride': [None, True], 'done': [True, None]}, dtype=object)
+    codes = encode_flags(flags, ['is_routine_ride', 'done'])
+    assert codes.tolist() == [FLAG_BITS['done'], FLAG_BITS['is_routine_ride']]
+
+def test_resolve_flags_carona_sks_ignores_week_days_of_non_routine_rides():
+    lookup = np.full(2 ** len(FLAG_NAMES_ORDER), -1, dtype=np.int64)
+    routine_monday = FLAG_BITS['is_routine_ride'] | FLAG_BITS['is_routine_monday']
+    lookup[0] = 10
+    lookup[routine_monday] = 20
+    rides = pd.DataFrame({
+        'is_routine_ride': [False, True, True],
+        'is_going_to_campus': [False, False, False],
+        'done': [False, False, True],
+        'week_days': ['1', '1', '1']
+    }, index=[3, 4, 5])
+    sks = resolve_flags_carona_sks(rides, lookup)
+    # A terceira combinação (rotina concluída) não está no lookup: membro desconhecido
+    assert sks.tolist() == [10, 20, -1]
+    assert sks.index.tolist() == [3, 4, 5]
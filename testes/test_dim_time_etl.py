@@ -0,0 +1,38 @@
+# testes/test_dim_time_etl.py
+import pandas as pd
+from dim_scripts.dim_time_etl import MINUTES_PER_DAY, generate_dim_time_chunks, missing_date_ranges
+
+def test_chunks_split_days_and_repeat_every_minute():
+    chunks = list(generate_dim_time_chunks('2019-01-30', '2019-02-03', chunk_days=2))
+    assert [len(chunk) for chunk in chunks] == [2 * MINUTES_PER_DAY, 2 * MINUTES_PER_DAY, MINUTES_PER_DAY]
+    assert chunks[0]['date_sk'].iloc[0] == 20190130
+    assert chunks[0]['date_sk'].iloc[-1] == 20190131
+    assert chunks[1]['date_sk'].unique().tolist() == [20190201, 20190202]
+    assert chunks[2]['date_sk'].unique().tolist() == [20190203]
+
+def test_leap_day_and_sk_formats():
+    chunk = next(generate_dim_time_chunks('2020-02-28', '2020-03-01', chunk_days=31))
+    assert chunk['date_sk'].unique().tolist() == [20200228, 20200229, 20200301]
+    leap_day = chunk[chunk['date_sk'] == 20200229]
+    assert leap_day['full_date'].iloc[0] == pd.Timestamp('2020-02-29').date()
+    assert leap_day['day_name'].iloc[0] == 'Saturday' and leap_day['day_of_week'].iloc[0] == 6
+    # hour_sk = HHMM: 00:00 a 23:59
+    assert leap_day['hour_sk'].iloc[0] == 0
+    assert leap_day['hour_sk'].iloc[14 * 60 + 35] == 1435
+    assert leap_day['hour_sk'].iloc[-1] == 2359
+    assert leap_day['time_of_day_bucket'].iloc[[0, 6 * 60, 12 * 60, 18 * 60]].tolist() == ['Madrugada', 'Manhã', 'Tarde', 'Noite']
+
+def test_semester_values():
+    chunk = next(generate_dim_time_chunks('2019-06-30', '2019-07-01'))
+    days = chunk.drop_duplicates('date_sk').set_index('date_sk')
+    assert days.loc[20190630, 'semester'] == 1
+    assert days.loc[20190701, 'semester'] == 2
+
+def test_missing_date_ranges_backfills_an_earlier_start():
+    ranges = missing_date_ranges('2016-01-01', '2025-12-31', pd.Timestamp('2016-04-01').date(), pd.Timestamp('2024-12-31').date())
+    assert ranges == [(pd.Timestamp('2016-01-01'), pd.Timestamp('2016-03-31')),
+                      (pd.Timestamp('2025-01-01'), pd.Timestamp('2025-12-31'))]
+
+def test_missing_date_ranges_empty_or_complete_table():
+    assert missing_date_ranges('2016-04-01', '2016-04-30', None, None) == [(pd.Timestamp('2016-04-01'), pd.Timestamp('2016-04-30'))]
+    assert missing_date_ranges('2016-04-01', '2016-04-30', pd.Timestamp('2016-04-01'), pd.Timestamp('2016-04-30')) == []
@@ -0,0 +1,48 @@
+# testes/test_dim_user_etl.py
+import pandas as pd
+from dim_scripts.dim_user_etl import transform_users_chunk, CATEGORICAL_COLUMNS, CAR_COLUMNS
+from utils import dataframe_para_csv
+
+def _users():
+    users = pd.DataFrame({
+        'user_id': [1, 2, 3],
+        'user_name': ['Ana', 'Bia', 'Caio'],
+        'has_car': [True, False, None],
+        'is_banned': [False, None, True],
+        'car_model': ['Gol', 'Uno', ''],
+        'car_color': ['Prata', 'Azul', ''],
+        'car_plate': ['ABC1234', 'XYZ9876', '']
+    })
+    for col in CATEGORICAL_COLUMNS:
+        users[col] = ['ECI', '', None]
+    return users
+
+def test_transform_converts_text_columns_to_category_without_empty_string():
+    users = transform_users_chunk(_users())
+    for col in CATEGORICAL_COLUMNS:
+        assert isinstance(users[col].dtype, pd.CategoricalDtype)
+        assert users[col].cat.categories.tolist() == ['ECI']
+        assert users[col].isna().tolist() == [False, True, True]
+    assert str(users['has_car'].dtype) == 'boolean'
+    # Usuários sem carro (ou sem a informação) não guardam dados de carro
+    assert users.loc[1, CAR_COLUMNS].isna().all()
+    assert users.loc[2, CAR_COLUMNS].isna().all()
+    assert users.loc[0, 'car_model'] == 'Gol'
+
+def test_transformed_empty_strings_become_null_in_the_copy_csv():
+    users = transform_users_chunk(_users())[['user_id', 'course', 'has_car', 'car_model']]
+    assert dataframe_para_csv(users).getvalue().splitlines() == ['1,ECI,True,Gol', '2,\\N,False,\\N', '3,\\N,\\N,\\N']
+
+def test_dataframe_para_csv_handles_nullable_types():
+    df = pd.DataFrame({
+        'category': pd.Series(['a', '', None], dtype='category'),
+        'int64': pd.array([1, None, 3], dtype='Int64'),
+        'boolean': pd.array([True, None, False], dtype='boolean'),
+        'float_int': [5.0, None, 7.0], # Coluna INT que virou float por causa do NaN
+        'text': ['x', '', None]
+    })
+    assert dataframe_para_csv(df).getvalue().splitlines() == [
+        'a,1,True,5,x',
+        '\\N,\\N,\\N,\\N,\\N',
+        '\\N,3,False,7,\\N'
+    ]
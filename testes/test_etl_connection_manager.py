@@ -0,0 +1,51 @@
+# testes/test_etl_connection_manager.py
+import utils
+from fakes import RecordingConnection
+
+class FakePool:
+    """Pool falso: entrega a conexão livre mais antiga ou cria uma nova; close=True descarta a conexão."""
+
+    def __init__(self, minconn, maxconn, **kwargs):
+        self.free = []
+        self.created = []
+
+    def getconn(self):
+        if self.free:
+            return self.free.pop(0)
+        conn = RecordingConnection()
+        self.created.append(conn)
+        return conn
+
+    def putconn(self, conn, close=False):
+        if close:
+            conn.closed = 1
+        else:
+            self.free.append(conn)
+
+    def closeall(self):
+        self.free = []
+
+def _manager(monkeypatch):
+    monkeypatch.setattr(utils.pool, 'ThreadedConnectionPool', FakePool)
+    return utils.ETLConnectionManager(oltp_config={'database': 'oltp'}, dw_config={'database': 'dw'},
+                                      dw_session_settings={'search_path': 'dw_sombra, public'})
+
+def _set_configs(conn):
+    return [params for query, params in conn.executed if 'set_config' in query]
+
+def test_dw_session_settings_are_applied_once_per_connection(monkeypatch):
+    manager = _manager(monkeypatch)
+    conn = manager.get_dw()
+    manager.put_dw(conn)
+    assert manager.get_dw() is conn
+    assert _set_configs(conn) == [('search_path', 'dw_sombra, public')]
+
+def test_connection_replacing_a_closed_one_gets_the_settings(monkeypatch):
+    manager = _manager(monkeypatch)
+    first = manager.get_dw()
+    first.closed = 1 # Conexão caiu: _put a descarta do pool
+    manager.put_dw(first)
+
+    second = manager.get_dw()
+    assert second is not first
+    assert _set_configs(second) == [('search_path', 'dw_sombra, public')]
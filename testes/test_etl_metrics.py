@@ -0,0 +1,46 @@
+# testes/test_etl_metrics.py
+from etl_metrics import track_phase, get_metrics, reset_metrics, current_rss_kb
+
+def _phase(step, phase):
+    return next(metrics for metrics in get_metrics() if metrics['step'] == step and metrics['phase'] == phase)
+
+def test_track_phase_accumulates_calls_and_rows():
+    reset_metrics()
+    for rows in (10, 5):
+        with track_phase('dim_user', 'load') as tracked:
+            tracked.rows += rows
+    metrics = _phase('dim_user', 'load')
+    assert metrics['calls'] == 2
+    assert metrics['rows'] == 15
+
+def test_rss_growth_measures_the_phase_not_the_process_history():
+    reset_metrics()
+    with track_phase('grande', 'transform'):
+        block = bytearray(64 * 1024 * 1024)
+        block[::4096] = b'x' * len(block[::4096]) # Toca as páginas para entrarem no RSS
+    del block
+    with track_phase('pequena', 'transform'):
+        bytearray(1024)
+    assert _phase('grande', 'transform')['rss_growth_kb'] >= 32 * 1024
+    # O pico deixado pela fase anterior não entra na medição da seguinte
+    assert _phase('pequena', 'transform')['rss_growth_kb'] < 16 * 1024
+    assert current_rss_kb() > 0
+
+def test_track_phase_without_resource_module_records_no_memory(monkeypatch):
+    # Simula o Windows sem psutil: importar resource (e psutil) falha
+    import importlib.util
+    import sys
+    monkeypatch.setitem(sys.modules, 'resource', None)
+    monkeypatch.setitem(sys.modules, 'psutil', None)
+    spec = importlib.util.spec_from_file_location('etl_metrics_sem_resource', sys.modules['etl_metrics'].__file__)
+    metrics_module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(metrics_module)
+
+    assert metrics_module.resource is None
+    assert metrics_module.current_rss_kb() is None
+    assert metrics_module.peak_rss_kb() is None
+    with metrics_module.track_phase('dim_user', 'load') as tracked:
+        tracked.rows += 3
+    metrics = next(m for m in metrics_module.get_metrics() if m['step'] == 'dim_user')
+    assert metrics['rows'] == 3
+    assert metrics['rss_growth_kb'] is None
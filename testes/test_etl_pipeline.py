@@ -0,0 +1,52 @@
+# testes/test_etl_pipeline.py
+import threading
+import pytest
+from etl_pipeline import run_etl_pipeline, set_sequential
+
+@pytest.fixture(params=[False, True], ids=['paralelo', 'sequencial'])
+def sequential(request):
+    set_sequential(request.param)
+    yield request.param
+    set_sequential(False)
+
+def test_chunks_are_loaded_in_order(sequential):
+    loaded = []
+    count = run_etl_pipeline(iter(range(10)), lambda chunk: chunk * 2, loaded.append, queue_size=1)
+    assert count == 10
+    assert loaded == [chunk * 2 for chunk in range(10)]
+
+def test_load_runs_in_caller_thread(sequential):
+    load_threads = set()
+    run_etl_pipeline(iter(range(3)), lambda chunk: chunk, lambda _: load_threads.add(threading.get_ident()))
+    assert load_threads == {threading.get_ident()}
+
+def test_transform_error_is_reraised_and_extraction_closed(sequential):
+    closed = []
+
+    def chunks():
+        try:
+            for chunk in range(100):
+                yield chunk
+        finally:
+            closed.append(True)
+
+    def transform(chunk):
+        if chunk == 3:
+            raise ValueError("bloco inválido")
+        return chunk
+
+    with pytest.raises(ValueError):
+        run_etl_pipeline(chunks(), transform, lambda _: None, queue_size=1)
+    # O gerador (cursor do lado do servidor, no ETL) é fechado mesmo com o pipeline parando no meio
+    assert closed == [True]
+
+def test_load_error_stops_the_other_stages():
+    def load(chunk):
+        if chunk == 2:
+            raise RuntimeError("falha no DW")
+
+    threads_before = threading.active_count()
+    with pytest.raises(RuntimeError):
+        run_etl_pipeline(iter(range(1000)), lambda chunk: chunk, load, queue_size=1)
+    # Nenhuma thread de estágio fica presa esperando numa fila cheia
+    assert threading.active_count() == threads_before
@@ -0,0 +1,67 @@
+# testes/test_etl_scheduler.py
+import pytest
+from etl_scheduler import ETLStep, run_etl_steps, STEP_OK, STEP_FAILED, STEP_SKIPPED
+
+def _recording_step(name, log, result=True, depends_on=()):
+    def func():
+        log.append(name)
+        return result
+    return ETLStep(name, func, depends_on=depends_on)
+
+def test_dependencies_run_before_dependents():
+    log = []
+    steps = [
+        _recording_step('fato', log, depends_on=['dim_a', 'dim_b']),
+        _recording_step('dim_a', log),
+        _recording_step('dim_b', log)
+    ]
+    status = run_etl_steps(steps, max_workers=2)
+    assert status == {'dim_a': STEP_OK, 'dim_b': STEP_OK, 'fato': STEP_OK}
+    assert log[-1] == 'fato'
+
+def test_failure_skips_dependents_transitively():
+    log = []
+    steps = [
+        _recording_step('dim', log, result=False),
+        _recording_step('fato', log, depends_on=['dim']),
+        _recording_step('agregado', log, depends_on=['fato']),
+        _recording_step('independente', log)
+    ]
+    status = run_etl_steps(steps)
+    assert status == {'dim': STEP_FAILED, 'fato': STEP_SKIPPED, 'agregado': STEP_SKIPPED, 'independente': STEP_OK}
+    assert sorted(log) == ['dim', 'independente']
+
+def test_exception_counts_as_failure():
+    def broken():
+        raise RuntimeError("falha")
+    status = run_etl_steps([ETLStep('dim', broken)])
+    assert status == {'dim': STEP_FAILED}
+
+def test_undeclared_dependency_is_rejected():
+    with pytest.raises(ValueError):
+        run_etl_steps([ETLStep('fato', lambda: True, depends_on=['dim_inexistente'])])
+
+def test_circular_dependency_is_rejected():
+    steps = [ETLStep('a', lambda: True, depends_on=['b']), ETLStep('b', lambda: True, depends_on=['a'])]
+    with pytest.raises(ValueError):
+        run_etl_steps(steps)
+
+def test_completed_steps_are_not_rerun_and_unblock_dependents():
+    log = []
+    finished = []
+    steps = [
+        _recording_step('dim', log),
+        _recording_step('fato', log, depends_on=['dim'])
+    ]
+    status = run_etl_steps(steps, completed={'dim', 'etapa_removida'},
+                           on_step_finished=lambda name, step_status: finished.append((name, step_status)))
+    assert status == {'dim': STEP_OK, 'fato': STEP_OK}
+    assert log == ['fato']
+    # Só as etapas executadas agora (ou puladas) são informadas ao callback de checkpoint
+    assert finished == [('fato', STEP_OK)]
+
+def test_on_step_finished_reports_skipped_steps():
+    finished = []
+    steps = [ETLStep('dim', lambda: False), ETLStep('fato', lambda: True, depends_on=['dim'])]
+    run_etl_steps(steps, on_step_finished=lambda name, step_status: finished.append((name, step_status)))
+    assert sorted(finished) == [('dim', STEP_FAILED), ('fato', STEP_SKIPPED)]
@@ -0,0 +1,83 @@
+# testes/test_fact_carona_etl.py
+import numpy as np
+import pandas as pd
+from fact_scripts.fact_carona_etl import build_rides_extract_query, transform_rides_chunk, COUNT_COLUMNS
+from dim_scripts.dim_flags_carona_etl import FLAG_BITS, FLAG_NAMES_ORDER
+from sk_cache import SurrogateKeyCache, UNKNOWN_SK
+
+def test_extract_query_counts_requests_per_status_with_filter():
+    query = build_rides_extract_query()
+    for status, column in [('pending', 'pending_requests_count'), ('accepted', 'accepted_requests_count'),
+                           ('refused', 'refused_requests_count'), ('quit', 'quit_requests_count')]:
+        assert f"COUNT(*) FILTER (WHERE ru.status = '{status}') AS {column}" in query
+        assert f"COALESCE(rc.{column}, 0) AS {column}" in query
+    assert "MAX(ru.user_id) FILTER (WHERE ru.status = 'driver') AS driver_id" in query
+    # O status 'driver' não entra no total de pedidos
+    assert ("COALESCE(rc.pending_requests_count, 0) + COALESCE(rc.accepted_requests_count, 0) + "
+            "COALESCE(rc.refused_requests_count, 0) + COALESCE(rc.quit_requests_count, 0) AS requests_count") in query
+    assert "COALESCE(mc.messages_count, 0) AS messages_count" in query
+    assert query.rstrip().endswith("ORDER BY cr.id;")
+
+def _rides():
+    counts = {column: [1, 0] for column in COUNT_COLUMNS}
+    return pd.DataFrame({
+        'ride_id': [1, 2],
+        'neighborhood_name': ['Tijuca', 'Bairro novo'],
+        'is_going_to_campus': [True, None],
+        'routine_id': [None, None],
+        'hub_name': ['Fundão', None],
+        'slots': [3, None],
+        'created_at': pd.to_datetime(['2019-03-01', '2019-03-02']),
+        'updated_at': pd.to_datetime(['2019-03-01', '2019-03-02']),
+        'week_days': ['1', None],
+        'repeats_until': [None, None],
+        'done': [True, None],
+        'deleted_at': [None, None],
+        'date': pd.to_datetime(['2019-03-15 14:35', '2019-03-16 07:00']),
+        'driver_id': [10, 99],
+        **counts
+    })
+
+def test_transform_maps_sks_flags_and_unknown_members():
+    sk_cache = SurrogateKeyCache()
+    sk_cache.update('dim_user', [(10, 100)])
+    sk_cache.update('dim_neighborhood', [('Tijuca', 200)])
+    sk_cache.update('dim_hub', [('Fundão', 300)])
+    lookup = np.full(2 ** len(FLAG_NAMES_ORDER), -1, dtype=np.int64)
+    lookup[FLAG_BITS['is_routine_ride'] | FLAG_BITS['is_going_to_campus'] | FLAG_BITS['done'] | FLAG_BITS['is_routine_monday']] = 7
+
+    fact = transform_rides_chunk(_rides(), sk_cache, lookup)
+    assert fact['ride_id'].tolist() == [1, 2]
+    assert fact['driver_user_sk'].tolist() == [100, UNKNOWN_SK]
+    assert fact['neighborhood_sk'].tolist() == [200, UNKNOWN_SK]
+    assert fact['hub_sk'].tolist() == [300, UNKNOWN_SK]
+    # A segunda carona (não rotina, volta, não concluída) não está no lookup: membro desconhecido
+    assert fact['flags_carona_sk'].tolist() == [7, UNKNOWN_SK]
+    assert fact['date_sk'].tolist() == [20190315, 20190316]
+    assert fact['hour_sk'].tolist() == [1435, 700]
+    assert fact['slots'].tolist() == [3, 0]
+    assert fact['requests_count'].tolist() == [1, 0]
+
+def test_incremental_query_recomputes_affected_rides():
+    query = build_rides_extract_query(incremental=True)
+    assert "affected_ride_ids AS" in query
+    # Caronas alteradas, com pedidos novos/alterados ou com mensagens novas
+    assert "FROM rides r\n        WHERE r.created_at >= %(last_run)s" in query
+    assert "FROM ride_user ru\n        WHERE ru.created_at >= %(last_run)s OR ru.updated_at >= %(last_run)s" in query
+    assert "FROM messages m\n        WHERE m.created_at >= %(last_run)s" in query
+    assert "JOIN affected_ride_ids a ON r.id = a.ride_id" in query
+    # Os contadores são recalculados com todos os pedidos dessas caronas, não só os alterados
+    assert "WHERE ru.ride_id IN (SELECT id FROM changed_rides)" in query
+
+def test_full_query_skips_the_affected_set():
+    query = build_rides_extract_query(incremental=False)
+    assert "affected_ride_ids" not in query
+    assert "%(last_run)s" not in query
+    assert "FROM rides r\n        WHERE r.id > %(resume_after_id)s\n    )" in query
+
+def test_resume_and_date_range_filters():
+    for incremental in (True, False):
+        query = build_rides_extract_query(incremental=incremental, date_filtered=True)
+        assert "r.id > %(resume_after_id)s\n          AND r.date >= %(date_from)s AND r.date < %(date_to)s" in query
+        assert "%(date_from)s" not in build_rides_extract_query(incremental=incremental)
+        assert "r.id > %(resume_after_id)s" in build_rides_extract_query(incremental=incremental)
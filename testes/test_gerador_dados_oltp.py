@@ -0,0 +1,25 @@
+# testes/test_gerador_dados_oltp.py
+import numpy as np
+import gerador_dados_oltp
+from gerador_dados_oltp import gerar_bloco_caronas, gerar_tabelas_referencia, gerar_oltp
+from fakes import RecordingConnection
+
+def test_messages_fall_within_the_ride_lifetime():
+    rng = np.random.default_rng(42)
+    referencias = gerar_tabelas_referencia(rng)
+    rides, ride_user, messages = gerar_bloco_caronas(rng, 1, 2000, 500, referencias, 1, 1)
+    lifetime = messages.merge(rides[['id', 'created_at', 'deleted_at']], left_on='ride_id', right_on='id',
+                              suffixes=('', '_ride'))
+    assert len(messages) > 0
+    assert (lifetime['created_at'] >= lifetime['created_at_ride']).all()
+    deleted = lifetime['deleted_at'].notna()
+    assert (lifetime.loc[deleted, 'created_at'] <= lifetime.loc[deleted, 'deleted_at']).all()
+    assert messages['id'].is_unique and ride_user['id'].is_unique
+
+def test_refuses_to_generate_over_existing_data_without_recria(monkeypatch):
+    conn = RecordingConnection(results=[(True,)])
+    monkeypatch.setattr(gerador_dados_oltp, 'connect_to_db', lambda db_config: conn)
+    assert gerar_oltp(escala=0.001, recria=False) is False
+    assert not any(query.startswith('COPY') for query in conn.queries())
+    assert not any('DROP TABLE' in query for query in conn.queries())
+    assert conn.closed
@@ -0,0 +1,22 @@
+# testes/test_sk_cache.py
+import pandas as pd
+from sk_cache import SurrogateKeyCache, UNKNOWN_SK
+
+def test_lookup_maps_business_keys_and_unknowns():
+    cache = SurrogateKeyCache()
+    cache.update('dim_user', [(10, 1), (20, 2), (None, 99)])
+    keys = pd.Series([20, 10, 30, None], index=[5, 6, 7, 8])
+    sks = cache.lookup('dim_user', keys)
+    assert sks.tolist() == [2, 1, UNKNOWN_SK, UNKNOWN_SK]
+    assert sks.index.tolist() == [5, 6, 7, 8]
+
+def test_update_after_lookup_refreshes_index():
+    cache = SurrogateKeyCache()
+    cache.update('dim_hub', [('Fundão', 1)])
+    assert cache.lookup('dim_hub', pd.Series(['Fundão', 'Praia Vermelha'])).tolist() == [1, UNKNOWN_SK]
+    cache.update('dim_hub', [('Praia Vermelha', 2), ('Fundão', 3)])
+    assert cache.lookup('dim_hub', pd.Series(['Fundão', 'Praia Vermelha'])).tolist() == [3, 2]
+
+def test_lookup_on_empty_dimension():
+    cache = SurrogateKeyCache()
+    assert cache.lookup('dim_neighborhood', pd.Series(['Tijuca'])).tolist() == [UNKNOWN_SK]
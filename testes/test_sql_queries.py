@@ -0,0 +1,35 @@
+# testes/test_sql_queries.py
+from sql_queries import (split_deferred_constraints, get_table_name, CREATE_FACT_CARONA_TABLE, CREATE_DIM_USER_TABLE,
+                         CREATE_DIM_TIME_TABLE, CREATE_FACT_INTERACAO_CARONA_TABLE_SPLIT)
+
+def test_fact_defers_fks_and_surrogate_pk_but_keeps_merge_key():
+    ddl, deferred = split_deferred_constraints(CREATE_FACT_CARONA_TABLE)
+    assert deferred == [
+        'PRIMARY KEY (ride_pk, date_sk)',
+        'FOREIGN KEY (driver_user_sk) REFERENCES dim_user(user_sk)',
+        'FOREIGN KEY (neighborhood_sk) REFERENCES dim_neighborhood(neighborhood_sk)',
+        'FOREIGN KEY (hub_sk) REFERENCES dim_hub(hub_sk)',
+        'FOREIGN KEY (date_sk, hour_sk) REFERENCES dim_time(date_sk, hour_sk)'
+    ]
+    # Chave do ON CONFLICT continua; tabela particionada não vira UNLOGGED
+    assert 'UNIQUE (ride_id, date_sk)\n)' in ddl
+    assert 'FOREIGN KEY' not in ddl and 'UNLOGGED' not in ddl
+    assert get_table_name(ddl) == 'fato_carona'
+
+def test_split_time_model_fks_are_deferred_separately():
+    _, deferred = split_deferred_constraints(CREATE_FACT_INTERACAO_CARONA_TABLE_SPLIT)
+    assert 'FOREIGN KEY (date_sk) REFERENCES dim_date(date_sk)' in deferred
+    assert 'FOREIGN KEY (hour_sk) REFERENCES dim_time_of_day(hour_sk)' in deferred
+
+def test_dimension_becomes_unlogged_and_keeps_its_keys():
+    ddl, deferred = split_deferred_constraints(CREATE_DIM_USER_TABLE)
+    assert deferred == []
+    assert ddl.lstrip().startswith('CREATE UNLOGGED TABLE IF NOT EXISTS dim_user')
+    assert 'user_sk SERIAL PRIMARY KEY' in ddl and 'user_id INT UNIQUE NOT NULL' in ddl
+    assert get_table_name(ddl) == 'dim_user'
+
+def test_non_partitioned_table_keeps_table_level_primary_key():
+    # PK (date_sk, hour_sk) da dim_time é a chave do ON CONFLICT da carga
+    ddl, deferred = split_deferred_constraints(CREATE_DIM_TIME_TABLE)
+    assert deferred == []
+    assert 'PRIMARY KEY (date_sk, hour_sk)' in ddl
@@ -0,0 +1,44 @@
+# testes/test_utils.py
+import pandas as pd
+from utils import derive_date_hour_sks, get_checkpoint, save_checkpoint, date_partition_bounds, mark_pending_dates
+from fakes import RecordingConnection
+
+def test_derive_date_hour_sks():
+    timestamps = pd.Series(['2019-03-15 14:35:59', '2016-04-01 00:00:00', '2024-12-31 23:59:00'])
+    date_sk, hour_sk = derive_date_hour_sks(timestamps)
+    assert date_sk.tolist() == [20190315, 20160401, 20241231]
+    assert hour_sk.tolist() == [1435, 0, 2359]
+
+def test_derive_date_hour_sks_null_goes_to_unknown_member():
+    timestamps = pd.Series([pd.Timestamp('2019-03-15 08:05'), None])
+    date_sk, hour_sk = derive_date_hour_sks(timestamps)
+    assert date_sk.tolist() == [20190315, -1]
+    assert hour_sk.tolist() == [805, -1]
+    assert date_sk.dtype == int and hour_sk.dtype == int
+
+def test_checkpoint_without_run_is_a_no_op():
+    # Etapa rodando fora de uma execução registrada (run_id None): não toca no banco
+    assert get_checkpoint(None, None, 'fato_carona') == (None, None)
+    assert save_checkpoint(None, None, 'fato_carona', 'executando', last_key=10) is None
+
+def test_date_partition_bounds_semester():
+    assert date_partition_bounds(20190315, 'semestre') == ('2019_s1', 20190101, 20190701)
+    assert date_partition_bounds(20190630, 'semestre') == ('2019_s1', 20190101, 20190701)
+    assert date_partition_bounds(20190701, 'semestre') == ('2019_s2', 20190701, 20200101)
+    assert date_partition_bounds(20191231, 'semestre') == ('2019_s2', 20190701, 20200101)
+
+def test_date_partition_bounds_month():
+    assert date_partition_bounds(20190315, 'mes') == ('2019_03', 20190301, 20190401)
+    assert date_partition_bounds(20191231, 'mes') == ('2019_12', 20191201, 20200101)
+
+def test_mark_pending_dates_serializes_writers_with_an_advisory_lock():
+    conn = RecordingConnection()
+    mark_pending_dates(conn, 'fato_carona_diaria', [20190316, 20190315, 20190316])
+    (lock_query, lock_params), (insert_query, insert_params) = conn.executed
+    assert 'pg_advisory_xact_lock' in lock_query and lock_params == ('etl_pending_date:fato_carona_diaria',)
+    assert 'INSERT INTO etl_pending_date' in insert_query
+    assert insert_params == ('fato_carona_diaria', [20190315, 20190316])
+
+    conn = RecordingConnection()
+    mark_pending_dates(conn, 'fato_carona_diaria', [])
+    assert conn.executed == []
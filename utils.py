@@ -1,20 +1,124 @@
 # utils.py
+import io
+import os
+import re
+import uuid
+import pandas as pd
 import psycopg2
+from psycopg2 import pool
 # from config import DB_OLTP, DB_DW
+from config import DB_OLTP, DB_DW, EXTRACT_CHUNK_SIZE, POOL_MAX_CONNECTIONS, DW_SESSION_SETTINGS, WATERMARK_SAFETY_MARGIN_MINUTES, FACT_PARTITION_GRANULARITY, DW_SHADOW_SCHEMA
 from datetime import datetime, timedelta
+from etl_metrics import CountingCursor
+
+# Marcador de NULL usado no COPY (não colide com strings vazias nem com texto real)
+COPY_NULL = '\\N'
 
 def connect_to_db(db_config):
     """
     Estabelece uma conexão com o banco de dados.
     """
     try:
-        conn = psycopg2.connect(**db_config)
+        # CountingCursor: conta as idas e voltas ao banco para as métricas do ETL (etl_metrics)
+        conn = psycopg2.connect(cursor_factory=CountingCursor, **db_config)
         print(f"Conexão bem-sucedida ao banco de dados: {db_config['database']}")
         return conn
     except psycopg2.Error as e:
         print(f"Erro ao conectar ao banco de dados {db_config['database']}: {e}")
         return None
 
+class ETLConnection(psycopg2.extensions.connection):
+    """Conexão do pool do ETL: guarda na própria conexão se os ajustes de sessão do DW já foram aplicados."""
+    dw_session_applied = False
+
+class ETLConnectionManager:
+    """
+    Pool de conexões (OLTP e DW) compartilhado por todas as etapas de uma execução do ETL,
+    para não refazer conexão/handshake a cada etapa. Conexões do DW recebem os ajustes de sessão de carga.
+    """
+
+    def __init__(self, oltp_config=DB_OLTP, dw_config=DB_DW, max_connections=POOL_MAX_CONNECTIONS,
+                 dw_session_settings=DW_SESSION_SETTINGS):
+        # ThreadedConnectionPool para permitir etapas rodando em paralelo
+        self.oltp_pool = pool.ThreadedConnectionPool(1, max_connections, cursor_factory=CountingCursor, **oltp_config)
+        self.dw_pool = pool.ThreadedConnectionPool(1, max_connections, cursor_factory=CountingCursor,
+                                                   connection_factory=ETLConnection, **dw_config)
+        self.dw_session_settings = dw_session_settings or {}
+        print(f"Pools de conexões criados: {oltp_config['database']} e {dw_config['database']} (máx. {max_connections} cada).")
+
+    def get_oltp(self):
+        return self.oltp_pool.getconn()
+
+    def get_dw(self):
+        conn = self.dw_pool.getconn()
+        # Os ajustes valem para a sessão inteira: aplica só na primeira vez que a conexão física sai do pool.
+        # A marca fica na própria conexão: uma conexão nova (que substituiu uma fechada) sempre recebe os ajustes
+        if not getattr(conn, 'dw_session_applied', False):
+            try:
+                with conn.cursor() as cur:
+                    for setting, value in self.dw_session_settings.items():
+                        # set_config em vez de SET: aceita listas como valor (e.g. search_path 'dw_sombra, public')
+                        cur.execute("SELECT set_config(%s, %s, false);", (setting, str(value)))
+                conn.commit()
+            except psycopg2.Error:
+                self.dw_pool.putconn(conn, close=True) # Não deixa a vaga do pool presa a uma conexão com problema
+                raise
+            conn.dw_session_applied = True
+        return conn
+
+    def put_oltp(self, conn):
+        self._put(self.oltp_pool, conn)
+
+    def put_dw(self, conn):
+        self._put(self.dw_pool, conn)
+
+    def _put(self, conn_pool, conn):
+        # Desfaz qualquer transação aberta (ex: cursor de extração) antes de devolver a conexão ao pool
+        if conn.closed:
+            conn_pool.putconn(conn, close=True)
+            return
+        conn.rollback()
+        conn_pool.putconn(conn)
+
+    def close_all(self):
+        self.oltp_pool.closeall()
+        self.dw_pool.closeall()
+
+def get_etl_connections(conn_manager=None, need_oltp=True):
+    """
+    Retorna (conn_oltp, conn_dw) para uma etapa do ETL.
+    Com conn_manager, as conexões vêm do pool compartilhado; sem ele (etapa rodando isolada),
+    abre conexões avulsas. conn_oltp é None se need_oltp=False.
+    Se alguma das conexões falhar, a outra é devolvida ao pool (ou fechada) e as duas vêm como None.
+    """
+    conn_oltp = None
+    conn_dw = None
+    if conn_manager is None:
+        if need_oltp:
+            conn_oltp = connect_to_db(DB_OLTP)
+        conn_dw = connect_to_db(DB_DW)
+    else:
+        try:
+            if need_oltp:
+                conn_oltp = conn_manager.get_oltp()
+            conn_dw = conn_manager.get_dw()
+        except (psycopg2.Error, pool.PoolError) as e:
+            print(f"Erro ao obter conexão do pool: {e}")
+
+    if conn_dw is None or (need_oltp and conn_oltp is None):
+        release_etl_connections(conn_manager, conn_oltp, conn_dw)
+        return None, None
+    return conn_oltp, conn_dw
+
+def release_etl_connections(conn_manager, conn_oltp, conn_dw):
+    """Devolve as conexões ao pool (ou fecha, se foram abertas sem pool)."""
+    if conn_manager is None:
+        if conn_oltp: conn_oltp.close()
+        if conn_dw: conn_dw.close()
+        return
+    if conn_oltp: conn_manager.put_oltp(conn_oltp)
+    if conn_dw: conn_manager.put_dw(conn_dw)
+
 def execute_sql(conn, sql_query, fetch_results=False):
     """
     Executa uma query SQL no banco de dados.
@@ -35,6 +139,23 @@ def execute_sql(conn, sql_query, fetch_results=False):
         conn.rollback()
         return False
 
+def extract_in_chunks(conn, query, params=None, chunk_size=EXTRACT_CHUNK_SIZE):
+    """
+    Executa uma query de extração com um cursor do lado do servidor (named cursor do psycopg2)
+    e devolve o resultado em DataFrames de até chunk_size linhas, sem trazer tudo para a memória.
+    O cursor vive dentro da transação atual de conn: não faça commit em conn enquanto itera.
+    """
+    cursor_name = f"etl_extract_{uuid.uuid4().hex[:12]}"
+    with conn.cursor(name=cursor_name) as cur:
+        cur.itersize = chunk_size
+        cur.execute(query, params)
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            columns = [desc[0] for desc in cur.description]
+            yield pd.DataFrame.from_records(rows, columns=columns)
+
 def get_latest_timestamp(conn_dw, table_name, timestamp_column):
     """
     Obtém o timestamp mais recente de uma coluna de uma tabela no DW.
@@ -66,6 +187,110 @@ def get_last_etl_run_date_se_houver(conn_dw, last_etl_run_date_str):
     
     return last_etl_run_date
 
+def get_watermark(conn_dw, target_table, source_table):
+    """
+    Obtém a marca d'água de uma tabela de origem para uma tabela do DW (tabela etl_watermark),
+    já descontada a margem de segurança. Sem marca d'água (primeira carga), retorna uma data bem antiga.
+    """
+    query = """
+        SELECT high_water_mark FROM etl_watermark
+        WHERE target_table = %s AND source_table = %s;
+    """
+    with conn_dw.cursor() as cur:
+        cur.execute(query, (target_table, source_table))
+        result = cur.fetchone()
+    if result is None:
+        return datetime(2000, 1, 1) # Data bem antiga para primeira carga
+    return result[0] - timedelta(minutes=WATERMARK_SAFETY_MARGIN_MINUTES)
+
+def set_watermark(conn_dw, target_table, source_table, high_water_mark):
+    """
+    Grava a marca d'água de uma tabela de origem para uma tabela do DW (nunca retrocede).
+    Não faz commit: deve ser commitada junto com a carga que a justificou.
+    """
+    if high_water_mark is None or pd.isna(high_water_mark):
+        return # Nada extraído dessa origem: mantém a marca d'água atual
+    query = """
+        INSERT INTO etl_watermark (target_table, source_table, high_water_mark, updated_at)
+        VALUES (%s, %s, %s, NOW())
+        ON CONFLICT (target_table, source_table) DO UPDATE SET
+            high_water_mark = GREATEST(etl_watermark.high_water_mark, EXCLUDED.high_water_mark),
+            updated_at = NOW();
+    """
+    with conn_dw.cursor() as cur:
+        cur.execute(query, (target_table, source_table, pd.Timestamp(high_water_mark).to_pydatetime()))
+
+def max_timestamp(df, columns, current=None):
+    """
+    Maior timestamp entre as colunas informadas de um DataFrame e o valor current (ignorando nulos), ou None.
+    Usado para ir acumulando a nova marca d'água bloco a bloco.
+    """
+    values = pd.concat([pd.to_datetime(df[col]) for col in columns] + [pd.Series([current], dtype='datetime64[ns]')]).dropna()
+    if values.empty:
+        return None
+    return values.max()
+
+def get_checkpoint(conn_dw, run_id, step_name):
+    """
+    Obtém o checkpoint de uma etapa numa execução (tabela etl_checkpoint): (status, last_key).
+    Sem execução (run_id None) ou sem checkpoint, retorna (None, None).
+    """
+    if run_id is None:
+        return None, None
+    with conn_dw.cursor() as cur:
+        cur.execute("SELECT status, last_key FROM etl_checkpoint WHERE run_id = %s AND step_name = %s;", (run_id, step_name))
+        result = cur.fetchone()
+    return result if result else (None, None)
+
+def save_checkpoint(conn_dw, run_id, step_name, status, last_key=None):
+    """
+    Grava o checkpoint de uma etapa numa execução. Sem last_key, mantém o último já gravado.
+    Não faz commit: deve ser commitado junto com o bloco carregado, para o checkpoint nunca passar à frente da carga.
+    """
+    if run_id is None:
+        return
+    query = """
+        INSERT INTO etl_checkpoint (run_id, step_name, status, last_key, updated_at)
+        VALUES (%s, %s, %s, %s, NOW())
+        ON CONFLICT (run_id, step_name) DO UPDATE SET
+            status = EXCLUDED.status,
+            last_key = COALESCE(EXCLUDED.last_key, etl_checkpoint.last_key),
+            updated_at = NOW();
+    """
+    with conn_dw.cursor() as cur:
+        cur.execute(query, (run_id, step_name, status, None if last_key is None else int(last_key)))
+
+def get_completed_steps(conn_dw, run_id):
+    """Nomes das etapas já concluídas com sucesso numa execução (puladas ao retomá-la)."""
+    with conn_dw.cursor() as cur:
+        cur.execute("SELECT step_name FROM etl_checkpoint WHERE run_id = %s AND status = 'ok';", (run_id,))
+        return {row[0] for row in cur.fetchall()}
+
+def mark_pending_dates(conn_dw, target_table, date_sks):
+    """
+    Marca dias (date_sk) para serem recalculados num agregado (tabela etl_pending_date).
+    Não faz commit: deve ser commitado junto com o bloco do fato que alterou esses dias.
+    As marcações de um mesmo agregado são serializadas por um advisory lock da transação: processos do
+    backfill_etl.py marcando dias em comum esperam um pelo outro no fim do bloco, em vez de arriscar um deadlock.
+    """
+    date_sks = sorted({int(date_sk) for date_sk in date_sks})
+    if not date_sks:
+        return
+    query = """
+        INSERT INTO etl_pending_date (target_table, date_sk)
+        SELECT %s, unnest(%s::int[])
+        ON CONFLICT (target_table, date_sk) DO NOTHING;
+    """
+    with conn_dw.cursor() as cur:
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s));", (f"etl_pending_date:{target_table}",))
+        cur.execute(query, (target_table, date_sks))
+
+def get_pending_dates(conn_dw, target_table):
+    """Dias (date_sk) marcados para recálculo num agregado, em ordem."""
+    with conn_dw.cursor() as cur:
+        cur.execute("SELECT date_sk FROM etl_pending_date WHERE target_table = %s ORDER BY date_sk;", (target_table,))
+        return [row[0] for row in cur.fetchall()]
+
 def insert_unknown_dim_member(conn_dw, dim_table_name, sk_column_names, default_values_dict):
     """
     Insere um membro 'Desconhecido' em uma tabela de dimensão.
@@ -93,4 +318,239 @@ def insert_unknown_dim_member(conn_dw, dim_table_name, sk_column_names, default_
     except Exception as e:
         conn_dw.rollback() # Garante que a transação é revertida em caso de erro
         print(f"Erro ao inserir membro 'Desconhecido' em {dim_table_name}: {e}")
-        return False
\ No newline at end of file
+        return False
+
+def dataframe_para_csv(df):
+    """
+    Serializa um DataFrame em CSV (sem cabeçalho) pronto para o COPY.
+    Colunas float que só contêm inteiros (efeito colateral de NaN em colunas INT) voltam para inteiro,
+    senão o Postgres recusa valores como '5.0' em colunas INT.
+    """
+    df = df.copy()
+    for col in df.columns:
+        if pd.api.types.is_float_dtype(df[col]):
+            valores = df[col].dropna()
+            if (valores == valores.round()).all():
+                df[col] = df[col].astype('Int64')
+        elif pd.api.types.is_object_dtype(df[col]) or pd.api.types.is_string_dtype(df[col]):
+            # Strings vazias viram NULL no banco, como no resto do ETL
+            df[col] = df[col].mask(df[col] == '')
+
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False, na_rep=COPY_NULL)
+    buffer.seek(0)
+    return buffer
+
+def date_partition_bounds(date_sk, granularity=FACT_PARTITION_GRANULARITY):
+    """
+    Partição de um date_sk (ex: 20190315): (sufixo do nome, início inclusivo, fim exclusivo), em date_sk.
+    granularity: 'semestre' (ex: ('2019_s1', 20190101, 20190701)) ou 'mes' (ex: ('2019_03', 20190301, 20190401)).
+    """
+    year, month = date_sk // 10000, date_sk // 100 % 100
+    if granularity == 'mes':
+        end = (year + 1) * 10000 + 101 if month == 12 else year * 10000 + (month + 1) * 100 + 1
+        return f"{year}_{month:02d}", year * 10000 + month * 100 + 1, end
+    if month <= 6:
+        return f"{year}_s1", year * 10000 + 101, year * 10000 + 701
+    return f"{year}_s2", year * 10000 + 701, (year + 1) * 10000 + 101
+
+def ensure_date_partitions(conn_dw, table_name, date_sks):
+    """
+    Cria as partições (por faixa de date_sk) que ainda faltam numa tabela de fatos particionada para receber
+    os date_sks informados, além da partição default (date_sk -1, data desconhecida).
+    Não faz nada se a tabela não é particionada (DW criado antes do particionamento).
+    Não faz commit: as partições novas são commitadas junto com o bloco que as exigiu.
+    Retorna os nomes das partições criadas.
+    """
+    with conn_dw.cursor() as cur:
+        cur.execute("""
+            SELECT n.nspname, c.relname
+            FROM pg_partitioned_table p
+            JOIN pg_class t ON t.oid = p.partrelid
+            JOIN pg_namespace n ON n.oid = t.relnamespace
+            LEFT JOIN pg_inherits i ON i.inhparent = p.partrelid
+            LEFT JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE p.partrelid = to_regclass(%s);
+        """, (table_name,))
+        rows = cur.fetchall()
+        if not rows:
+            return []
+        schema = rows[0][0]
+        existing_partitions = {row[1] for row in rows if row[1]}
+        # Na reconstrução em esquema sombra as partições também nascem UNLOGGED (viram LOGGED no final da carga)
+        unlogged = "UNLOGGED " if schema == DW_SHADOW_SCHEMA else ""
+
+        created = []
+        default_partition = f"{table_name}_default"
+        if default_partition not in existing_partitions:
+            cur.execute(f"CREATE {unlogged}TABLE IF NOT EXISTS {schema}.{default_partition} PARTITION OF {schema}.{table_name} DEFAULT;")
+            created.append(default_partition)
+
+        partitions = {date_partition_bounds(int(date_sk)) for date_sk in pd.unique(pd.Series(date_sks).dropna()) if date_sk > 0}
+        for suffix, start, end in sorted(partitions):
+            partition_name = f"{table_name}_{suffix}"
+            if partition_name in existing_partitions:
+                continue
+            cur.execute(f"""
+                CREATE {unlogged}TABLE IF NOT EXISTS {schema}.{partition_name}
+                PARTITION OF {schema}.{table_name} FOR VALUES FROM ({start}) TO ({end});
+            """)
+            created.append(partition_name)
+    return created
+
+def detach_date_partitions_before(conn_dw, table_name, date_sk):
+    """
+    Desanexa da tabela de fatos as partições que terminam até date_sk (ex: 20200101), para arquivá-las ou dropá-las.
+    As partições desanexadas continuam existindo como tabelas comuns. Retorna os nomes delas.
+    """
+    with conn_dw.cursor() as cur:
+        cur.execute("""
+            SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass(%s);
+        """, (table_name,))
+        detached = []
+        for partition_name, bound in cur.fetchall():
+            match = re.search(r"TO \((\d+)\)", bound or '')
+            if match and int(match.group(1)) <= date_sk:
+                cur.execute(f"ALTER TABLE {table_name} DETACH PARTITION {partition_name};")
+                detached.append(partition_name)
+    conn_dw.commit()
+    return detached
+
+def bulk_upsert_dataframe(conn_dw, df, target_table, conflict_columns, update_columns=None, chunk_size=100000, returning=None,
+                          row_hash_column=None, stats=None, partition_column=None, touched_partitions=None):
+    """
+    Carrega um DataFrame numa tabela do DW usando COPY FROM STDIN para uma tabela de staging UNLOGGED
+    e depois um único INSERT ... SELECT ... ON CONFLICT (merge baseado em conjunto).
+
+    conflict_columns: Colunas da chave de negócio usadas no ON CONFLICT (e.g., ['user_id']). Registros repetidos
+                      no DataFrame são reduzidos à versão mais recente antes do COPY (dedupe_business_keys).
+    update_columns: Colunas atualizadas no ON CONFLICT DO UPDATE. Se None, atualiza todas as colunas
+                    do DataFrame que não estão em conflict_columns. Se for lista vazia, usa DO NOTHING.
+    returning: Colunas devolvidas pelo merge (RETURNING), e.g. ['user_id', 'user_sk'] para atualizar o cache de SKs.
+    row_hash_column: Coluna da tabela com o hash (md5, UUID) das update_columns. Se informada, o hash é calculado
+                     no merge e linhas já existentes só são reescritas quando o hash muda (sem tuplas mortas/WAL à toa).
+    stats: Dicionário onde são acumuladas as contagens 'inserted', 'updated' e 'unchanged' (ver new_upsert_stats).
+    partition_column: Chave de partição da tabela (e.g. 'date_sk' nos fatos). Entra no ON CONFLICT junto com
+                      conflict_columns, e uma linha cuja chave de partição mudou é removida da partição antiga
+                      antes do merge, para a chave de negócio continuar única na tabela.
+    touched_partitions: Conjunto onde são acumulados os valores de partition_column tocados pelo bloco: os das
+                        linhas carregadas e os das partições antigas de linhas que mudaram de partição.
+    Não faz commit: quem chama decide quando commitar.
+    Retorna o número de linhas enviadas para a staging ou, se returning for informado,
+    a lista de tuplas inseridas/atualizadas (com DO NOTHING, só as inseridas).
+    """
+    df = dedupe_business_keys(df, conflict_columns)
+    columns = list(df.columns)
+    if update_columns is None:
+        update_columns = [col for col in columns if col not in conflict_columns]
+
+    # O pid no nome separa as stagings de processos carregando a mesma tabela ao mesmo tempo (backfill_etl.py)
+    staging_table = f"stg_{target_table}_{os.getpid()}"
+    columns_sql = ', '.join(columns)
+    on_conflict_columns_sql = ', '.join(conflict_columns + ([partition_column] if partition_column else []))
+    insert_columns_sql = columns_sql
+    select_columns_sql = columns_sql
+
+    if row_hash_column:
+        # Hash das colunas rastreadas (as que o upsert atualizaria), calculado no próprio banco
+        tracked_columns = update_columns or columns
+        insert_columns_sql = f"{columns_sql}, {row_hash_column}"
+        select_columns_sql = f"{columns_sql}, md5(ROW({', '.join(tracked_columns)})::text)::uuid"
+
+    if update_columns:
+        set_columns = update_columns + ([row_hash_column] if row_hash_column else [])
+        update_sql = ',\n            '.join(f"{col} = EXCLUDED.{col}" for col in set_columns)
+        on_conflict_sql = f"ON CONFLICT ({on_conflict_columns_sql}) DO UPDATE SET\n            {update_sql}"
+        if row_hash_column:
+            # Linha igual à já armazenada: o conflito não gera UPDATE (nem nova versão da tupla)
+            on_conflict_sql += f"\n        WHERE {target_table}.{row_hash_column} IS DISTINCT FROM EXCLUDED.{row_hash_column}"
+    else:
+        on_conflict_sql = f"ON CONFLICT ({on_conflict_columns_sql}) DO NOTHING"
+
+    # (xmax = 0) diferencia linhas inseridas de atualizadas, para as contagens de stats
+    returning_items = list(returning or []) + (['(xmax = 0)'] if stats is not None else [])
+    returning_sql = f"\n        RETURNING {', '.join(returning_items)}" if returning_items else ""
+
+    # A staging copia só os tipos das colunas carregadas (CTAS não herda NOT NULL, defaults nem constraints)
+    create_staging_query = f"""
+        DROP TABLE IF EXISTS {staging_table};
+        CREATE UNLOGGED TABLE {staging_table} AS
+        SELECT {columns_sql} FROM {target_table} WITH NO DATA;
+    """
+    copy_query = f"COPY {staging_table} ({columns_sql}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')"
+    # A staging já tem uma linha por chave de negócio (dedupe_business_keys), o que evita o erro
+    # "ON CONFLICT DO UPDATE command cannot affect row a second time"
+    merge_query = f"""
+        INSERT INTO {target_table} ({insert_columns_sql})
+        SELECT {select_columns_sql}
+        FROM {staging_table}
+        {on_conflict_sql}{returning_sql};
+    """
+
+    with conn_dw.cursor() as cur:
+        cur.execute(create_staging_query)
+        # Envia em blocos para não montar um CSV gigante em memória
+        for start in range(0, len(df), chunk_size):
+            buffer = dataframe_para_csv(df.iloc[start:start + chunk_size])
+            cur.copy_expert(copy_query, buffer)
+        if partition_column:
+            # Registros que mudaram de partição (ex: carona remarcada para outra data) saem da partição antiga.
+            # A staging tem uma linha por chave (dedupe_business_keys): a partição de destino é a da versão mais recente
+            key_match_sql = ' AND '.join(f"t.{col} = s.{col}" for col in conflict_columns)
+            cur.execute(f"""
+                DELETE FROM {target_table} t
+                USING {staging_table} s
+                WHERE {key_match_sql} AND t.{partition_column} IS DISTINCT FROM s.{partition_column}
+                RETURNING t.{partition_column};
+            """)
+            if touched_partitions is not None:
+                touched_partitions.update(row[0] for row in cur.fetchall())
+                touched_partitions.update(df[partition_column].dropna().unique().tolist())
+        cur.execute(merge_query)
+        returned_rows = cur.fetchall() if returning_items else []
+        cur.execute(f"DROP TABLE IF EXISTS {staging_table};")
+
+    if stats is not None:
+        inserted = sum(1 for row in returned_rows if row[-1])
+        updated = len(returned_rows) - inserted
+        staged = len(df)
+        stats['inserted'] = stats.get('inserted', 0) + inserted
+        stats['updated'] = stats.get('updated', 0) + updated
+        stats['unchanged'] = stats.get('unchanged', 0) + staged - inserted - updated
+        returned_rows = [row[:-1] for row in returned_rows]
+
+    if returning:
+        return returned_rows
+    return len(df)
+
+def dedupe_business_keys(df, conflict_columns, order_column='updated_at'):
+    """
+    Deixa uma linha por chave de negócio: quando o mesmo registro aparece mais de uma vez na extração,
+    fica a versão mais recente (maior order_column, se a coluna existir; senão a última ocorrência).
+    """
+    if not df.duplicated(subset=conflict_columns).any():
+        return df
+    if order_column in df.columns:
+        df = df.sort_values(order_column, kind='stable', na_position='first')
+    return df.drop_duplicates(subset=conflict_columns, keep='last')
+
+def new_upsert_stats():
+    """Contadores acumulados por bulk_upsert_dataframe(stats=...) ao longo dos blocos de uma carga."""
+    return {'inserted': 0, 'updated': 0, 'unchanged': 0}
+
+def format_upsert_stats(stats):
+    return f"{stats['inserted']} inseridos, {stats['updated']} atualizados, {stats['unchanged']} sem alteração"
+
+def derive_date_hour_sks(timestamps):
+    """
+    Deriva date_sk (ex: 20190315) e hour_sk (ex: 1435) de uma série de timestamps, de forma vetorizada.
+    As mesmas chaves servem para a dim_time (FK composta) e para dim_date + dim_time_of_day (FKs separadas).
+    Timestamps nulos apontam para o membro 'Desconhecido' (-1).
+    """
+    timestamps = pd.to_datetime(timestamps)
+    date_sk = timestamps.dt.year * 10000 + timestamps.dt.month * 100 + timestamps.dt.day
+    hour_sk = timestamps.dt.hour * 100 + timestamps.dt.minute
+    return date_sk.fillna(-1).astype(int), hour_sk.fillna(-1).astype(int)